@@ -0,0 +1,75 @@
+"""
+Which users the Analyzer already labelled with which model
+In memory a set per model, on disk the snapshot sentiment_analysis_overview.json (model -> list of user ids)
+and a log next to it that new entries are appended to ("<model>\t<user_id>" per line).
+Opening the overview folds the log into the snapshot, so the log only holds the entries of one run.
+"""
+import json
+import os
+import threading
+
+LOG_SUFFIX = ".log"
+
+
+class AnalysisOverview:
+
+	def __init__(self, path):
+		"""
+		:param path: the snapshot json, the log is path + ".log"
+		"""
+		self.path = path
+		self.log_path = path + LOG_SUFFIX
+		# model name -> set of user ids
+		self.users = {}
+		# Entries not written to the log yet
+		self._new = []
+		self._lock = threading.Lock()
+		self._load()
+		self.compact()
+
+	def _load(self):
+		if os.path.isfile(self.path):
+			with open(self.path) as f:
+				for model, user_ids in json.load(f).items():
+					self.users.setdefault(model, set()).update(user_ids)
+		if os.path.isfile(self.log_path):
+			with open(self.log_path) as f:
+				for line in f:
+					if not line.endswith("\n"):
+						# Torn last line, the user is labelled again
+						continue
+					model, user_id = line[:-1].split("\t")
+					self.users.setdefault(model, set()).add(user_id)
+
+	def compact(self):
+		""" Writes all entries to the snapshot and empties the log
+		If this dies in between, the log is folded in again next time, entries are never lost
+		"""
+		self.flush()
+		with self._lock:
+			with open(self.path + ".part", "w") as f:
+				json.dump({model: sorted(user_ids) for model, user_ids in self.users.items()}, f)
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(self.path + ".part", self.path)
+			open(self.log_path, "w").close()
+
+	def contains(self, model, user_id):
+		return user_id in self.users.get(model, ())
+
+	def add(self, model, user_id):
+		""" Marks user_id as labelled by model, on disk with the next flush """
+		with self._lock:
+			user_ids = self.users.setdefault(model, set())
+			if user_id not in user_ids:
+				user_ids.add(user_id)
+				self._new.append((model, user_id))
+
+	def flush(self):
+		""" Appends the new entries to the log """
+		with self._lock:
+			if not self._new:
+				return
+			with open(self.log_path, "a") as f:
+				f.write("".join(f"{model}\t{user_id}\n" for model, user_id in self._new))
+			self._new = []
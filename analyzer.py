@@ -1,17 +1,21 @@
 import json
 import math
 import os
-import statistics
 
 import numpy as np
 import helper
 import tweepy
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import matplotlib.pyplot as plt
 
 from model import TrainedSentimentModel
 from plotter import Plotter
+from analysis_overview import AnalysisOverview
+from date_buckets import get_buckets, to_datetime64
+from sentiment_matrix import SentimentMatrix, LABEL_INDEX
+from count_cube import CountCube, NO_REGION
+from results_store import ResultsStore, STORE_FILENAME
 
 SENTIMENT_OVERVIEW_FILENAME = "sentiment_analysis_overview.json"
 
@@ -25,10 +29,15 @@ class Analyzer:
 		self.config = config
 		self.model = model
 		self.users_dir = config["analyze_sentiment"]["users_dir"]
-		self.analysis_overview = self._load_json_file(SENTIMENT_OVERVIEW_FILENAME)
-		model_name = self.model.name
-		if not model_name in self.analysis_overview:
-			self.analysis_overview[model_name] = []
+		# Labels per user and model, see results_store.py
+		store_path = config["analyze_sentiment"].get("results_store") or os.path.join(self.users_dir, STORE_FILENAME)
+		self.results_store = ResultsStore(store_path)
+		if model is not None:
+			# Labels of an older version of the model are deleted
+			if self.results_store.set_fingerprint(model.name, model.fingerprint()):
+				print(f"{model.name} changed, its cached labels were deleted")
+		# Users already labelled per model, a set with an append-only log (see analysis_overview.py)
+		self.analysis_overview = AnalysisOverview(os.path.join(self.users_dir, SENTIMENT_OVERVIEW_FILENAME))
 
 	def analyze_timeline(self, timeline):
 		""" timeline is an array with twitter objects """
@@ -124,144 +133,147 @@ class Analyzer:
 		plot.plot_dict(only_extremely_neg_dict)
 
 	def _group_tweets(self, tweets):
-		day_group_dict = self._get_day_group_dict()
-		tweets_grouped = {value: [] for value in day_group_dict.values()}
-		start_date = self.config["plot"]["start_date"]
-		end_date = self.config["plot"]["end_date"]
-		for tweet, sentiment in tweets:
-			tweet_creation_time = tweet.created_at
-			if start_date <= tweet_creation_time <= end_date:
-				tweet_date = tweet_creation_time.strftime("%d.%m")
-				group = day_group_dict[tweet_date]
-				tweets_grouped[group].append((tweet, sentiment))
-		return tweets_grouped
+		""" Dict group id -> (tweet, sentiment) tuples of that group, see date_buckets.py """
+		times = to_datetime64((tweet.created_at for tweet, sentiment in tweets), len(tweets))
+		return self._get_buckets().group(tweets, times)
+
+	def _get_buckets(self):
+		plot_config = self.config["plot"]
+		return get_buckets(plot_config["start_date"], plot_config["end_date"], plot_config["group_by"])
 
 	def _get_day_group_dict(self):
-		start_date = self.config["plot"]["start_date"]
-		end_date = self.config["plot"]["end_date"]
-		nr_days_per_group = self.config["plot"]["group_by"]
-		nr_days_between_start_end = (end_date - start_date).days
-		all_days_between = [end_date - timedelta(days=x) for x in reversed(range(0, nr_days_between_start_end + 1))]
-		days_grouped = [all_days_between[x:x + nr_days_per_group] for x in range(0, len(all_days_between),
-																				 nr_days_per_group)]
-		date_id_dict = {}
-		for day_group in days_grouped:
-			group_id = day_group[0].strftime("%d.%m")
-			for day in day_group:
-				day_string = day.strftime("%d.%m")
-				date_id_dict[day_string] = group_id
-		return date_id_dict
+		return self._get_buckets().day_group_dict()
 
 	def analyze_sentiment_user_based(self, users_tweets):
-		"""Create the sentiment dicts for a list of user-timelines,
-		the dicts contain the percentage of pos/neg tweets per timespan for each user"""
-		pos_boundary = self.config["analyze_sentiment"]["pos_boundary"]
-		neg_boundary = self.config["analyze_sentiment"]["neg_boundary"]
-		user_analysations = []
+		"""Create the sentiment of a list of user-timelines per timespan, a SentimentMatrix of the counts,
+		iterating it gives the dicts with the percentage of pos/neg tweets per timespan for each user"""
+		user_ids = []
+		user_counts = []
 		counter = 0
 		for i, user_tweets in enumerate(users_tweets):
 			if user_tweets == []:
 				counter += 1
 				continue
 		
-			current_user_analysation = self._get_single_user_sentiment_analysis(user_tweets, pos_boundary, neg_boundary)
-			user_analysations.append(current_user_analysation)
+			user_ids.append(user_tweets[0].user.id_str)
+			user_counts.append(self._count_user_sentiments(user_tweets))
 			if i % 100 == 0:
-				self._save_json_file(SENTIMENT_OVERVIEW_FILENAME, self.analysis_overview)
+				self.analysis_overview.flush()
 		print(f"Dropped {counter} Users because no id found!")
-		self._save_json_file(SENTIMENT_OVERVIEW_FILENAME, self.analysis_overview)
-		return user_analysations
-
-	def summarize_user_sentiments(self, user_analysations):
-		"""Given a list of user_analysations (dicts containing the percentage of pos/neg tweets per timespan for each user)
-		return only one similar dict containing the means of those percentages per timespan"""
-		overall_analysation = {group_id: {} for group_id, week_evaluation in user_analysations[0].items()}
-		for group_id in user_analysations[0]:
-			try:
-				overall_analysation[group_id]["extremely_pos_percentage"] = \
-					statistics.mean((user_dict[group_id]["extremely_pos_percentage"] for user_dict in user_analysations
-									 if not user_dict[group_id]["extremely_pos_percentage"] == -1))
-			except statistics.StatisticsError:
-				overall_analysation[group_id]["extremely_pos_percentage"] = 0
-				print("No pos datapoints for this timespan, start_date = {}".format(group_id))
-			try:
-				overall_analysation[group_id]["extremely_neg_percentage"] = \
-					statistics.mean((user_dict[group_id]["extremely_neg_percentage"] for user_dict in user_analysations
-									 if not user_dict[group_id]["extremely_neg_percentage"] == -1))
-			except statistics.StatisticsError:
-				overall_analysation[group_id]["extremely_neg_percentage"] = 0
-				print("No neg datapoints for this timespan, start_date = {}".format(group_id))
-		return overall_analysation
+		self.analysis_overview.flush()
+		return SentimentMatrix(self._get_buckets().labels, user_ids, user_counts)
+
+	def summarize_user_sentiments(self, user_analysations, weighting="user"):
+		"""Given a SentimentMatrix or a list of user_analysations (dicts containing the percentage of pos/neg tweets
+		per timespan for each user) return only one similar dict containing the means of those percentages per timespan
+		weighting "tweet" weighs every user by the number of tweets in the timespan"""
+		if not isinstance(user_analysations, SentimentMatrix):
+			user_analysations = SentimentMatrix.from_analysations(user_analysations)
+		return user_analysations.summary(weighting)
 
 	def _get_single_user_sentiment_analysis(self, users_tweets, pos_boundary, neg_boundary):
 		"""Create the sentiment dict for a single user-timeline,
 		the dict contains the percentage of pos/neg tweets per timespan"""
-		model_name = self.model.name 
 		user_id = users_tweets[0].user.id_str
-		user_sentiment_file = user_id + "_sentiment.json"
-		if user_id in self.analysis_overview[model_name]:
-			# tweets of this user have already been analyzed with this model
-			all_extreme_sentiments = self._load_json_file(user_sentiment_file)[model_name]
-		else:
-			print("User analyzation not found, reanalyzing and saving file to disk")
-			all_extreme_sentiments = self.analyze_extreme_sentiment(users_tweets)
-			self._save_json_file(user_sentiment_file, all_extreme_sentiments, is_analysation_dict=True)
-		grouped_tweets = self._group_tweets(list(zip(users_tweets, all_extreme_sentiments)))
-		# analysation_dict = {group_id: {"tweets": [t[0] for t in tweet_tuples]} for group_id, tweet_tuples in
-		# 					grouped_tweets.items()}
-		analysation_dict = {group_id: {} for group_id, tweet_tuples in
-							grouped_tweets.items()}
-		for group_id, tweet_tuple_list in grouped_tweets.items():
-			# len is 0 when user has not posted anything during current day (group_id) -> value = -1
-			if len(tweet_tuple_list) == 0:
-				analysation_dict[group_id]["extremely_pos_percentage"] = -1
-				analysation_dict[group_id]["extremely_neg_percentage"] = -1
-				
-				analysation_dict[group_id]["extremely_pos_amount"] = -1
-				analysation_dict[group_id]["extremely_neg_amount"] = -1
-				analysation_dict[group_id]["neut_amount"] = -1
-			else:
-				# Extreme Sentiments percentages (relative to how much this person tweeted during the SAME DAY!)
-				# Can be 0 if no pos/neg sentiment have been found, only neutral.
-				extreme_sentiments = [tweet_tuple[1] for tweet_tuple in tweet_tuple_list]
-				overall_amount = len(extreme_sentiments)
-				extremely_pos_amount = sum(1 for sent in extreme_sentiments if sent == "pos")
-				extremely_neg_amount = sum(1 for sent in extreme_sentiments if sent == "neg")
-				neut_amount = sum(1 for sent in extreme_sentiments if sent == "neut")
-				analysation_dict[group_id]["neut_amount"] = neut_amount
-				extremely_pos_percentage = extremely_pos_amount / overall_amount * 100
-				extremely_neg_percentage = extremely_neg_amount / overall_amount * 100
+		matrix = SentimentMatrix(self._get_buckets().labels, [user_id], self._count_user_sentiments(users_tweets))
+		return matrix.user_dict(0)
 
-				analysation_dict[group_id]["extremely_pos_percentage"] = extremely_pos_percentage
-				analysation_dict[group_id]["extremely_neg_percentage"] = extremely_neg_percentage
+	def _count_user_sentiments(self, users_tweets):
+		""" buckets x labels array, number of "neg", "neut" and "pos" tweets of the user per timespan """
+		buckets = self._get_buckets()
+		all_extreme_sentiments = self._get_labels(users_tweets)
+		groups = buckets.assign(to_datetime64((tweet.created_at for tweet in users_tweets), len(users_tweets)))
+		label_index = np.array([LABEL_INDEX[label] for label in all_extreme_sentiments], dtype=np.int64)
+		in_range = groups >= 0
+		counts = np.bincount(groups[in_range] * len(LABEL_INDEX) + label_index[in_range],
+							 minlength=len(buckets) * len(LABEL_INDEX))
+		self.analysis_overview.add(self.model.name, users_tweets[0].user.id_str)
+		return counts.reshape(len(buckets), len(LABEL_INDEX))
 
-				analysation_dict[group_id]["extremely_pos_amount"] = extremely_pos_amount
-				analysation_dict[group_id]["extremely_neg_amount"] = extremely_neg_amount
+	def count_sentiments_per_day(self, users_tweets, regions=None, models=None):
+		"""CountCube of the tweets per user, day, model and label, see count_cube.py
+		:param regions: region of every user timeline, None if not known
+		:param models: model names, default the model of the analyzer. Tweets are only scored by the model
+						of the analyzer, other models count the tweets with a label in the results store
+		Only the days of config["analyze_sentiment"]["cube_start"] (default the until date of the search filter)
+		to ["cube_end"] (default today) are counted, a cube of whole timelines can span a decade
+		"""
+		models = models or [self.model.name]
+		regions = regions if regions is not None else [None] * len(users_tweets)
+		users = []
+		for user_tweets, region in zip(users_tweets, regions):
+			if user_tweets == []:
+				continue
+			tweet_ids = [tweet.id for tweet in user_tweets]
+			labels = {}
+			for model_name in models:
+				if self.model is not None and model_name == self.model.name:
+					labels[model_name] = self._get_labels(user_tweets)
+					self.analysis_overview.add(model_name, user_tweets[0].user.id_str)
+				else:
+					cached = self.results_store.get_tweet_labels(model_name, tweet_ids)
+					labels[model_name] = [cached.get(tweet_id) for tweet_id in tweet_ids]
+			users.append((user_tweets[0].user.id_str, region if region is not None else NO_REGION, user_tweets, labels))
+		self.analysis_overview.flush()
+		return CountCube.from_labels(models, users, *self._cube_range())
 
-		self.analysis_overview[model_name].append(user_id)
-		return analysation_dict
+	def _cube_range(self):
+		""" First and last day of the count cube, see count_sentiments_per_day """
+		analyze_config = self.config["analyze_sentiment"]
+		first_day = analyze_config.get("cube_start") or self.config.get("search", {}).get("filter", {}).get("until")
+		last_day = analyze_config.get("cube_end") or datetime.now()
+		return first_day, last_day
 
 	def analyze_extreme_sentiment(self, tweets):
 		tweet_texts = [tweet.text for tweet in tweets]
 		return self.model.get_label_for_clear_cases(tweet_texts)
 
+	def _get_labels(self, users_tweets):
+		""" Labels of the tweets by the model, only tweets without a cached label (by tweet id) are scored """
+		model_name = self.model.name
+		user_id = users_tweets[0].user.id_str
+		tweet_ids = [tweet.id for tweet in users_tweets]
+		labels = self.results_store.get_tweet_labels(model_name, tweet_ids)
+		if not labels and self.analysis_overview.contains(model_name, user_id) and self.results_store.uses_legacy(model_name):
+			labels = self._import_legacy_labels(user_id, model_name, tweet_ids)
+		new_tweets = [tweet for tweet in users_tweets if tweet.id not in labels]
+		if new_tweets:
+			new_labels = self.analyze_extreme_sentiment(new_tweets)
+			self.results_store.put_tweet_labels(model_name, [tweet.id for tweet in new_tweets], new_labels)
+			labels.update(zip((tweet.id for tweet in new_tweets), new_labels))
+		return [labels[tweet_id] for tweet_id in tweet_ids]
+
+	def _import_legacy_labels(self, user_id, model_name, tweet_ids):
+		""" Per tweet labels from the positional labels of the user (results store or json),
+		only if they have one label per tweet, otherwise the timeline changed since and they can not be aligned
+		"""
+		legacy_labels = self._load_labels(user_id, model_name)
+		if legacy_labels is None or len(legacy_labels) != len(tweet_ids):
+			return {}
+		self.results_store.put_tweet_labels(model_name, tweet_ids, legacy_labels)
+		return dict(zip(tweet_ids, legacy_labels))
+
+	def _load_labels(self, user_id, model_name):
+		""" Labels of the user by the model from the results store, 
+		or from a <user_id>_sentiment.json not migrated yet (copied into the store), None if there are none
+		"""
+		labels = self.results_store.get(user_id, model_name)
+		user_sentiment_file = user_id + "_sentiment.json"
+		if labels is None and os.path.isfile(os.path.join(self.users_dir, user_sentiment_file)):
+			labels = self._load_json_file(user_sentiment_file).get(model_name)
+			if labels is not None:
+				self.results_store.put(user_id, model_name, labels)
+		return labels
+
 	def _load_json_file(self, filename):
 		"""Load data from a json file called filename."""
 		with open(os.path.join(self.users_dir, filename), "r") as input_file:
 			loaded_file = json.load(input_file)
 		return loaded_file
 
-	def _save_json_file(self, filename, data, is_analysation_dict=False):
+	def _save_json_file(self, filename, data):
 		"""Save the data in a json file called filename in the users_dir."""
 		file_path = os.path.join(self.users_dir, filename)
-		if is_analysation_dict:
-			if os.path.isfile(file_path):
-				# file already exists
-				save_data = self._load_json_file(filename)
-			else:
-				save_data = {}
-			save_data[self.model.name] = data
-			data = save_data
 		with open(file_path, "w") as output_file:
 			json.dump(data, output_file)
 
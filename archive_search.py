@@ -0,0 +1,135 @@
+"""
+Paged full archive search of the premium api (tweets/search/fullarchive/<env_name>.json)
+tweepy 3.8 has no method for this endpoint, the requests are made here with the auth of the tweepy API.
+The next token of the last saved page is kept in a cursor file, so a stopped crawl continues with the
+following page, and every request is counted against the monthly quota of the environment in a quota file.
+See Crawler.archive_scan
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+import requests
+import tweepy
+
+from rate_limit import RateLimitScheduler
+
+ARCHIVE_URL = "https://api.twitter.com/1.1/tweets/search/fullarchive/{}.json"
+# Most results per request of a paid environment, sandbox environments allow 100
+MAX_RESULTS = 500
+
+
+def write_json(path, data):
+	""" Replaces path with data, a crash leaves the old or the new file, never half of one """
+	with open(path + ".part", "w") as f:
+		json.dump(data, f)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(path + ".part", path)
+
+
+def read_json(path, default):
+	if not os.path.isfile(path):
+		return default
+	with open(path) as f:
+		return json.load(f)
+
+
+class ArchiveSearch:
+	""" Pages through the results of one query of the full archive, newest first
+	:param path: directory of the cursor (cursor.json) and quota (quota_<env_name>.json) files
+	:param monthly_quota: requests the environment has per month, None for no limit
+	:param scheduler: rate_limit.RateLimitScheduler to share, every request takes from its "full_archive" budget,
+					  None for one of its own
+	"""
+
+	def __init__(self, api, env_name, query, from_date, to_date, path, max_results=MAX_RESULTS,
+				 monthly_quota=None, scheduler=None):
+		self.api = api
+		self.url = ARCHIVE_URL.format(env_name)
+		self.params = {"query": query, "fromDate": from_date, "toDate": to_date, "maxResults": max_results}
+		self.monthly_quota = monthly_quota
+		self.scheduler = scheduler if scheduler is not None else RateLimitScheduler()
+		self.session = requests.Session()
+		os.makedirs(path, exist_ok=True)
+
+		self.cursor_path = os.path.join(path, "cursor.json")
+		crawl = {"query": query, "fromDate": from_date, "toDate": to_date}
+		self.cursor = read_json(self.cursor_path, None)
+		if self.cursor is None or self.cursor["crawl"] != crawl:
+			# Other query or dates, the crawl starts at the newest tweet
+			self.cursor = {"crawl": crawl, "next": None, "finished": False, "pages": 0, "tweets": 0}
+
+		self.quota_path = os.path.join(path, f"quota_{env_name}.json")
+		self.quota = read_json(self.quota_path, {"month": None, "requests": 0})
+
+	@property
+	def finished(self):
+		return self.cursor["finished"]
+
+	def used_requests(self):
+		""" Requests sent this month """
+		if self.quota["month"] != datetime.utcnow().strftime("%Y-%m"):
+			return 0
+		return self.quota["requests"]
+
+	def quota_left(self):
+		""" Requests left this month, None without a quota """
+		if self.monthly_quota is None:
+			return None
+		return max(self.monthly_quota - self.used_requests(), 0)
+
+	def _count_request(self, requests=1):
+		""" Written before the request is sent, a crash can not lose a billed request
+		:param requests: -1 gives back a request that was not billed (429)
+		"""
+		self.quota = {"month": datetime.utcnow().strftime("%Y-%m"), "requests": self.used_requests() + requests}
+		write_json(self.quota_path, self.quota)
+
+	def _request(self):
+		""" One page of results, waits for rate limit budget and does not retry anything but 429
+		:return: the response json, None if the quota is used up
+		"""
+		params = dict(self.params)
+		if self.cursor["next"] is not None:
+			params["next"] = self.cursor["next"]
+		while True:
+			self.scheduler.acquire("full_archive")
+			# Checked before every attempt, the quota may be used up by the time the rate limit allows a request
+			if self.quota_left() == 0:
+				return None
+			self._count_request()
+			start = time.time()
+			response = self.session.get(self.url, params=params, auth=self.api.auth.apply_auth())
+			if response.status_code == 429:
+				# Rate limited requests are not billed
+				self._count_request(-1)
+				self.scheduler.exhausted("full_archive", response.headers.get("x-rate-limit-reset"))
+				continue
+			if response.status_code != 200:
+				raise tweepy.TweepError(f"Twitter error response: status code = {response.status_code}", response)
+			self.scheduler.update("full_archive", response.headers, time.time() - start)
+			return response.json()
+
+	def pages(self):
+		""" Yields list of Status per page, until the archive or the quota is used up
+		The cursor moves on when the next page is requested, so a page the caller saved is never fetched again
+		"""
+		while not self.finished:
+			data = self._request()
+			if data is None:
+				print(f"Monthly quota of {self.monthly_quota} requests used up, stopped at page {self.cursor['pages']}")
+				return
+			statuses = [tweepy.models.Status.parse(self.api, status) for status in data.get("results", [])]
+			yield statuses
+
+			self.cursor["next"] = data.get("next")
+			self.cursor["finished"] = self.cursor["next"] is None
+			self.cursor["pages"] += 1
+			self.cursor["tweets"] += len(statuses)
+			write_json(self.cursor_path, self.cursor)
+
+	def tweets(self):
+		for page in self.pages():
+			yield from page
@@ -0,0 +1,106 @@
+"""
+Offline crawl rate benchmark of get_recent_users, get_timeline and full_scan with a recorded cassette
+The first run records the cassette, against the local fake twitter server or with --live against the real api
+(needs network and the keys in --auth-path). Every run after that replays it without network.
+Usage:
+$ python -m benchmarks.bench_cassette --cassette crawl.json.gz --record --live --auth-path ../keys/
+$ python -m benchmarks.bench_cassette --cassette crawl.json.gz --latency 0.05 --rate-limits simulate
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+import helper
+from crawler import Crawler
+from benchmarks.bench_full_scan import make_config, make_scan_dir
+from benchmarks.cassette import Cassette, RECORDED, SIMULATE, OFF
+from benchmarks.fake_twitter import FakeTwitter, FakeTwitterServer, redirect_twitter, make_auth_dir
+
+
+def run_workload(config, count_requests):
+	""" Runs get_recent_users, get_timeline for every found user and a full_scan
+	Returns list of (name, seconds, requests, results) per step, results are users, tweets and saved timelines
+	"""
+	results = []
+
+	def step(name, func):
+		requests_before = count_requests()
+		start = time.time()
+		num_results = func()
+		results.append((name, time.time() - start, count_requests() - requests_before, num_results))
+
+	crawler = Crawler(copy.deepcopy(config))
+	users = []
+
+	def recent_users():
+		users.extend(crawler.get_recent_users(helper.GEOCODES["scan_1"]))
+		return len(users)
+
+	def timelines():
+		return sum(len(crawler.get_timeline(user)) for user in users)
+
+	def scan():
+		scan_config = copy.deepcopy(config)
+		num_locations = len(scan_config["full_scan"]["locations"])
+		scan_path = scan_config["full_scan"]["path"] = make_scan_dir(num_locations)
+		Crawler(scan_config).full_scan()
+		return sum(len(os.listdir(scan_path + "tweets/" + str(i))) for i in range(num_locations))
+
+	step("get_recent_users", recent_users)
+	step("get_timeline", timelines)
+	step("full_scan", scan)
+	return results
+
+
+def print_results(title, results):
+	print("\n" + title)
+	print("step             | seconds | requests | requests/s | results")
+	for name, seconds, num_requests, num_results in results:
+		print(f"{name:16s} | {seconds:7.2f} | {num_requests:8d} | {num_requests / max(seconds, 1e-9):10.1f} | {num_results:7d}")
+
+
+def record(cassette, config, live):
+	""" Records the workload into cassette, from the real api if live, otherwise from the local fake """
+	if live:
+		with cassette.record():
+			return run_workload(config, lambda: len(cassette))
+	server = FakeTwitterServer(FakeTwitter(latency=0)).start()
+	try:
+		# Recording inside the redirect, so the cassette has the real twitter urls
+		with redirect_twitter(server.url), cassette.record():
+			return run_workload(config, lambda: len(cassette))
+	finally:
+		server.shutdown()
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--cassette", default=os.path.join(tempfile.gettempdir(), "crawler_cassette.json.gz"))
+	parser.add_argument("--record", action="store_true", help="record the cassette again even if it exists")
+	parser.add_argument("--live", action="store_true", help="record against the real twitter api")
+	parser.add_argument("--auth-path", default=None, help="directory with app_auth and user_auth, for --live")
+	parser.add_argument("--users", type=int, default=10, help="users per location")
+	parser.add_argument("--max-searches", type=int, default=200, help="tweets per timeline")
+	parser.add_argument("--workers", type=int, default=4)
+	parser.add_argument("--latency", type=float, default=None, help="seconds per replayed request, default: as recorded")
+	parser.add_argument("--rate-limits", choices=(RECORDED, SIMULATE, OFF), default=RECORDED)
+	args = parser.parse_args()
+
+	if args.live and args.auth_path is None:
+		parser.error("--live needs --auth-path")
+	auth_path = args.auth_path if args.live else make_auth_dir()
+	config = make_config(auth_path, None, args.users, args.max_searches, args.workers)
+
+	cassette = Cassette(args.cassette)
+	if args.record or len(cassette) == 0:
+		print_results(f"Recorded {args.cassette}", record(cassette, config, args.live))
+
+	with cassette.replay(latency=args.latency, rate_limits=args.rate_limits):
+		results = run_workload(config, lambda: cassette.played)
+	print_results(f"Replayed {len(cassette)} exchanges, latency {args.latency}, rate limits {args.rate_limits}", results)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,89 @@
+"""
+Benchmark of the date grouping of Analyzer._group_tweets
+Compares the old per tweet strftime("%d.%m") and dict lookup with date_buckets.DayBuckets.assign on
+--tweets creation times (datetime64), and the conversion of datetime objects with to_datetime64.
+The old path and the conversion need datetime objects, they run on --object-tweets and are scaled up.
+Usage: python -m benchmarks.bench_date_buckets --tweets 10000000 --group-by 1 7 30
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from date_buckets import DayBuckets, to_datetime64
+
+START_DATE = datetime(2020, 3, 1)
+END_DATE = datetime(2020, 12, 31, 23, 59)
+
+
+def random_times(num_tweets, start_date, end_date, seed=0):
+	""" Sorted datetime64[s] array, a few tweets fall outside of the range """
+	rng = np.random.default_rng(seed)
+	start = np.datetime64(start_date - timedelta(days=5), "s").astype(np.int64)
+	end = np.datetime64(end_date + timedelta(days=5), "s").astype(np.int64)
+	return np.sort(rng.integers(start, end, num_tweets)).astype("datetime64[s]")
+
+
+def old_day_group_dict(start_date, end_date, group_by):
+	""" Analyzer._get_day_group_dict how it used to be """
+	nr_days_between_start_end = (end_date - start_date).days
+	all_days_between = [end_date - timedelta(days=x) for x in reversed(range(0, nr_days_between_start_end + 1))]
+	days_grouped = [all_days_between[x:x + group_by] for x in range(0, len(all_days_between), group_by)]
+	date_id_dict = {}
+	for day_group in days_grouped:
+		group_id = day_group[0].strftime("%d.%m")
+		for day in day_group:
+			date_id_dict[day.strftime("%d.%m")] = group_id
+	return date_id_dict
+
+
+def old_group(datetimes, start_date, end_date, group_by):
+	""" Group id of every datetime, how Analyzer._group_tweets used to find it """
+	day_group_dict = old_day_group_dict(start_date, end_date, group_by)
+	return [day_group_dict[d.strftime("%d.%m")] if start_date <= d <= end_date else None for d in datetimes]
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--tweets", type=int, default=10**7)
+	parser.add_argument("--object-tweets", type=int, default=10**6, help="tweets for the paths needing datetime objects")
+	parser.add_argument("--group-by", type=int, nargs="+", default=[1, 7, 30])
+	parser.add_argument("--years", type=int, default=1, help="range of years, the old path only supports 1")
+	args = parser.parse_args()
+
+	end_date = END_DATE.replace(year=END_DATE.year + args.years - 1)
+	times = random_times(args.tweets, START_DATE, end_date)
+	datetimes = random_times(args.object_tweets, START_DATE, end_date, seed=1).tolist()
+	scale = args.tweets / args.object_tweets
+
+	start = time.perf_counter()
+	converted = to_datetime64(datetimes, len(datetimes))
+	convert_seconds = (time.perf_counter() - start) * scale
+	assert (converted == np.array(datetimes, dtype="datetime64[s]")).all()
+
+	print(f"\n{args.tweets:,} tweets, {START_DATE:%d.%m.%Y} to {end_date:%d.%m.%Y}")
+	print(f"to_datetime64: {convert_seconds:.2f}s (scaled from {args.object_tweets:,} datetimes)")
+	print("group_by | old s (scaled) | assign s | speedup | groups")
+	for group_by in args.group_by:
+		buckets = DayBuckets(START_DATE, end_date, group_by)
+		start = time.perf_counter()
+		groups = buckets.assign(times)
+		assign_seconds = time.perf_counter() - start
+		assert len(groups) == args.tweets
+
+		if args.years == 1:
+			start = time.perf_counter()
+			old_ids = old_group(datetimes, START_DATE, end_date, group_by)
+			old_seconds = (time.perf_counter() - start) * scale
+			labels = [buckets.labels[group] if group >= 0 else None for group in buckets.assign(converted).tolist()]
+			assert labels == old_ids
+			old = f"{old_seconds:14.2f}"
+			speedup = f"{old_seconds / assign_seconds:7.0f}x"
+		else:
+			old, speedup = f"{'-':>14}", f"{'-':>8}"
+		print(f"{group_by:8d} | {old} | {assign_seconds:8.3f} | {speedup} | {len(buckets)}")
+
+
+if __name__ == "__main__":
+	main()
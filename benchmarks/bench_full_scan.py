@@ -0,0 +1,100 @@
+"""
+Benchmark of Crawler.full_scan against the local fake twitter server
+Usage: python -m benchmarks.bench_full_scan --users 20 --latency 0.05 --workers 1 4 8 --regions 3
+The fake server ignores the geocode, so every region searches the same users and the regions have to dedupe
+"""
+import argparse
+import copy
+import datetime
+import os
+import tempfile
+import time
+
+import helper
+from crawler import Crawler
+from benchmarks.fake_twitter import FakeTwitter, FakeTwitterServer, redirect_twitter, make_auth_dir
+
+
+def make_config(auth_path, scan_path, num_users, max_searches, workers, num_regions=3):
+	""" Smallest config full_scan runs with, num_regions locations (cycling through scan_1 to scan_3) """
+	config = {
+		"user_auth": False,
+		"auth_path": auth_path,
+		"search": {
+			"location": "",
+			"query": "",
+			"max_searches": max_searches,
+			"num_results": max_searches,
+			"rate_limit": False,
+			"filter": {
+				"not_reply": True,
+				"not_retweet": True,
+				"until": datetime.datetime(2020, 3, 1),
+			}
+		},
+		"get_user": {
+			"good_user": True,
+			"search_type": "recent_user",
+			"num_users": num_users,
+			"unique_ids": True,
+		},
+		"full_scan": {
+			"active": True,
+			"path": scan_path,
+			"locations": ["scan_" + str(i % 3 + 1) for i in range(num_regions)],
+			"workers": workers,
+		}
+	}
+	return helper.init_config(config)
+
+
+def make_scan_dir(num_locations):
+	""" Empty full_scan directory layout: users/users_<i> and tweets/<i>/ """
+	scan_path = tempfile.mkdtemp(prefix="fake_scan_") + os.sep
+	os.makedirs(scan_path + "users")
+	for i in range(num_locations):
+		os.makedirs(scan_path + "tweets/" + str(i))
+		open(scan_path + "users/users_" + str(i), "w").close()
+	return scan_path
+
+
+def run(config):
+	""" Returns the seconds one full scan takes and the seconds of it spent sleeping on rate limits """
+	craw = Crawler(config)
+	start = time.time()
+	craw.full_scan()
+	seconds = time.time() - start
+	users_list = [craw.load_user_ids(idx) for idx in range(len(config["full_scan"]["locations"]))]
+	saved = [user_id for user_ids in users_list for user_id in user_ids]
+	assert len(saved) == len(set(saved)), "users saved in more than one region"
+	return seconds, craw.scheduler.metrics()["idle_time"]
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--users", type=int, default=20, help="users per location")
+	parser.add_argument("--max-searches", type=int, default=200, help="tweets per timeline")
+	parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+	parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+	parser.add_argument("--regions", type=int, nargs="+", default=[3], help="number of scan locations")
+	args = parser.parse_args()
+
+	auth_path = make_auth_dir()
+	results = []
+	for num_regions in args.regions:
+		for workers in args.workers:
+			twitter = FakeTwitter(latency=args.latency)
+			server = FakeTwitterServer(twitter).start()
+			config = make_config(auth_path, make_scan_dir(num_regions), args.users, args.max_searches, workers, num_regions)
+			with redirect_twitter(server.url):
+				seconds, idle = run(copy.deepcopy(config))
+			server.shutdown()
+			results.append((num_regions, workers, seconds, idle, sum(twitter.requests.values())))
+
+	print("\nregions | workers | seconds | idle | requests")
+	for num_regions, workers, seconds, idle, num_requests in results:
+		print(f"{num_regions:7d} | {workers:7d} | {seconds:7.2f} | {idle:4.1f} | {num_requests:8d}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,94 @@
+"""
+Benchmark of the tweet loaders for analysis
+Compares the old path (tweepy Status objects, reduced afterwards) with load_tweet_for_analysation,
+and loading many files serially with Crawler.iter_tweets_for_analysation
+Usage: python -m benchmarks.bench_loader --repeat 20 --files 200 --workers 1 2 4
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import helper
+from crawler import Crawler, ReducedStatus
+from benchmarks.fake_twitter import make_auth_dir
+
+TWEETS_FILE = "saved_data/recent_timeline_tweets_1000.json"
+
+
+def load_with_tweepy(crawler, file_name):
+	""" load_tweet_for_analysation how it used to be """
+	tweets = crawler.load_tweet(file_name)
+	return [ReducedStatus(t.user.id_str, t.created_at, t.text) for t in tweets]
+
+
+def measure(load, crawler, file_name, repeat):
+	""" Returns (seconds per load, bytes allocated for the result) """
+	start = time.perf_counter()
+	for _ in range(repeat):
+		load(crawler, file_name)
+	seconds = (time.perf_counter() - start) / repeat
+
+	tracemalloc.start()
+	result = load(crawler, file_name)
+	size, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	del result
+	return seconds, size
+
+
+def measure_parallel(crawler, file_name, num_files, workers_list):
+	""" Copies file_name num_files times and loads all copies, serial and with every number of workers """
+	tmp_dir = tempfile.mkdtemp(prefix="bench_loader_")
+	filenames = []
+	for i in range(num_files):
+		filenames.append(os.path.join(tmp_dir, str(i)))
+		shutil.copyfile(file_name, filenames[-1])
+
+	print(f"\n{num_files} files")
+	print("workers | seconds")
+	start = time.perf_counter()
+	for filename in filenames:
+		crawler.load_tweet_for_analysation(filename)
+	print(f"serial  | {time.perf_counter() - start:7.2f}")
+	for workers in workers_list:
+		start = time.perf_counter()
+		for _ in crawler.iter_tweets_for_analysation(filenames, workers):
+			pass
+		print(f"{workers:7d} | {time.perf_counter() - start:7.2f}")
+	shutil.rmtree(tmp_dir)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--file", default=TWEETS_FILE)
+	parser.add_argument("--repeat", type=int, default=20)
+	parser.add_argument("--files", type=int, default=200, help="copies of the file for the parallel benchmark")
+	parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+	args = parser.parse_args()
+
+	config = helper.init_config({
+		"user_auth": False,
+		"auth_path": make_auth_dir(),
+		"search": {"location": "", "query": "", "filter": {}},
+	})
+	crawler = Crawler(config)
+
+	old = load_with_tweepy(crawler, args.file)
+	new = crawler.load_tweet_for_analysation(args.file)
+	assert [(t.user.id_str, t.created_at, t.text) for t in old] == \
+		   [(t.user.id_str, t.created_at, t.text) for t in new], "loaders disagree"
+
+	print(f"{len(new)} tweets from {args.file}")
+	print("loader     | ms per file | MB result")
+	for name, load in (("tweepy", load_with_tweepy), ("projected", Crawler.load_tweet_for_analysation)):
+		seconds, size = measure(load, crawler, args.file, args.repeat)
+		print(f"{name:10s} | {seconds * 1000:11.1f} | {size / 1e6:9.2f}")
+
+	measure_parallel(crawler, args.file, args.files, args.workers)
+
+
+if __name__ == "__main__":
+	main()
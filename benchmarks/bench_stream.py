@@ -0,0 +1,59 @@
+"""
+Benchmark and check of Crawler.stream_scan against the local stand-in stream server
+Checks that every status that passes the filters is saved once and reports the sustained ingest rate
+Usage: python -m benchmarks.bench_stream --tweets 20000 --batch-size 10 100 1000
+"""
+import argparse
+import os
+import tempfile
+
+import helper
+from crawler import Crawler
+from benchmarks.bench_full_scan import make_config
+from benchmarks.fake_stream import FakeStream, FakeStreamServer
+from benchmarks.fake_twitter import redirect_twitter, make_auth_dir, STREAM_URL
+
+
+def count_saved(path):
+	""" Number of saved tweets in all user files of path """
+	saved = 0
+	for user_id in os.listdir(path):
+		with open(os.path.join(path, user_id)) as f:
+			saved += sum(1 for _ in f)
+	return saved
+
+
+def run(num_tweets, tweets_per_second, batch_size):
+	""" Streams num_tweets into a new directory, returns the report of stream_scan """
+	stream = FakeStream(num_tweets, tweets_per_second)
+	server = FakeStreamServer(stream).start()
+	config = make_config(make_auth_dir(), tempfile.mkdtemp(prefix="fake_stream_") + os.sep, 0, 0, 1)
+	config["stream"] = {"max_tweets": num_tweets, "batch_size": batch_size, "flush_interval": 1}
+	config = helper.init_config(config)
+
+	with redirect_twitter(server.url, STREAM_URL):
+		report = Crawler(config).stream_scan()
+	server.shutdown()
+
+	saved = count_saved(config["full_scan"]["path"] + "tweets/stream/")
+	expected = stream.expected_kept()
+	assert report["received"] == num_tweets, f"received {report['received']} of {num_tweets}"
+	assert report["kept"] == report["written"] == saved == expected, f"kept {report['kept']}, saved {saved}, expected {expected}"
+	return report
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--tweets", type=int, default=20000)
+	parser.add_argument("--rate", type=float, default=None, help="tweets per second the server sends, default: unlimited")
+	parser.add_argument("--batch-size", type=int, nargs="+", default=[10, 100, 1000])
+	args = parser.parse_args()
+
+	results = [(batch_size, run(args.tweets, args.rate, batch_size)) for batch_size in args.batch_size]
+	print("\nbatch size | tweets/s | kept/s | batches")
+	for batch_size, report in results:
+		print(f"{batch_size:10d} | {report['received_per_second']:8.0f} | {report['kept_per_second']:6.0f} | {report['batches']:7d}")
+
+
+if __name__ == "__main__":
+	main()
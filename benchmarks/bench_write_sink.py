@@ -0,0 +1,94 @@
+"""
+Benchmark of Crawler.save_tweets with and without the write-behind sink on slow storage
+A crawl loop fetches pages (sleeps the network latency) and saves the tweets of every page per user,
+every file open of the crawler and the sink takes the storage latency on top
+Usage: python -m benchmarks.bench_write_sink --pages 50 --latency 0.02 --storage-latency 0 0.002 0.01
+"""
+import argparse
+import builtins
+import os
+import tempfile
+import time
+
+import tweepy
+
+import crawler
+import helper
+import write_sink
+from benchmarks.bench_full_scan import make_config
+from benchmarks.fake_twitter import FakeTwitter, make_auth_dir
+
+USERS_PER_PAGE = 20
+
+
+def slow_open(storage_latency):
+	""" open that takes storage_latency seconds longer, e.g. a network disk """
+	def open_file(*args, **kwargs):
+		time.sleep(storage_latency)
+		return builtins.open(*args, **kwargs)
+	return open_file
+
+
+def make_pages(num_pages, page_size=100):
+	""" Status pages, every page holds tweets of USERS_PER_PAGE users """
+	twitter = FakeTwitter(latency=0)
+	api = tweepy.API()
+	pages = []
+	for p in range(num_pages):
+		pages.append([tweepy.models.Status.parse(api, twitter.status((p * USERS_PER_PAGE + k % USERS_PER_PAGE + 1) * 10**6 - 1 - k))
+					  for k in range(page_size)])
+	return pages
+
+
+def crawl(config, pages, latency):
+	""" Returns the seconds to fetch and save all pages and the number of saved tweets """
+	path = tempfile.mkdtemp(prefix="fake_sink_") + os.sep
+	craw = crawler.Crawler(helper.init_config(config))
+	start = time.time()
+	for page in pages:
+		time.sleep(latency)
+		by_user = {}
+		for tweet in page:
+			by_user.setdefault(tweet.user.id_str, []).append(tweet)
+		for user_id, tweets in by_user.items():
+			craw.save_tweets(tweets, path + user_id, configs=False, append=True)
+	craw.flush_writes()
+	seconds = time.time() - start
+	saved = 0
+	for name in os.listdir(path):
+		with builtins.open(path + name) as f:
+			saved += sum(1 for _ in f)
+	return seconds, saved
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--pages", type=int, default=50)
+	parser.add_argument("--latency", type=float, default=0.02, help="seconds per page request")
+	parser.add_argument("--storage-latency", type=float, nargs="+", default=[0, 0.002, 0.01], help="seconds per file open")
+	parser.add_argument("--durability", default="batch", choices=write_sink.DURABILITY)
+	parser.add_argument("--writers", type=int, default=4)
+	args = parser.parse_args()
+
+	pages = make_pages(args.pages)
+	config = make_config(make_auth_dir(), tempfile.mkdtemp(prefix="fake_scan_") + os.sep, 0, 0, 1)
+	results = []
+	for storage_latency in args.storage_latency:
+		crawler.open = write_sink.open = slow_open(storage_latency)
+		try:
+			sync_seconds, sync_saved = crawl(dict(config), pages, args.latency)
+			config_sink = dict(config, write_behind={"durability": args.durability, "writers": args.writers})
+			sink_seconds, sink_saved = crawl(config_sink, pages, args.latency)
+		finally:
+			del crawler.open, write_sink.open
+		assert sync_saved == sink_saved == 100 * args.pages, (sync_saved, sink_saved)
+		results.append((storage_latency, sync_seconds, sink_seconds))
+
+	print(f"\n{args.pages} pages, {args.latency}s per page, durability {args.durability}, {args.writers} writers")
+	print("storage latency | pages/s sync | pages/s write-behind")
+	for storage_latency, sync_seconds, sink_seconds in results:
+		print(f"{storage_latency:15.3f} | {args.pages / sync_seconds:12.1f} | {args.pages / sink_seconds:20.1f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,175 @@
+"""
+Record and replay of the HTTP requests tweepy makes
+While recording, every request and its response (status code, body, rate limit headers and how long it took)
+is written to a cassette file. While replaying, the same requests are answered from the cassette without
+network, with the recorded or a fixed latency and with the recorded, simulated or no rate limits.
+
+Requests are matched by method, path and query (host and auth are ignored). If the same request was made
+several times, the recorded responses are replayed in order, the last one is repeated after that.
+See benchmarks/bench_cassette.py for recording and replaying crawler runs.
+"""
+import contextlib
+import gzip
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import rate_limit
+from benchmarks.fake_twitter import take_request, RATE_LIMIT_ERROR
+
+RATE_LIMIT_HEADERS = ("x-rate-limit-limit", "x-rate-limit-remaining", "x-rate-limit-reset", "retry-after")
+# Only these response headers are saved, tweepy and the crawler do not look at the others
+KEPT_HEADERS = ("content-type",) + RATE_LIMIT_HEADERS
+
+# Rate limit behaviour while replaying
+RECORDED = "recorded"
+SIMULATE = "simulate"
+OFF = "off"
+
+
+class CassetteMiss(Exception):
+	""" A request was replayed that is not in the cassette """
+
+
+def request_key(session, method, url, params=None):
+	""" Returns '<METHOD> <path>?<sorted query>' of a request, params of the session are merged in like requests does """
+	parts = urlsplit(url)
+	query = parse_qsl(parts.query)
+	for source in (session.params, params or {}):
+		for name, value in source.items():
+			if isinstance(value, bytes):
+				value = value.decode("utf-8")
+			query.append((str(name), str(value)))
+	return method.upper() + " " + parts.path + "?" + urlencode(sorted(query))
+
+
+def make_response(url, status_code, headers, body):
+	""" requests.Response as if it came from the network """
+	response = requests.Response()
+	response.status_code = status_code
+	response.headers = CaseInsensitiveDict(headers)
+	response._content = body.encode("utf-8")
+	response.encoding = "utf-8"
+	response.url = url
+	return response
+
+
+class Cassette:
+	""" Exchanges of one cassette file (gzipped json lines), key (see request_key) -> exchanges in recorded order """
+
+	def __init__(self, path):
+		self.path = path
+		self.exchanges = {}
+		# Number of requests answered in the last replay
+		self.played = 0
+		self._next = {}
+		self._lock = threading.Lock()
+		if os.path.isfile(path):
+			self._load()
+
+	def _load(self):
+		with gzip.open(self.path, "rt") as f:
+			for line in f:
+				exchange = json.loads(line)
+				self.exchanges.setdefault(exchange["key"], []).append(exchange)
+
+	def __len__(self):
+		return sum(len(exchanges) for exchanges in self.exchanges.values())
+
+	@contextlib.contextmanager
+	def record(self, append=False):
+		""" While active, requests go out as usual and every response is added to the cassette
+		:param append: keep the exchanges already in the cassette file
+		"""
+		if not append:
+			self.exchanges = {}
+		original_request = requests.Session.request
+		f = gzip.open(self.path, "at" if append else "wt")
+
+		def request(session, method, url, *args, **kwargs):
+			start = time.time()
+			response = original_request(session, method, url, *args, **kwargs)
+			exchange = {
+				"key": request_key(session, method, url, kwargs.get("params")),
+				"status": response.status_code,
+				"headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+				"body": response.text,
+				"time": start,
+				"elapsed": time.time() - start,
+			}
+			with self._lock:
+				self.exchanges.setdefault(exchange["key"], []).append(exchange)
+				f.write(json.dumps(exchange) + "\n")
+			return response
+
+		requests.Session.request = request
+		try:
+			yield self
+		finally:
+			requests.Session.request = original_request
+			f.close()
+
+	def _take(self, key, skip_limited):
+		""" Returns the next recorded exchange of key, 420/429 responses are skipped if skip_limited """
+		with self._lock:
+			exchanges = self.exchanges.get(key)
+			if not exchanges:
+				raise CassetteMiss(key)
+			i = self._next.get(key, 0)
+			while skip_limited and i < len(exchanges) - 1 and exchanges[i]["status"] in (420, 429):
+				i += 1
+			self._next[key] = i + 1
+			self.played += 1
+			return exchanges[min(i, len(exchanges) - 1)]
+
+	@contextlib.contextmanager
+	def replay(self, latency=None, rate_limits=RECORDED, limits=None, user_auth=False):
+		""" While active, requests are answered from the cassette, nothing goes to the network
+		:param latency: seconds every response takes, None for the recorded time
+		:param rate_limits: RECORDED: rate limit headers and 429 responses as recorded, reset times moved to now
+							SIMULATE: requests are counted against fresh windows of rate_limit.RATE_LIMITS
+							OFF: no rate limit headers and no 429 responses
+		:param limits: dict endpoint -> requests per window, overrides rate_limit.RATE_LIMITS for SIMULATE
+		"""
+		windows = rate_limit.get_windows(user_auth)
+		for endpoint, limit in (limits or {}).items():
+			windows[endpoint] = rate_limit.RateLimitWindow(limit)
+		recorded_start = min((e["time"] for exchanges in self.exchanges.values() for e in exchanges), default=0)
+		shift = time.time() - recorded_start
+		self._next = {}
+		self.played = 0
+		original_request = requests.Session.request
+
+		def request(session, method, url, *args, **kwargs):
+			key = request_key(session, method, url, kwargs.get("params"))
+			headers = None
+			if rate_limits == SIMULATE:
+				endpoint = rate_limit.endpoint_of(make_response(url, 200, {}, ""))
+				if endpoint is not None:
+					with self._lock:
+						allowed, headers = take_request(windows[endpoint])
+					if not allowed:
+						return make_response(url, 429, headers, json.dumps(RATE_LIMIT_ERROR))
+
+			exchange = self._take(key, skip_limited=rate_limits != RECORDED)
+			time.sleep(exchange["elapsed"] if latency is None else latency)
+			response_headers = {name: value for name, value in exchange["headers"].items()
+								if name not in RATE_LIMIT_HEADERS}
+			if rate_limits == RECORDED:
+				response_headers.update(exchange["headers"])
+				if "x-rate-limit-reset" in response_headers:
+					response_headers["x-rate-limit-reset"] = str(int(int(response_headers["x-rate-limit-reset"]) + shift))
+			elif headers is not None:
+				response_headers.update(headers)
+			return make_response(url, exchange["status"], response_headers, exchange["body"])
+
+		requests.Session.request = request
+		try:
+			yield self
+		finally:
+			requests.Session.request = original_request
@@ -0,0 +1,98 @@
+"""
+Local stand-in of the twitter streaming api (POST /1.1/statuses/filter.json)
+Sends length delimited statuses like stream.twitter.com, at a fixed rate or as fast as possible,
+with keep-alive newlines and delete notices in between. Use with redirect_twitter(server.url, STREAM_URL).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from benchmarks.fake_twitter import FakeTwitter, ID_SPACE
+
+FIRST_STREAM_USER = 5000
+# The stream cycles through this many users
+NUM_STREAM_USERS = 100
+
+
+class FakeStream:
+	""" The statuses of the stream, the k-th status is tweet k of user FIRST_STREAM_USER + k % NUM_STREAM_USERS
+	Every 4th tweet is a reply (see FakeTwitter.status) and every 5th a retweet
+	"""
+
+	def __init__(self, num_tweets=1000, tweets_per_second=None):
+		self.num_tweets = num_tweets
+		self.tweets_per_second = tweets_per_second
+		self.twitter = FakeTwitter(latency=0, hours_between_tweets=0)
+		# Bounding boxes of the connections
+		self.locations = []
+
+	def status(self, k):
+		user_id = FIRST_STREAM_USER + k % NUM_STREAM_USERS
+		status = self.twitter.status((user_id + 1) * ID_SPACE - 1 - k // NUM_STREAM_USERS)
+		if k % 5 == 4:
+			status["retweeted_status"] = self.twitter.status(status["id"] - 1)
+		return status
+
+	def expected_kept(self, not_reply=True, not_retweet=True):
+		""" Number of statuses that pass the crawler filters """
+		return sum(1 for k in range(self.num_tweets)
+				   if not (not_reply and self.status(k)["in_reply_to_status_id"] is not None)
+				   and not (not_retweet and "retweeted_status" in self.status(k)))
+
+
+class FakeStreamServer(ThreadingHTTPServer):
+	""" HTTP server around a FakeStream, runs in a background thread """
+	daemon_threads = True
+
+	def __init__(self, stream, address=("127.0.0.1", 0)):
+		super().__init__(address, FakeStreamHandler)
+		self.stream = stream
+
+	@property
+	def url(self):
+		return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+	def start(self):
+		thread = threading.Thread(target=self.serve_forever, daemon=True)
+		thread.start()
+		return self
+
+
+class FakeStreamHandler(BaseHTTPRequestHandler):
+
+	def do_POST(self):
+		stream = self.server.stream
+		length = int(self.headers.get("Content-Length", 0))
+		body = parse_qs(self.rfile.read(length).decode())
+		stream.locations.append(body.get("locations", [""])[0])
+		if self.path.split("?")[0] != "/1.1/statuses/filter.json":
+			self.send_error(404)
+			return
+
+		self.send_response(200)
+		self.send_header("Content-Type", "application/json; charset=utf-8")
+		self.end_headers()
+		start = time.time()
+		try:
+			self.wfile.write(b"\r\n")
+			for k in range(stream.num_tweets):
+				if stream.tweets_per_second:
+					# Hold the rate, sleep until the k-th status is due
+					time.sleep(max(0, start + k / stream.tweets_per_second - time.time()))
+				if k % 100 == 99:
+					self._send({"delete": {"status": {"id": k, "user_id": FIRST_STREAM_USER}}})
+				self._send(stream.status(k))
+		except (BrokenPipeError, ConnectionResetError):
+			# Client disconnected
+			pass
+
+	def _send(self, message):
+		data = json.dumps(message).encode() + b"\r\n"
+		self.wfile.write(str(len(data)).encode() + b"\r\n" + data)
+		self.wfile.flush()
+
+	def log_message(self, format, *args):
+		""" No logging for every request """
+		pass
@@ -0,0 +1,228 @@
+"""
+Local fake of the twitter REST API, good enough for tweepy and the crawler
+Serves synthetic users and tweets with configurable latency and rate limits, so
+the crawler can be benchmarked without network and without burning requests
+"""
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+import rate_limit
+
+TWITTER_URL = "https://api.twitter.com"
+STREAM_URL = "https://stream.twitter.com"
+# Tweet ids of one user are spaced by this, tweet_id // ID_SPACE is the user id
+ID_SPACE = 10**6
+FIRST_SEARCH_USER = 1000
+SEARCH_TOP = 10**15
+DATE_FORMAT = "%a %b %d %H:%M:%S +0000 %Y"
+
+# path -> (endpoint name in rate_limit.RATE_LIMITS, default count)
+ROUTES = {
+	"/1.1/search/tweets.json": ("search", 15),
+	"/1.1/statuses/user_timeline.json": ("user_timeline", 20),
+	"/1.1/statuses/lookup.json": ("statuses_lookup", 100),
+	"/1.1/users/show.json": ("get_user", 1),
+}
+# Premium full archive search, any environment name
+ARCHIVE_PATH = "/1.1/tweets/search/fullarchive/"
+
+
+RATE_LIMIT_ERROR = {"errors": [{"code": 88, "message": "Rate limit exceeded"}]}
+NOT_AUTHORIZED_ERROR = {"request": "/1.1/statuses/user_timeline.json", "error": "Not authorized."}
+
+
+def take_request(window, rate_limits=True):
+	""" Counts one request against window (a rate_limit.RateLimitWindow, only used as counter), not thread safe
+	Returns (allowed, x-rate-limit headers), allowed is False if the window is used up and rate_limits is on
+	"""
+	if time.time() >= window.reset:
+		window.remaining = window.limit
+		window.reset = time.time() + window.window
+	headers = {
+		"x-rate-limit-limit": str(window.limit),
+		"x-rate-limit-remaining": str(max(window.remaining - 1, 0)),
+		"x-rate-limit-reset": str(int(window.reset)),
+	}
+	if rate_limits and window.remaining <= 0:
+		return False, headers
+	window.remaining -= 1
+	return True, headers
+
+
+class FakeTwitter:
+	""" State of the fake api: the synthetic data, latency and the rate limit counters """
+
+	def __init__(self, latency=0.05, timeline_length=400, hours_between_tweets=2, rate_limits=True, deleted_every=0,
+				 archive_size=2000, protected_users=()):
+		"""
+		:param deleted_every: every tweet id divisible by this is deleted, statuses_lookup leaves it out. 0: none
+		:param archive_size: number of results of the full archive search
+		:param protected_users: ids of users whose timeline is answered with 401
+		"""
+		self.archive_size = archive_size
+		self.protected_users = set(str(user_id) for user_id in protected_users)
+		self.latency = latency
+		self.deleted_every = deleted_every
+		self.timeline_length = timeline_length
+		self.hours_between_tweets = hours_between_tweets
+		self.rate_limits = rate_limits
+		self.now = datetime.utcnow()
+		self.requests = {endpoint: 0 for endpoint, _ in ROUTES.values()}
+		self.requests["full_archive"] = 0
+		self.windows = rate_limit.get_windows()
+		self._lock = threading.Lock()
+
+	def user(self, user_id):
+		user_id = int(user_id)
+		return {"id": user_id, "id_str": str(user_id), "screen_name": f"user_{user_id}", "name": f"User {user_id}"}
+
+	def status(self, tweet_id):
+		""" Tweets are fully defined by their id, the i-th newest tweet of user u has id (u+1)*ID_SPACE - 1 - i """
+		user_id = tweet_id // ID_SPACE
+		age = (user_id + 1) * ID_SPACE - 1 - tweet_id
+		created_at = self.now - timedelta(hours=age * self.hours_between_tweets)
+		return {
+			"id": tweet_id,
+			"id_str": str(tweet_id),
+			"created_at": created_at.strftime(DATE_FORMAT),
+			"text": f"Tweet {age} von user {user_id}",
+			# Every 4th tweet is a reply to have something to filter
+			"in_reply_to_status_id": tweet_id + 1 if age % 4 == 3 else None,
+			"entities": {"hashtags": []},
+			"user": self.user(user_id),
+		}
+
+	def timeline(self, user_id, count, max_id=None, since_id=None):
+		newest = (int(user_id) + 1) * ID_SPACE - 1
+		oldest = newest - self.timeline_length + 1
+		start = newest if max_id is None else min(newest, int(max_id))
+		stop = oldest if since_id is None else max(oldest, int(since_id) + 1)
+		return [self.status(i) for i in range(start, max(start - count, stop - 1), -1)]
+
+	def search(self, count, max_id=None):
+		""" Search stream, the k-th result is the newest tweet of user FIRST_SEARCH_USER + k """
+		first = 0 if max_id is None else SEARCH_TOP - int(max_id)
+		statuses = []
+		for k in range(first, first + count):
+			status = self.status((FIRST_SEARCH_USER + k + 1) * ID_SPACE - 1)
+			# Ids have to decrease with every result for tweepys max_id paging
+			status["id"] = SEARCH_TOP - k
+			status["id_str"] = str(SEARCH_TOP - k)
+			statuses.append(status)
+		return {"statuses": statuses, "search_metadata": {"count": count}}
+
+	def full_archive(self, max_results, next_token=None):
+		""" The first archive_size results of the search stream, paged with the next token """
+		first = 0 if next_token is None else int(next_token)
+		count = min(max_results, self.archive_size - first)
+		body = {"results": self.search(count, SEARCH_TOP - first)["statuses"]}
+		if first + count < self.archive_size:
+			body["next"] = str(first + count)
+		return body
+
+	def handle(self, path, params):
+		""" Returns (status code, headers, body) for a GET request """
+		try:
+			endpoint, default_count = ROUTES[path] if not path.startswith(ARCHIVE_PATH) else ("full_archive", 100)
+		except KeyError:
+			return 404, {}, {"errors": [{"code": 34, "message": "Sorry, that page does not exist."}]}
+
+		with self._lock:
+			self.requests[endpoint] += 1
+			allowed, headers = take_request(self.windows[endpoint], self.rate_limits)
+		if not allowed:
+			return 429, headers, RATE_LIMIT_ERROR
+
+		time.sleep(self.latency)
+		count = int(params.get("count", default_count))
+		if endpoint == "full_archive":
+			body = self.full_archive(int(params.get("maxResults", default_count)), params.get("next"))
+		elif endpoint == "search":
+			body = self.search(count, params.get("max_id"))
+		elif endpoint == "user_timeline":
+			user_id = params.get("user_id", params.get("id"))
+			if user_id in self.protected_users:
+				return 401, headers, NOT_AUTHORIZED_ERROR
+			body = self.timeline(user_id, count, params.get("max_id"), params.get("since_id"))
+		elif endpoint == "statuses_lookup":
+			tweet_ids = [int(i) for i in params["id"].split(",")]
+			body = [self.status(i) for i in tweet_ids if not (self.deleted_every and i % self.deleted_every == 0)]
+			if params.get("tweet_mode") == "extended":
+				for status in body:
+					status["full_text"] = status["text"]
+		else:
+			body = self.user(params.get("user_id", params.get("id")))
+		return 200, headers, body
+
+
+class FakeTwitterServer(ThreadingHTTPServer):
+	""" HTTP server around a FakeTwitter, runs in a background thread """
+	daemon_threads = True
+
+	def __init__(self, twitter, address=("127.0.0.1", 0)):
+		super().__init__(address, FakeTwitterHandler)
+		self.twitter = twitter
+
+	@property
+	def url(self):
+		return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+	def start(self):
+		thread = threading.Thread(target=self.serve_forever, daemon=True)
+		thread.start()
+		return self
+
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+
+	def do_GET(self):
+		url = urlparse(self.path)
+		params = {key: values[0] for key, values in parse_qs(url.query).items()}
+		code, headers, body = self.server.twitter.handle(url.path, params)
+		payload = json.dumps(body).encode()
+		self.send_response(code)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(payload)))
+		for key, value in headers.items():
+			self.send_header(key, value)
+		self.end_headers()
+		self.wfile.write(payload)
+
+	def log_message(self, format, *args):
+		""" No logging for every request """
+		pass
+
+
+@contextlib.contextmanager
+def redirect_twitter(url, twitter_url=TWITTER_URL):
+	""" tweepy always requests https://api.twitter.com (or twitter_url), while active these requests go to url instead """
+	original_request = requests.Session.request
+
+	def request(session, method, request_url, *args, **kwargs):
+		if request_url.startswith(twitter_url):
+			request_url = url + request_url[len(twitter_url):]
+		return original_request(session, method, request_url, *args, **kwargs)
+
+	requests.Session.request = request
+	try:
+		yield
+	finally:
+		requests.Session.request = original_request
+
+
+def make_auth_dir():
+	""" Creates a temporary directory with dummy app_auth and user_auth files for helper.get_api """
+	auth_dir = tempfile.mkdtemp(prefix="fake_auth_")
+	for name in ("app_auth", "user_auth"):
+		with open(os.path.join(auth_dir, name), "w") as f:
+			f.write("fake_key\nfake_secret\n")
+	return auth_dir + os.sep
@@ -0,0 +1,177 @@
+"""
+Number of tweets per user, day, model and label ("neg", "neut", "pos"), built once from the labelled timelines
+Any window, grouping, region or model is then sliced out of the cumulative sum over the days, without
+loading tweets or running a model: the count of days a to b is cumulative[b + 1] - cumulative[a].
+Windows have whole days, a window of start_date to end_date counts every tweet of those days.
+A timeline can reach back years, the days of the cube are clipped to a range (see Analyzer.count_sentiments_per_day).
+Saved as one .npz file (counts, first day, user ids, regions, models).
+"""
+import os
+
+import numpy as np
+
+from date_buckets import DayBuckets, to_datetime64
+from sentiment_matrix import SentimentMatrix, LABEL_INDEX
+
+# Default file name in the users_dir of the analyzer
+CUBE_FILENAME = "count_cube.npz"
+# Region of users whose region is not known
+NO_REGION = -1
+
+
+class CountCube:
+	"""
+	:param first_day: datetime64[D] of the first day
+	:param num_days: number of days from first_day on
+	:param counts: int array users x num_days x models x labels (LABEL_INDEX)
+	:param regions: region (e.g. the full scan location index) of every user, NO_REGION if not known
+	"""
+
+	def __init__(self, first_day, num_days, user_ids, models, counts, regions=None):
+		self.first_day = np.datetime64(first_day, "D")
+		self.user_ids = list(user_ids)
+		self.models = list(models)
+		self.counts = np.asarray(counts, dtype=np.int32).reshape(len(self.user_ids), num_days, len(self.models), len(LABEL_INDEX))
+		self.regions = np.full(len(self.user_ids), NO_REGION) if regions is None else np.asarray(regions, dtype=np.int64)
+		self._cumulative = None
+
+	@classmethod
+	def from_labels(cls, models, users, first_day=None, last_day=None):
+		"""
+		:param users: (user_id, region, tweets, labels per model) per user, labels[model][i] is the label of tweets[i]
+						or None if that tweet has no label of the model
+		:param first_day: tweets of earlier days are left out, None to keep them
+		:param last_day: tweets of later days are left out, None to keep them
+		"""
+		days = [to_datetime64((tweet.created_at for tweet in tweets), len(tweets)).astype("datetime64[D]")
+				for user_id, region, tweets, labels in users]
+		# Tweets of every user in the range
+		in_range = [np.ones(len(user_days), dtype=bool) for user_days in days]
+		for user_days, keep in zip(days, in_range):
+			if first_day is not None:
+				keep &= user_days >= np.datetime64(first_day, "D")
+			if last_day is not None:
+				keep &= user_days <= np.datetime64(last_day, "D")
+		days = [user_days[keep] for user_days, keep in zip(days, in_range)]
+		if not any(len(user_days) for user_days in days):
+			return cls.empty(models, [user[0] for user in users], [user[1] for user in users])
+		first_day = min(user_days.min() for user_days in days if len(user_days))
+		num_days = int((max(user_days.max() for user_days in days if len(user_days)) - first_day) / np.timedelta64(1, "D")) + 1
+		counts = np.zeros((len(users), num_days, len(models), len(LABEL_INDEX)), dtype=np.int32)
+		for row, ((user_id, region, tweets, labels), user_days, keep) in enumerate(zip(users, days, in_range)):
+			day_index = (user_days - first_day).astype(np.int64)
+			for m, model in enumerate(models):
+				label_index = np.array([LABEL_INDEX.get(label, -1) for label in labels[model]], dtype=np.int64)[keep]
+				labelled = label_index >= 0
+				np.add.at(counts[row, :, m], (day_index[labelled], label_index[labelled]), 1)
+		return cls(first_day, num_days, [user[0] for user in users], models, counts, [user[1] for user in users])
+
+	@classmethod
+	def empty(cls, models, user_ids=(), regions=None):
+		""" Cube without days, e.g. of users without tweets """
+		return cls(np.datetime64("today", "D"), 0, user_ids, models, np.zeros((len(user_ids), 0, len(models), len(LABEL_INDEX))),
+				   regions)
+
+	@classmethod
+	def concatenate(cls, cubes, models=None):
+		""" One cube with the users of all cubes (same models), days are padded to cover all of them
+		:param models: models of the empty cube returned if there are no cubes
+		"""
+		if not cubes:
+			return cls.empty(models or [])
+		for cube in cubes[1:]:
+			if cube.models != cubes[0].models:
+				raise ValueError("cubes have different models")
+		# Cubes without days (users without tweets) do not move the first or last day
+		dated = [cube for cube in cubes if cube.num_days] or cubes[:1]
+		first_day = min(cube.first_day for cube in dated)
+		num_days = max(int((cube.first_day - first_day) / np.timedelta64(1, "D")) + cube.num_days for cube in dated)
+		# Copied into one array, no padded copy of every cube
+		counts = np.zeros((sum(len(cube.user_ids) for cube in cubes), num_days) + cubes[0].counts.shape[2:], dtype=np.int32)
+		row = 0
+		for cube in cubes:
+			before = int((cube.first_day - first_day) / np.timedelta64(1, "D")) if cube.num_days else 0
+			counts[row:row + len(cube.user_ids), before:before + cube.num_days] = cube.counts
+			row += len(cube.user_ids)
+		return cls(first_day, num_days, [user_id for cube in cubes for user_id in cube.user_ids], cubes[0].models,
+				   counts, np.concatenate([cube.regions for cube in cubes]))
+
+	@classmethod
+	def load(cls, path):
+		with np.load(path) as data:
+			return cls(data["first_day"], data["counts"].shape[1], data["user_ids"].tolist(), data["models"].tolist(),
+					   data["counts"], data["regions"])
+
+	def save(self, path):
+		""" Written to path + ".part" and moved to path, an old cube stays complete until then """
+		with open(path + ".part", "wb") as f:
+			np.savez_compressed(f, first_day=self.first_day, user_ids=np.array(self.user_ids, dtype=str),
+								models=np.array(self.models, dtype=str), counts=self.counts, regions=self.regions)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(path + ".part", path)
+
+	@property
+	def num_days(self):
+		return self.counts.shape[1]
+
+	@property
+	def cumulative(self):
+		""" models x users x (days + 1) x labels, counts of all days before the index
+		Models first, so the slices of one model are contiguous
+		"""
+		if self._cumulative is None:
+			self._cumulative = np.zeros((len(self.models), len(self.user_ids), self.num_days + 1, len(LABEL_INDEX)),
+										dtype=np.int32)
+			np.cumsum(self.counts.transpose(2, 0, 1, 3), axis=2, out=self._cumulative[:, :, 1:])
+		return self._cumulative
+
+	def _day_index(self, days):
+		""" Index into cumulative of datetime64 days, clipped to the cube """
+		index = ((np.asarray(days, dtype="datetime64[D]") - self.first_day) / np.timedelta64(1, "D")).astype(np.int64)
+		return np.clip(index, 0, self.num_days)
+
+	def user_mask(self, regions=None, user_ids=None):
+		""" Boolean mask of the users in one of regions and user_ids (None: all) """
+		mask = np.ones(len(self.user_ids), dtype=bool)
+		if regions is not None:
+			mask &= np.isin(self.regions, list(regions))
+		if user_ids is not None:
+			mask &= np.isin(np.array(self.user_ids, dtype=str), [str(user_id) for user_id in user_ids])
+		return mask
+
+	@staticmethod
+	def _users(array, mask):
+		""" Rows of mask, without a copy if it has all """
+		return array if mask.all() else array[mask]
+
+	def window(self, start_date, end_date, model, regions=None, user_ids=None):
+		""" users x labels counts of the days of start_date to end_date, of the users in regions and user_ids """
+		start, end = self._day_index([np.datetime64(start_date, "D"), np.datetime64(end_date, "D") + np.timedelta64(1, "D")])
+		cumulative = self._users(self.cumulative[self.models.index(model)], self.user_mask(regions, user_ids))
+		return cumulative[:, end] - cumulative[:, start]
+
+	def matrix(self, start_date, end_date, group_by, model, regions=None, user_ids=None):
+		""" SentimentMatrix of model with groups of group_by days from start_date to end_date (like the Analyzer)
+		of the users in regions and user_ids (None: all)
+		"""
+		buckets = DayBuckets(start_date, end_date, group_by)
+		starts = self._day_index(buckets.edges)
+		ends = self._day_index(np.append(buckets.edges[1:].astype("datetime64[D]"),
+										  np.datetime64(end_date, "D") + np.timedelta64(1, "D")))
+		mask = self.user_mask(regions, user_ids)
+		cumulative = self._users(self.cumulative[self.models.index(model)], mask)
+		# The buckets follow each other, the end of one is the start of the next
+		boundaries = np.append(starts, ends[-1])
+		steps = np.diff(boundaries)
+		if len(steps) and steps[0] > 0 and (steps == steps[0]).all():
+			# Equally long buckets inside the cube, a view instead of a copy
+			counts = np.diff(cumulative[:, boundaries[0]:boundaries[-1] + 1:steps[0]], axis=1)
+		else:
+			counts = np.diff(cumulative[:, boundaries], axis=1)
+		return SentimentMatrix(buckets.labels, [user_id for user_id, keep in zip(self.user_ids, mask) if keep], counts)
+
+	def compare_models(self, start_date, end_date, group_by, weighting="user", regions=None):
+		""" Dict model -> summary dict (SentimentMatrix.summary) of the same window for every model """
+		return {model: self.matrix(start_date, end_date, group_by, model, regions).summary(weighting)
+				for model in self.models}
@@ -3,36 +3,88 @@ Crawler should do all the calls to the API and return the objects directly
 The main idea is that the crawler will get called once and with these objects in cash we can
 analyze them as many times as we want without querying another time
 """
+import functools
 import helper
+import math
+import rate_limit
 import tweepy 
+from archive_search import ArchiveSearch
+from metrics import Histogram, MetricsText, TIMELINE_BUCKETS, YIELD_BUCKETS
+from partial_timelines import PartialTimelines, PARTIAL, COMPLETE, TRUNCATED, TIMELINE_LIMIT
+from scan_journal import ScanJournal
+from stream_ingest import IngestListener, format_report
+from tweet_store import TweetStore, store_key
+from user_cache import UserActivityCache
+from user_registry import UserRegistry
+from write_sink import WriteBehindSink
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
 from datetime import datetime
 import json
-import numpy as np
 import os
 
 
 class Crawler:
 	""" Crawler class. Using the tweepy api to get tweets specified in the configs """
 	
-	def __init__(self, config):
-		""" Set configs to self values """
+	def __init__(self, config, read_only=False):
+		""" Set configs to self values
+		:param read_only: only reads saved timelines (e.g. the analysis next to a running crawl), the tweet store is not repaired
+		"""
 		self.config = config
 		self.api = self.get_api()
+		# One request budget per endpoint, shared by all threads
+		self.scheduler = rate_limit.RateLimitScheduler(self.config["user_auth"])
+		# Remembers is_good_user verdicts and the statuses fetched for them
+		self.user_cache = UserActivityCache(self.config["get_user"]["cache_ttl"])
+		# Saved timelines go to a TweetStore instead of one file per user, if configured
+		self.tweet_store = None
+		if "full_scan" in self.config and self.config["full_scan"]["store"]:
+			self.tweet_store = TweetStore(self.config["full_scan"]["store"], repair=not read_only)
+		# save_tweets only queues the tweets, a background thread writes them (config["write_behind"]),
+		# not used by get_timeline_resumable
+		self.sink = None
+		if "write_behind" in self.config and self.config["write_behind"]["active"]:
+			opts = self.config["write_behind"]
+			self.sink = WriteBehindSink(self.tweet_store, opts["durability"], opts["fsync_interval"], opts["max_pending"],
+										opts["writers"])
+		# Timelines of get_full_timeline_until, created on first use
+		self.partial_timelines = None
 		# Set this parameter during full scan
-		self.unique_user_ids = set(())
+		self.unique_user_ids = UserRegistry()
+		# The filter config compiled once, see compile_filter
+		self._check = compile_filter(self.config["search"]["filter"])
+		# Tweets checked and rejected by not_reply / not_retweet on the client and search requests with
+		# these filters in the query, to estimate the requests the pushdown saves (see pushdown_savings)
+		self.filter_stats = {"checked": 0, "rejected": 0, "pushdown_requests": 0}
+		self._stats_lock = threading.Lock()
+		# For write_metrics: is_good_user verdicts (checked with requests or from the user cache),
+		# share of kept tweets per page and kept tweets per timeline
+		self.user_stats = {"accepted": 0, "rejected": 0, "cached_accepted": 0, "cached_rejected": 0}
+		self.page_yield = Histogram(YIELD_BUCKETS)
+		self.timeline_yield = Histogram(TIMELINE_BUCKETS)
+		self._metrics_lock = threading.Lock()
+		# save_checkpoint runs on the crawl thread and on the threads of the write-behind sink
+		self._checkpoint_lock = threading.Lock()
 		
 	def check_config():
 		""" Check some elements in the config """
 		raise NotImplementedError
 		
 	def get_api(self):
+		# The scheduler waits for rate limits, tweepy should not sleep on its own
 		try:
-			api = helper.get_api(self.config["user_auth"], self.config["auth_path"])
+			api = helper.get_api(self.config["user_auth"], self.config["auth_path"], wait_on_rate_limit=False)
 		except KeyError:
-			api = helper.get_api(self.config["user_auth"])
+			api = helper.get_api(self.config["user_auth"], wait_on_rate_limit=False)
 		return api
 	
+	def _limited(self, endpoint):
+		""" Returns the api method of endpoint, going through the rate limit scheduler for every request """
+		return rate_limit.limited(self.api, self.scheduler, endpoint)
+	
 	def get_users(self):
 		""" returns users objects """
 		if self.config["get_user"]["search_type"] == "recent_user":
@@ -46,7 +98,7 @@ class Crawler:
 	
 	def get_user_from_id(self, user_id):
 		""" id specifies the id or screen name of the user """
-		user = self.api.get_user(user_id)
+		user = self._limited("get_user")(user_id)
 		return user
 	
 	def get_tweets(self):
@@ -54,62 +106,80 @@ class Crawler:
 		Callable from outside get tweets function
 		Will return tweet objects for num_resuts and specific settings
 		"""
-		iterator = self._get_tweet_iterator()
-		res_tweets, _ = self._get_from_iterator(iterator)
+		pushdown = self.config["search"]["pushdown"]
+		requests_before = self.scheduler.requests["search"]
+		iterator = self._get_tweet_iterator(pushdown=pushdown)
+		res_tweets, _ = self._get_from_iterator(iterator, count_filtered=not pushdown)
+		if pushdown:
+			with self._stats_lock:
+				self.filter_stats["pushdown_requests"] += self.scheduler.requests["search"] - requests_before
 		
 		return res_tweets
 	
+	def _get_archive_search(self):
+		""" ArchiveSearch of config["full_search"], continues the cursor saved in its path """
+		opts = self.config["full_search"]
+		return ArchiveSearch(self.api, opts["env_name"], opts["query"], opts["fromDate"], opts["toDate"],
+							 opts["path"], opts["max_results"], opts["monthly_quota"], self.scheduler)
+	
 	def _get_full_search_iterator(self):
-		""" get full search iterator 
-		NOT TESTED!
+		""" Tweets iterator of the full archive search (premium api), pages with the next token
+		and stops when the monthly quota is used up
 		"""
-		opts = self.config["full_search"]
-		iterator = tweepy.Cursor(craw.api.search_full_archive,
-					query=opts["query"], 
-					fromDate=opts["fromDate"], 
-					toDate=opts["toDate"],
-					environment_name=opts["env_name"])
-		return iterator
+		return self._get_archive_search().tweets()
 	
-	def _get_tweet_iterator(self, geocode=None):
+	def _get_tweet_iterator(self, geocode=None, pushdown=False):
 		"""
 		Main connection to tweepy
 		Returns tweets ITERATOR from tweepy Cursor search with specified settings
 		from self.config
 		Note: Does NOT do a request! Only when iterating over tweets, it will do the requests
+		:param pushdown: add the filters to the query (push_down_filters), only for searches that apply them anyway
 		"""
 		
 		if geocode is None:
 			geocode=self.config["search"]["geocode"]
 		
-		tweets = tweepy.Cursor(self.api.search, q=self.config["search"]["query"],
+		query = self.config["search"]["query"]
+		if pushdown:
+			query = push_down_filters(query, self.config["search"]["filter"])
+		
+		tweets = tweepy.Cursor(self._limited("search"), q=query,
 							 geocode=geocode).items(self.config["search"]["max_searches"])
 		return tweets
 	
-	def _get_from_iterator(self, iterator):
+	def _get_from_iterator(self, iterator, count_filtered=True):
 		""" should be used interally only
-		given an iteratior will search through tweets with filtering and stuff	
+		given an iteratior will search through tweets with filtering and stuff
 		return code 1 for number of results reached, -1 for search reached end point e.g. (time)
+		:param count_filtered: add to filter_stats, False if the filters were already pushed into the query
 		"""
 		return_code = 0
 		
 		res_tweets = []
 		num_results = 0
 		checked_tweets = 0
+		rejected_tweets = 0
+		num_results_max = self.config["search"]["num_results"]
 		for tweet in iterator:
 			checked_tweets += 1
-			if self.check_tweet(tweet) == 1:
+			code = self._check(tweet)
+			if code == 1:
 				num_results += 1
 				res_tweets.append(tweet)
-				if num_results == self.config["search"]["num_results"]:
+				if num_results == num_results_max:
 					# print("Number of results reached")
 					return_code = 1
 					break
-			elif self.check_tweet(tweet) == -1:
+			elif code == -1:
 				# print("Search reached end point")
 				return_code = -1
 				break
-			
+			else:
+				rejected_tweets += 1
+
+		if count_filtered:
+			self._count_filtered(checked_tweets, rejected_tweets)
 		self.rate_limit(checked_tweets)
 		return res_tweets, return_code
 	
@@ -121,19 +191,27 @@ class Crawler:
 		1 -> fitting all filter configs
 		-1 -> Not fitting and search should stop
 		"""
-		if self.config["search"]["filter"]["until"]:
-			if tweet.created_at < self.config["search"]["filter"]["until"]:
-				return -1
-				
-		if self.config["search"]["filter"]["not_reply"]:
-			if helper.is_reply(tweet):
-				return 0
-				
-		if self.config["search"]["filter"]["not_retweet"]:
-			if helper.is_retweet(tweet):
-				return 0
-		
-		return 1
+		return self._check(tweet)
+	
+	def _count_filtered(self, checked, rejected):
+		with self._stats_lock:
+			self.filter_stats["checked"] += checked
+			self.filter_stats["rejected"] += rejected
+		if checked:
+			self.page_yield.observe((checked - rejected) / checked)
+	
+	def pushdown_savings(self):
+		""" Estimated search requests the filters in the query saved, None if nothing was filtered on the client yet
+		Not measured: it assumes that without the pushdown, the share of tweets rejected on the client (mostly
+		timelines) would have come back from the search too, every kept page would have needed 1 / (1 - share) pages.
+		Only get_tweets pushes the filters down, the full scan searches for users and never does
+		"""
+		with self._stats_lock:
+			stats = dict(self.filter_stats)
+		if stats["checked"] == 0 or stats["rejected"] == stats["checked"]:
+			return None
+		share = stats["rejected"] / stats["checked"]
+		return round(stats["pushdown_requests"] * share / (1 - share))
 	
 	def get_recent_users(self, geocode=None):
 		""" Looks for recent tweets given a query and a geocode
@@ -150,16 +228,19 @@ class Crawler:
 		tweets_iter = self._get_tweet_iterator(geocode)
 		for tweet in tweets_iter:
 			current_user = tweet.user
-			if not current_user.id in user_ids:
-				if self.is_good_user(current_user.id):
-					users.append(current_user)
-					user_ids.add(current_user.id)
-					num_results += 1
-					if num_results == num_users:
-						break
-	
-		if self.config["get_user"]["unique_ids"]:
-			self.unique_user_ids.update(user_ids)
+			# Saved user ids are strings, claim fails if the user is saved or another region checks it right now
+			if not user_ids.claim(current_user.id_str):
+				continue
+			good_user = False
+			try:
+				good_user = self.is_good_user(current_user.id)
+			finally:
+				user_ids.release(current_user.id_str, keep=good_user)
+			if good_user:
+				users.append(current_user)
+				num_results += 1
+				if num_results == num_users:
+					break
 			
 		self.rate_limit()
 		return users
@@ -201,9 +282,32 @@ class Crawler:
 		:param num_searches: default 100, if a person did 100 retweets and the 101 action is a post, 
 							 this will not see the user as good. Higher number for more accuracy,
 							 but longer runtime and more queries 
+		The verdict is cached for config["get_user"]["cache_ttl"] seconds, the statuses of good users 
+		are kept as start of their timeline (see _get_timeline_iterator)
 		"""
+		verdict = self.user_cache.verdict(user_id)
+		if verdict is not None:
+			self._count_user(verdict, cached=True)
+			return verdict
+		
+		statuses = list(tweepy.Cursor(self._limited("user_timeline"), id=user_id).items(num_searches))
+		verdict = self._check_user_activity(statuses)
+		complete = len(statuses) < num_searches
+		self.user_cache.put(user_id, verdict, statuses if verdict else None, complete)
+		self._count_user(verdict)
+		return verdict
+	
+	def _count_user(self, verdict, cached=False):
+		with self._stats_lock:
+			self.user_stats[("cached_" if cached else "") + ("accepted" if verdict else "rejected")] += 1
+	
+	def _check_user_activity(self, statuses):
+		""" Decides if the user of these statuses (newest first) is good, see is_good_user """
+		if len(statuses) == 0:
+			return False
+		
 		days_until = []
-		for status in tweepy.Cursor(self.api.user_timeline, id=user_id).items(num_searches):
+		for status in statuses:
 			last_action = status
 			if not helper.is_retweet(status) and not helper.is_reply(status):
 				days_until.append(helper.days_until(status.created_at))
@@ -222,88 +326,305 @@ class Crawler:
 	
 	def rate_limit(self, num_checked_tweets=None):
 		""" 
-		Prints rate limit informations to the specific request (if active in configs)
-		Should be called by every function after calling the api
+		Prints rate limit informations of the scheduler (if active in configs)
+		Should be called by every function after calling the api, also writes the metrics file
 		"""
+		self.write_metrics()
 		if not self.config["search"]["rate_limit"]:
 			return
 		
 		if num_checked_tweets:
 			print("Checked Tweets:", num_checked_tweets)
-
-		head = self.api.last_response.headers	
-		print("remaining requests:", head['x-rate-limit-remaining'])
 		
-		# TODO I don't know how I can get that 15 not hardcoded
-		print("tweets remaining: ~", int(head['x-rate-limit-remaining']) * 15)
+		metrics = self.scheduler.metrics()
+		for endpoint, remaining in metrics["remaining"].items():
+			print(f"{endpoint}: {metrics['requests'][endpoint]} requests, {remaining} remaining, "
+				  f"reset at: {metrics['reset'][endpoint]}")
+		print(f"idle: {metrics['idle_time']:.0f}s of {metrics['elapsed_time']:.0f}s x {metrics['workers']} workers "
+			  f"({metrics['idle_ratio']:.0%})")
+		if metrics["queued_jobs"]:
+			print("queued jobs:", metrics["queued_jobs"], "done at:", metrics["predicted_completion"])
+		if self.filter_stats["pushdown_requests"]:
+			saved = self.pushdown_savings()
+			print(f"filters in query (get_tweets): {self.filter_stats['pushdown_requests']} search requests, "
+				  f"estimated saving: {'unknown' if saved is None else f'~{saved}'} requests")
+	
+	def write_metrics(self, path=None):
+		""" Writes requests, latency, rate limit sleep, filter and user stats in Prometheus text format
+		to path (default config["metrics_path"], nothing is written if both are None), see metrics.py
+		"""
+		path = self.config.get("metrics_path") if path is None else path
+		if path is None:
+			return
+		scheduler = self.scheduler
+		endpoints = list(scheduler.windows)
+		with self._stats_lock:
+			filter_stats = dict(self.filter_stats)
+			user_stats = dict(self.user_stats)
 		
-		reset = int(head['x-rate-limit-reset'])
-		time_until = reset - time.time()
-		print("reset at:", datetime.fromtimestamp(reset))
-		print(f"reset in: {int(time_until // 60):02d}:{int(time_until % 60):02d}")
+		text = MetricsText()
+		text.add("crawler_requests_total", "counter", "Requests per endpoint",
+				 [({"endpoint": e}, scheduler.requests[e]) for e in endpoints])
+		text.add_histogram("crawler_request_seconds", "Request latency per endpoint",
+						   [({"endpoint": e}, scheduler.latency[e]) for e in endpoints])
+		text.add("crawler_rate_limit_sleep_seconds_total", "counter", "Seconds slept waiting for rate limit budget",
+				 [({"endpoint": e}, scheduler.endpoint_idle_time[e]) for e in endpoints])
+		text.add("crawler_rate_limit_remaining", "gauge", "Requests left in the current window",
+				 [({"endpoint": e}, scheduler.windows[e].remaining) for e in endpoints])
+		text.add("crawler_elapsed_seconds", "gauge", "Seconds since the crawler started",
+				 [({}, time.time() - scheduler.start_time)])
+		text.add("crawler_tweets_checked_total", "counter", "Tweets checked by the filters (check_tweet)",
+				 [({}, filter_stats["checked"])])
+		text.add("crawler_tweets_kept_total", "counter", "Tweets that passed the filters",
+				 [({}, filter_stats["checked"] - filter_stats["rejected"])])
+		text.add_histogram("crawler_page_yield", "Share of the tweets of a page that passed the filters",
+						   [({}, self.page_yield)])
+		text.add_histogram("crawler_timeline_kept_tweets", "Saved tweets per timeline of the full scan",
+						   [({}, self.timeline_yield)])
+		text.add("crawler_users_checked_total", "counter", "Users checked by is_good_user, with requests or from the user cache",
+				 [({"verdict": verdict, "source": source}, user_stats[prefix + verdict])
+				  for source, prefix in (("api", ""), ("cache", "cached_")) for verdict in ("accepted", "rejected")])
+		text.add("crawler_user_cache_hits_total", "counter", "is_good_user verdicts from the user cache",
+				 [({}, user_stats["cached_accepted"] + user_stats["cached_rejected"])])
+		if self.sink is not None:
+			text.add("crawler_sink_written_tweets_total", "counter", "Tweets written by the write-behind sink",
+					 [({}, self.sink.written)])
+			text.add("crawler_sink_write_seconds_total", "counter", "Seconds the write-behind sink spent writing",
+					 [({}, self.sink.write_time)])
+			text.add("crawler_sink_queued_batches", "gauge", "Batches waiting for the write-behind sink",
+					 [({}, self.sink.queued())])
+		with self._metrics_lock:
+			text.write(path)
 	
 	def compare_users_and_tweets(self):
 		""" Looks at the user ids and compares them to saved tweets """
 		self.unique_user_ids = self.load_user_list()
 		
-		# get tweet filenames:
-		scanned_tweets = []
-		for i in range(3):
-			path = self.config["full_scan"]["path"] + "tweets/" + str(i) + "/"
-			tweets = os.listdir(path)
-			scanned_tweets += tweets
+		# Users with saved tweets, in a temporary file
+		scanned_path = self.config["full_scan"]["path"] + "users/scanned_registry"
+		if os.path.isfile(scanned_path):
+			os.remove(scanned_path)
+		scanned = UserRegistry(scanned_path)
+		num_scanned = 0
+		for i in range(len(self.config["full_scan"]["locations"])):
+			num_scanned += scanned.update(self._saved_user_ids(i))
 		
-		print("Scanned Tweets:", len(scanned_tweets))
-		unique_list = set(scanned_tweets)
-		print("Unique Tweets:", len(unique_list))
+		common = self.unique_user_ids.count_common(scanned)
+		print("Scanned Tweets:", num_scanned)
+		print("Unique Tweets:", len(scanned))
 		print("Unique user_ids:", len(self.unique_user_ids))
-		print("XOR:", len(self.unique_user_ids ^ unique_list))
-		print("user - tweets:", len(self.unique_user_ids - unique_list))
-		print("tweets - user:", len(unique_list - self.unique_user_ids))
+		print("XOR:", len(self.unique_user_ids) + len(scanned) - 2 * common)
+		print("user - tweets:", len(self.unique_user_ids) - common)
+		print("tweets - user:", len(scanned) - common)
+		if os.path.isfile(scanned_path):
+			os.remove(scanned_path)
 	
-	def _get_timeline_iterator(self, user):
-		""" Returns timeline (tweepy iterator) of user object"""
-		timeline = tweepy.Cursor(self.api.user_timeline, id=user.id_str).items(self.config["search"]["max_searches"])
+	def _saved_user_ids(self, idx):
+		""" Yields the ids of the users with saved tweets in location idx, files and store """
+		path = self.config["full_scan"]["path"] + "tweets/" + str(idx) + "/"
+		with os.scandir(path) as entries:
+			for entry in entries:
+				if entry.name.isdigit():
+					yield entry.name
+		if self.tweet_store is not None:
+			for key in self.tweet_store.keys(idx):
+				yield key.split("/")[1]
+	
+	def _get_timeline_iterator(self, user, since_id=None):
+		""" Returns timeline (tweepy iterator) of user object
+		Starts with the statuses is_good_user already fetched for this user, if there are any
+		:param since_id: only tweets newer than this id, None for the whole timeline
+		"""
+		max_searches = self.config["search"]["max_searches"]
+		if since_id is None:
+			statuses, complete = self.user_cache.pop_statuses(user.id_str)
+			if statuses:
+				return self._continue_timeline(user, statuses, complete, max_searches)
+		
+		timeline = tweepy.Cursor(self._limited("user_timeline"), id=user.id_str, 
+								 since_id=since_id).items(max_searches)
 		return timeline
+	
+	def _continue_timeline(self, user, statuses, complete, max_searches):
+		""" Iterates over the cached statuses and then requests the older rest of the timeline """
+		yield from statuses[:max_searches]
+		remaining = max_searches - len(statuses)
+		if complete or remaining <= 0:
+			return
+		yield from tweepy.Cursor(self._limited("user_timeline"), id=user.id_str, 
+								 max_id=statuses[-1].id - 1).items(remaining)
 
-	def get_timeline(self, user):
+	def get_timeline(self, user, since_id=None):
 		""" Seraches through timeline of one user and returns tweet objects (applies search options) """
-		iterator = self._get_timeline_iterator(user)
+		iterator = self._get_timeline_iterator(user, since_id)
 		res_tweets, return_code = self._get_from_iterator(iterator)
 		
 		return res_tweets
 
 	def get_full_timeline_until(self, user):
-		""" Searches through a full timeline and returns no tweets if it was not able to search the whole timeline """
-		iterator = self._get_timeline_iterator(user)
-		res_tweets, return_code = self._get_from_iterator(iterator)
-		if return_code == -1:
-			# analyzed all tweets until specified time
-			return res_tweets
-		else:
+		""" Searches through a full timeline and returns no tweets if it was not able to search the whole timeline
+		The fetched part is kept (config["full_timeline"]["path"], see partial_timelines.py), the next call for
+		this user continues where this one stopped, until the timeline reaches the until date of the filter
+		"""
+		if self.continue_timeline(user) != COMPLETE:
 			return []
+		tweets = self._get_partial_timelines().load(user.id_str)
+		return [tweepy.models.Status.parse(self.api, tweet) for tweet in tweets]
+	
+	def _get_partial_timelines(self):
+		if self.partial_timelines is None:
+			self.partial_timelines = PartialTimelines(self.config["full_timeline"]["path"])
+		return self.partial_timelines
+	
+	def continue_timeline(self, user):
+		""" Fetches up to config["search"]["max_searches"] more tweets of the timeline of user, back to the until date
+		Every page is saved with the max_id to continue at
+		:return: state of the timeline, partial_timelines.PARTIAL, COMPLETE or TRUNCATED
+		"""
+		timelines = self._get_partial_timelines()
+		record = timelines.get(user.id_str)
+		if record is not None and record["state"] != PARTIAL:
+			return record["state"]
+		max_id = record["max_id"] if record is not None else None
+		fetched = record["fetched"] if record is not None else 0
 		
+		max_searches = self.config["search"]["max_searches"]
+		seen = 0
+		for page in self._timeline_pages(user, max_id):
+			res_tweets = []
+			state = PARTIAL
+			for tweet in page:
+				code = self._check(tweet)
+				if code == -1:
+					state = COMPLETE
+					break
+				if code == 1:
+					res_tweets.append(tweet)
+			self._count_filtered(len(page), len(page) - len(res_tweets))
+			fetched += len(page)
+			seen += len(page)
+			max_id = page[-1].id - 1
+			timelines.save_page(user.id_str, res_tweets, max_id, fetched, state)
+			if state != PARTIAL or seen >= max_searches:
+				return state
+		
+		# The timeline ended before the until date
+		state = TRUNCATED if fetched >= TIMELINE_LIMIT else COMPLETE
+		timelines.save_page(user.id_str, [], max_id, fetched, state)
+		return state
+	
+	def continue_partial_timelines(self):
+		""" Continues every partial timeline of get_full_timeline_until, config["full_scan"]["workers"] at a time
+		:return: dict state -> number of users
+		"""
+		if self.partial_timelines is None and not os.path.isdir(self.config["full_timeline"]["path"]):
+			return {}
+		timelines = self._get_partial_timelines()
+		# Every page of the timeline holds 20 tweets
+		cost = math.ceil(self.config["search"]["max_searches"] / 20)
+		for user_id in timelines.users((PARTIAL,)):
+			self.scheduler.submit("user_timeline", self.continue_timeline, ReducedUser(user_id), cost=cost)
+		
+		states = {PARTIAL: 0, COMPLETE: 0, TRUNCATED: 0}
+		for job, state in self.scheduler.run(self.config["full_scan"]["workers"]):
+			states[state] += 1
+		return states
+	
 	
 	def get_timeline_tweets_from_user_list(self, users):
 		"""Returns a nestedlist, where each element of the outer list contains a list with all tweets of the user"""
 		all_tweets = [self.get_timeline(user) for user in users]
 		return all_tweets
+	
+	def fetch_timelines(self, users):
+		""" Fetches the timelines of users with config["full_scan"]["workers"] requests in flight
+		Yields (user, tweets) tuples in the order the timelines are completed
+		"""
+		# Every page of the timeline holds 20 tweets
+		cost = math.ceil(self.config["search"]["max_searches"] / 20)
+		for user in users:
+			self.scheduler.submit("user_timeline", self.get_timeline, user, cost=cost)
 		
+		for job, tweets in self.scheduler.run(self.config["full_scan"]["workers"]):
+			yield job.args[0], tweets
+	
+	def fetch_new_tweets(self, users, since_ids):
+		""" get_new_tweets for all users with config["full_scan"]["workers"] requests in flight
+		Yields (user, tweets, id of the newest fetched tweet) in the order they are completed
+		:param since_ids: dict user_id -> since_id
+		"""
+		for user in users:
+			self.scheduler.submit("user_timeline", self.get_new_tweets, user, since_ids.get(user.id_str), cost=1)
 		
-	def save_tweets(self, tweets, file_name, configs=True):
-		""" Takes list of tweet objects and saves to file"""
+		for job, (tweets, newest_id) in self.scheduler.run(self.config["full_scan"]["workers"]):
+			yield job.args[0], tweets, newest_id
+	
+	def get_new_tweets(self, user, since_id):
+		""" Tweets of user newer than since_id that pass the filter, every page back to since_id
+		Unlike get_timeline there is no max_searches or num_results cap, which would leave a gap behind the checkpoint
+		:return: (tweets, id of the newest fetched tweet, kept or not, None if there was none)
+		"""
+		res_tweets = []
+		newest_id = None
+		checked = 0
+		rejected = 0
+		stop = False
+		pages = tweepy.Cursor(self._limited("user_timeline"), id=user.id_str, since_id=since_id, count=200).pages()
+		for page in pages:
+			if newest_id is None and page:
+				newest_id = page[0].id
+			for tweet in page:
+				checked += 1
+				code = self._check(tweet)
+				if code == 1:
+					res_tweets.append(tweet)
+				elif code == -1:
+					# Older than the until date
+					stop = True
+					break
+				else:
+					rejected += 1
+			if stop:
+				break
+		if since_id is not None and not stop and checked >= TIMELINE_LIMIT:
+			print(f"Warning: more than {TIMELINE_LIMIT} new tweets of {user.id_str}, "
+				  f"the timeline does not reach back to the checkpoint")
+		self._count_filtered(checked, rejected)
+		self.rate_limit(checked)
+		return res_tweets, newest_id
+		
+		
+	def save_tweets(self, tweets, file_name, configs=True, append=False, then=None):
+		""" Takes list of tweet objects and saves to file
+		:param append: add the tweets to the end of an existing file, 
+					   the file is then no longer sorted from new to old
+		:param then: called once the tweets are written, with a write-behind sink that is later,
+					 on the thread of the sink (see write_sink.py)
+		"""
 		# TODO check if path exists and create new if needed
 		
 		# Checks path and returns if file is already existing:
 		
-		if os.path.isfile(file_name):
+		if self._has_saved(file_name) and not append:
 			print("File already existing, exiting...")
 			return 
-			
-		with open(file_name, "w") as f:
-			for tweet in tweets:
-				json.dump(tweet._json, f)
-				f.write('\n')
+		if append and not tweets:
+			# Nothing to add, but e.g. the checkpoint still moves on
+			if then is not None:
+				then()
+			return
+		
+		if self.sink is not None:
+			self.sink.submit(tweets, file_name, append, then)
+		elif self.tweet_store is not None:
+			self.tweet_store.append(store_key(file_name), [tweet._json for tweet in tweets])
+		else:
+			with open(file_name, "a" if append else "w") as f:
+				for tweet in tweets:
+					json.dump(tweet._json, f)
+					f.write('\n')
+		if self.sink is None and then is not None:
+			then()
 		
 		if configs:
 			# saves extra file without .json with infos about it:
@@ -313,54 +634,409 @@ class Crawler:
 				f.write(str(self.config))
 		
 
-	def load_tweet(self, file_name, is_dict=False):
+	def load_tweet(self, file_name, is_dict=False, size=None):
 		""" Loads tweet from json file and uses api to convert back to object 
 		:param api: api for conversion, is not needed if is_dict is true
 		:param is_dict: True -> will return dictionary instead of Tweet object,
 						 should be faster, may be useful for a lot of tweets
+		:param size: only the tweets in the first size bytes of the file, see load_tweet_dicts
 		:return: Tweet Object or Dict (if is_dict is true)"""
 		
-		tweets = []
-		
-		with open(file_name) as f:
-			for line in f:
-				tweet = json.loads(line)			
-				if not is_dict:
-					tweet = tweepy.models.Status.parse(self.api, tweet)
-				tweets.append(tweet)
+		tweets = load_tweet_dicts(file_name, self.tweet_store, size)
+		if not is_dict:
+			tweets = [tweepy.models.Status.parse(self.api, tweet) for tweet in tweets]
 				
 		return tweets
 	
 	def full_scan(self):
-		""" Do a full scan over all different locations: """
+		""" Do a full scan over all different locations: 
+		The users of the scan and every saved page of their timelines are written to a journal,
+		if the last scan did not finish, it is continued first
+		"""
+		self._check_locations()
+		# A new tiling may bring more locations than the directories there are
+		os.makedirs(self.config["full_scan"]["path"] + "users", exist_ok=True)
+		for idx in range(len(self.config["full_scan"]["locations"])):
+			os.makedirs(self.config["full_scan"]["path"] + "tweets/" + str(idx), exist_ok=True)
+			# Empty user list, so every location index has one
+			open(self.config["full_scan"]["path"] + "users/users_" + str(idx), "a").close()
+		
 		# Load old user_ids 
 		self.unique_user_ids = self.load_user_list()
+		self.journal = ScanJournal(self.config["full_scan"]["path"] + "journal")
+		
+		if not self.journal.finished:
+			print("Resuming unfinished scan...")
+			self.resume_scan()
 		
 		# Scan for users
 		print("Scanning for Users...")
-		users_list = []
-		for location in self.config["full_scan"]["locations"]:
-			geocode = helper.geocode_from_location(location)
-			users_list.append(self.get_recent_users(geocode=geocode))
+		users_list = self.discover_users()
 		
-		print(np.shape(users_list))
+		print([len(users) for users in users_list])
+		
+		# Write ahead: the journal knows the users before anything else is saved
+		self.journal.begin(users_list)
 	
 		print("Saving new User List")
 		# Append new users to saved list
 		self.save_user_list(users_list)
 		
+		if self.config["full_scan"]["incremental"]:
+			self.update_timelines()
 		
 		# Scan and save tweets of these users
-		for idx, users in enumerate(users_list):
-			print("\nScanning and saving tweets:", idx)
-			for u_idx, user in enumerate(users):
-				print(f"{u_idx}-", end="")
-				path = self.config["full_scan"]["path"] + "tweets/" + str(idx) + "/" + user.id_str
-				tweets = self.get_timeline(user)
-				self.save_tweets(tweets, path, configs=False)
+		print("\nScanning and saving tweets")
+		self._scan_timelines(dict(enumerate(users_list)))
+		self.journal.finish()
 		
+		if self.config["full_timeline"]["continue_in_scan"]:
+			states = self.continue_partial_timelines()
+			if sum(states.values()):
+				print("\nContinued partial timelines:", states)
+	
+	def _check_locations(self):
+		""" The location indexes of a scan directory (users_<idx>, tweets/<idx>) are its regions in the analysis,
+		a scan with other locations (e.g. a new tiling) would mix them up. The geocodes of the locations
+		are saved in <path>/locations.json by the first scan, later scans with other ones raise ValueError.
+		"""
+		path = self.config["full_scan"]["path"]
+		locations_path = path + "locations.json"
+		geocodes = [helper.geocode_from_location(location) for location in self.config["full_scan"]["locations"]]
+		if os.path.isfile(locations_path):
+			with open(locations_path) as f:
+				saved = json.load(f)
+			if saved != geocodes:
+				raise ValueError(f"The locations of {path} were {saved}, not {geocodes}. "
+								 f"Use a new full_scan path for other locations (e.g. a tiling)")
+			return
+		users_path = path + "users/"
+		if os.path.isdir(users_path) and any(name.startswith("users_") and os.path.getsize(users_path + name)
+											 for name in os.listdir(users_path)):
+			print(f"Warning: {path} is from a scan without locations.json, its locations are assumed to be {geocodes}")
+		os.makedirs(path, exist_ok=True)
+		with open(locations_path, "w") as f:
+			json.dump(geocodes, f)
 
+	def discover_users(self):
+		""" Runs get_recent_users for all locations of the full scan at the same time
+		The regions share one dedupe (self.unique_user_ids) and the rate limit budget of the scheduler
+		Returns list of new users per location, in the order of config["full_scan"]["locations"]
+		"""
+		locations = self.config["full_scan"]["locations"]
+		users_list = [[] for _ in locations]
+		for idx, location in enumerate(locations):
+			self.scheduler.submit("search", self._discover_region, idx, helper.geocode_from_location(location))
 		
+		for job, users in self.scheduler.run(len(locations)):
+			users_list[job.args[0]] = users
+		return users_list
+	
+	def _discover_region(self, idx, geocode):
+		return self.get_recent_users(geocode=geocode)
+	
+	def resume_scan(self):
+		""" Fetches the timelines of all users the journal has not marked as done """
+		regions = {}
+		for idx, user_ids in self.journal.pending().items():
+			# The scan may have died before the users were saved
+			missing = set(user_ids) - set(self.load_user_ids(idx))
+			new_users_list = [[] for _ in self.config["full_scan"]["locations"]]
+			new_users_list[idx] = [ReducedUser(user_id) for user_id in user_ids if user_id in missing]
+			self.save_user_list(new_users_list)
+			self.unique_user_ids.update(user_ids)
+			regions[idx] = [ReducedUser(user_id) for user_id in user_ids]
+		
+		print("\nResuming tweets:", list(regions))
+		self._scan_timelines(regions)
+		self.journal.finish()
+	
+	def _scan_timelines(self, regions):
+		""" Fetches and saves the timelines of all users with the journal, regions is dict location index -> users
+		The timelines of all regions share one scheduler run, so no region waits for the last one to finish
+		"""
+		# Every page of the timeline holds 20 tweets
+		cost = math.ceil(self.config["search"]["max_searches"] / 20)
+		for idx, users in regions.items():
+			for user in users:
+				self.scheduler.submit("user_timeline", self._scan_user_timeline, idx, user, cost=cost)
+		
+		for u_idx, (job, newest_id) in enumerate(self.scheduler.run(self.config["full_scan"]["workers"])):
+			print(f"{u_idx}-", end="")
+			self.save_checkpoint(job.args[1].id_str, newest_id)
+			self.write_metrics()
+	
+	def _scan_user_timeline(self, idx, user):
+		""" get_timeline_resumable, a timeline twitter refuses (e.g. protected or deleted account) is failed
+		in the journal instead of stopping the scan, a resumed scan skips it
+		"""
+		try:
+			return self.get_timeline_resumable(idx, user)
+		except tweepy.TweepError as e:
+			print(f"\nTimeline of {user.id_str} failed: {e}")
+			part_path = self._tweets_path(idx, user.id_str) + ".part"
+			if os.path.isfile(part_path):
+				os.remove(part_path)
+			self.journal.failed(user.id_str, str(e))
+			return None
+	
+	def _timeline_pages(self, user, max_id=None):
+		""" Yields the timeline of user page by page (lists of statuses, newest first) 
+		Starts with the statuses is_good_user already fetched for this user, if there are any
+		"""
+		if max_id is None:
+			statuses, complete = self.user_cache.pop_statuses(user.id_str)
+			if statuses:
+				yield statuses
+				if complete:
+					return
+				max_id = statuses[-1].id - 1
+		yield from tweepy.Cursor(self._limited("user_timeline"), id=user.id_str, max_id=max_id).pages()
+	
+	def _filter_page(self, page, max_results):
+		""" Applies check_tweet to a page, returns (fitting tweets, True if the search should stop) """
+		res_tweets = []
+		checked = 0
+		rejected = 0
+		stop = False
+		for tweet in page:
+			checked += 1
+			code = self._check(tweet)
+			if code == -1:
+				stop = True
+				break
+			if code == 0:
+				rejected += 1
+				continue
+			res_tweets.append(tweet)
+			if len(res_tweets) == max_results:
+				stop = True
+				break
+		self._count_filtered(checked, rejected)
+		return res_tweets, stop
+	
+	def get_timeline_resumable(self, idx, user):
+		""" Like get_timeline, but every page is saved and written to the journal right away
+		The tweets are collected in <file>.part, which is renamed when the timeline is complete.
+		If the journal has saved pages of this user, the timeline is continued after the last one.
+		:return: id of the newest fetched tweet, None if no tweet was fetched
+		"""
+		path = self._tweets_path(idx, user.id_str)
+		part_path = path + ".part"
+		progress = self.journal.get_progress(user.id_str)
+		
+		if progress is not None and not os.path.isfile(part_path):
+			if self._has_saved(path):
+				# The scan died after the timeline was committed, but before the journal knew
+				self.journal.done(user.id_str)
+				return progress["newest_id"]
+			# The saved pages are gone, start over
+			progress = None
+		if progress is None:
+			if self._has_saved(path):
+				print("File already existing, exiting...")
+				self.journal.done(user.id_str)
+				return None
+			progress = new_timeline_progress()
+		
+		max_searches = self.config["search"]["max_searches"]
+		num_results = self.config["search"]["num_results"]
+		with open(part_path, "a") as f:
+			# Tweets written after the last journal entry are written again
+			if not helper.truncate_to(f, progress["size"]):
+				# Shorter than the journal says, the saved pages are not complete: start over
+				helper.truncate_to(f, 0)
+				progress = new_timeline_progress()
+			if not progress["end"]:
+				for page in self._timeline_pages(user, progress["max_id"]):
+					page = page[:max_searches - progress["seen"]]
+					res_tweets, stop = self._filter_page(page, num_results - progress["kept"])
+					for tweet in res_tweets:
+						json.dump(tweet._json, f)
+						f.write('\n')
+					f.flush()
+					os.fsync(f.fileno())
+					
+					# The checkpoint of update_timelines, the newest fetched tweet even if it was filtered out
+					if progress["newest_id"] is None and page:
+						progress["newest_id"] = page[0].id
+					progress["seen"] += len(page)
+					progress["kept"] += len(res_tweets)
+					progress["max_id"] = page[-1].id - 1
+					progress["size"] = f.tell()
+					progress["end"] = stop or progress["seen"] >= max_searches
+					self.journal.page(user.id_str, progress)
+					if progress["end"]:
+						break
+		
+		self._commit_timeline(part_path, path)
+		self.journal.done(user.id_str)
+		self.timeline_yield.observe(progress["kept"])
+		return progress["newest_id"]
+	
+	def update_timelines(self):
+		""" 
+		Incremental part of the full scan: 
+		For every user that already has a saved timeline, fetch only the tweets newer than its checkpoint 
+		and append them to the saved timeline
+		The checkpoint is the newest fetched tweet (kept or not), it is saved once the new tweets are written
+		"""
+		checkpoints = self.load_checkpoints()
+		for idx in range(len(self.config["full_scan"]["locations"])):
+			print("\nUpdating timelines:", idx)
+			users = []
+			for user_id in self.load_user_ids(idx):
+				path = self._tweets_path(idx, user_id)
+				if not self._has_saved(path):
+					continue
+				if not user_id in checkpoints:
+					# Timeline saved before checkpoints existed
+					checkpoints[user_id] = self._newest_saved_id(path)
+				users.append(ReducedUser(user_id))
+			
+			num_new_tweets = 0
+			for user, tweets, newest_id in self.fetch_new_tweets(users, checkpoints):
+				# The checkpoint must not get ahead of the saved tweets
+				checkpoint = functools.partial(self.save_checkpoint, user.id_str, newest_id, checkpoints.get(user.id_str))
+				self.save_tweets(tweets, self._tweets_path(idx, user.id_str), configs=False, append=True, then=checkpoint)
+				num_new_tweets += len(tweets)
+			self.flush_writes()
+			print(f"{num_new_tweets} new tweets from {len(users)} users")
+	
+	def archive_scan(self):
+		""" Backfill from the full archive: saves the tweets of config["full_search"] that pass the filters
+		to <full_search path>/tweets/<user_id>, page by page. A stopped crawl continues after the last saved page
+		:return: number of saved tweets
+		"""
+		search = self._get_archive_search()
+		if search.finished:
+			print("Archive search already finished:", search.cursor["tweets"], "tweets")
+			return 0
+		path = self.config["full_search"]["path"] + "tweets/"
+		os.makedirs(path, exist_ok=True)
+		
+		num_saved = 0
+		for page in search.pages():
+			by_user = {}
+			for tweet in page:
+				if self._check(tweet) == 1:
+					by_user.setdefault(tweet.user.id_str, []).append(tweet)
+			self._count_filtered(len(page), len(page) - sum(len(tweets) for tweets in by_user.values()))
+			for user_id, tweets in by_user.items():
+				self.save_tweets(tweets, path + user_id, configs=False, append=True)
+				num_saved += len(tweets)
+			# The cursor moves on when the next page is requested, the page has to be on disk by then
+			self.flush_writes()
+			quota = search.quota_left()
+			print(f"Page {search.cursor['pages'] + 1}: {len(page)} tweets, {num_saved} saved, "
+				  f"{search.used_requests()} requests this month" + (f", {quota} left" if quota is not None else ""))
+			self.write_metrics()
+		return num_saved
+	
+	def stream_scan(self):
+		""" Streaming alternative to full_scan: saves the tweets posted in config["stream"]["bounding_box"]
+		as they come in, to tweets/<config["stream"]["location"]>/<user_id>
+		Runs until config["stream"]["duration"] seconds passed or max_tweets were received (None: until stopped)
+		:return: report dict of stream_ingest.IngestListener
+		"""
+		opts = self.config["stream"]
+		path = self.config["full_scan"]["path"] + "tweets/" + opts["location"] + "/"
+		os.makedirs(path, exist_ok=True)
+		
+		listener = IngestListener(self, path, opts["batch_size"], opts["flush_interval"], opts["max_tweets"])
+		stream = tweepy.Stream(self.api.auth, listener, host=opts["host"], daemon=True)
+		stream.filter(locations=helper.bounding_box_from_location(opts["bounding_box"]), is_async=True)
+		
+		start = time.time()
+		try:
+			while stream.running and (opts["duration"] is None or time.time() - start < opts["duration"]):
+				time.sleep(min(opts["flush_interval"], 0.1))
+				# A quiet stream does not fill a batch, save what is there every flush_interval
+				if listener.flush_due():
+					listener.flush()
+					print("Streamed:", format_report(listener.report()))
+					self.write_metrics()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			stream.disconnect()
+			listener.flush()
+			self.flush_writes()
+		
+		report = listener.report()
+		print("Stream finished:", format_report(report))
+		return report
+	
+	def _tweets_path(self, idx, user_id):
+		""" Path of the saved timeline of user_id, found in location idx 
+		With a tweet store, this path is only used as key (see tweet_store.store_key)
+		"""
+		return self.config["full_scan"]["path"] + "tweets/" + str(idx) + "/" + user_id
+	
+	def flush_writes(self):
+		""" Blocks until the write-behind sink wrote everything (nothing to do without one) """
+		if self.sink is not None:
+			self.sink.flush()
+	
+	def _has_saved(self, file_name):
+		""" True if the timeline of file_name is saved, as file or in the tweet store """
+		if self.sink is not None and self.sink.is_pending(file_name):
+			return True
+		if self.tweet_store is not None and store_key(file_name) in self.tweet_store:
+			return True
+		return os.path.isfile(file_name)
+	
+	def _newest_saved_id(self, file_name):
+		""" Id of the newest saved tweet of the timeline file_name """
+		if self.tweet_store is not None and store_key(file_name) in self.tweet_store:
+			return self.tweet_store.newest_id(store_key(file_name))
+		return since_id_from_file(file_name)
+	
+	def _commit_timeline(self, part_path, file_name):
+		""" Moves a completely fetched timeline from its .part file to where it is saved """
+		if self.tweet_store is None:
+			os.replace(part_path, file_name)
+			return
+		
+		key = store_key(file_name)
+		# The scan may have died after adding the timeline, but before the journal knew
+		if not key in self.tweet_store:
+			with open(part_path) as f:
+				self.tweet_store.append(key, [json.loads(line) for line in f])
+		os.remove(part_path)
+	
+	def load_checkpoints(self):
+		""" Returns dict user_id -> id of the newest saved tweet of this user
+		Every scan appends a line per user, the file is rewritten with only the latest line of every user
+		"""
+		path = self.config["full_scan"]["path"] + "users/checkpoints"
+		checkpoints = {}
+		if not os.path.isfile(path):
+			return checkpoints
+		with self._checkpoint_lock:
+			# A torn last line is cut off, that user fetches a few tweets again
+			lines = helper.read_complete_lines(path)
+			for line in lines:
+				# Later lines are newer checkpoints of the same user
+				user_id, since_id = line.split()
+				checkpoints[user_id] = int(since_id)
+			if len(lines) > len(checkpoints):
+				with open(path + ".part", "w") as f:
+					f.write("".join(f"{user_id} {since_id}\n" for user_id, since_id in checkpoints.items()))
+					f.flush()
+					os.fsync(f.fileno())
+				os.replace(path + ".part", path)
+		return checkpoints
+	
+	def save_checkpoint(self, user_id, newest_id, since_id=None):
+		""" Appends newest_id as checkpoint of user_id, if it is newer than since_id """
+		if newest_id is None or (since_id is not None and newest_id <= since_id):
+			return
+		with self._checkpoint_lock:
+			with open(self.config["full_scan"]["path"] + "users/checkpoints", "a") as f:
+				f.write(f"{user_id} {newest_id}\n")
+		
+
 	def save_user_list(self, new_users_list):
 		""" 3 dim array users, only filled with new users to avoid overwriting the whole thing """
 		path = self.config["full_scan"]["path"] + "users/"
@@ -372,45 +1048,186 @@ class Crawler:
 		
 		
 	def load_user_list(self):
-		""" Returns set """
+		""" Returns UserRegistry of all saved user ids
+		It is kept in users/registry and only reads the ids appended to the users_<i> files since the last time
+		"""
 		path = self.config["full_scan"]["path"] + "users/"
-		unique_ids = set(())
-		for i in range(len(self.config["full_scan"]["locations"])):
-			path_sp = path + "users_" + str(i)
-			with open(path_sp, "r") as f:
-				user_ids = f.readlines()
-			# Set operation to fuse both sets
-			unique_ids.update(set([x.strip() for x in user_ids]))
+		unique_ids = UserRegistry(path + "registry")
+		unique_ids.update_from_files([path + "users_" + str(i) for i in range(len(self.config["full_scan"]["locations"]))])
 		return unique_ids
+	
+	def load_user_ids(self, idx):
+		""" Returns list of the user ids saved for location idx """
+		path_sp = self.config["full_scan"]["path"] + "users/users_" + str(idx)
+		if not os.path.isfile(path_sp):
+			return []
+		with open(path_sp, "r") as f:
+			user_ids = f.readlines()
+		return [x.strip() for x in user_ids]
 
-	def load_tweet_for_analysation(self, filename):
-		tweets = self.load_tweet(filename)
-		reduced_tweets = [ReducedStatus(t.user.id_str, t.created_at, t.text) for t in tweets]
+	def load_tweet_for_analysation(self, filename, size=None):
+		""" Loads only the fields the analysis needs into ReducedStatus objects, 
+		without building tweepy Status objects (see reduce_tweet) """
+		tweets = self.load_tweet(filename, is_dict=True, size=size)
+		reduced_tweets = [reduce_tweet(t) for t in tweets]
 		return reduced_tweets
+	
+	def iter_tweets_for_analysation(self, filenames, workers=None, max_pending=None, sizes=None):
+		""" Like load_tweet_for_analysation for many files, reading and json decoding is spread over a process pool
+		Yields (filename, reduced tweets) in the order the files are loaded
+		:param workers: number of processes, default: number of cores
+		:param max_pending: at most this many loaded files wait to be consumed, default: 2 * workers
+		:param sizes: optional dict filename -> bytes to read, e.g. PartialTimelines.sizes()
+		"""
+		workers = workers or os.cpu_count()
+		max_pending = max_pending or 2 * workers
+		store_path = self.tweet_store.path if self.tweet_store is not None else None
+		sizes = sizes or {}
+
+		if workers == 1:
+			# A single process only adds the cost of sending the tweets back
+			for filename in filenames:
+				yield filename, self.load_tweet_for_analysation(filename, sizes.get(filename))
+			return
+
+		filenames = iter(filenames)
+		with ProcessPoolExecutor(max_workers=workers, initializer=_init_loader, initargs=(store_path,)) as executor:
+			pending = {executor.submit(_load_for_analysation, name, sizes.get(name)): name
+					   for name in islice(filenames, max_pending)}
+			while pending:
+				done, _ = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					filename = pending.pop(future)
+					# Refill before yielding, so the workers keep going while the caller works
+					for next_filename in islice(filenames, 1):
+						pending[executor.submit(_load_for_analysation, next_filename, sizes.get(next_filename))] = next_filename
+					yield filename, future.result()
+
+
+def compile_filter(filter_config):
+	""" Returns check(tweet) with the return codes of Crawler.check_tweet, the config is only read here """
+	until = filter_config.get("until")
+	rejects = []
+	if filter_config.get("not_reply"):
+		rejects.append(helper.is_reply)
+	if filter_config.get("not_retweet"):
+		rejects.append(helper.is_retweet)
+	
+	def check(tweet):
+		if until and tweet.created_at < until:
+			return -1
+		for reject in rejects:
+			if reject(tweet):
+				return 0
+		return 1
+	
+	return check
+
+
+def push_down_filters(query, filter_config):
+	""" Returns the search query with the filters twitter can apply itself as operators
+	(-filter:retweets, -filter:replies, since:<until>), a list query is joined with spaces.
+	An empty query stays empty, twitter does not take a query of only operators
+	"""
+	if not isinstance(query, str):
+		query = " ".join(query)
+	if not query:
+		return query
+	
+	operators = []
+	if filter_config.get("not_retweet"):
+		operators.append("-filter:retweets")
+	if filter_config.get("not_reply"):
+		operators.append("-filter:replies")
+	if filter_config.get("until"):
+		operators.append("since:" + filter_config["until"].strftime("%Y-%m-%d"))
+	return " ".join([query] + operators)
+
+
+def load_tweet_dicts(file_name, tweet_store=None, size=None):
+	""" Returns the saved tweet dicts of a timeline file, from tweet_store if it is in there
+	:param size: only the tweets in the first size bytes of the file, e.g. the recorded pages of a partial timeline
+	"""
+	if tweet_store is not None and store_key(file_name) in tweet_store:
+		return tweet_store.read(store_key(file_name))
+	if size is not None:
+		with open(file_name, "rb") as f:
+			return [json.loads(line) for line in f.read(size).splitlines()]
+	
+	tweets = []
+	with open(file_name) as f:
+		for line in f:
+			tweets.append(json.loads(line))
+	return tweets
+
+
+# Tweet store of a loader process, see Crawler.iter_tweets_for_analysation
+_loader_store = None
+
+
+def _init_loader(store_path):
+	global _loader_store
+	if store_path is not None:
+		# The crawl may be appending to the store right now
+		_loader_store = TweetStore(store_path, repair=False)
+
+
+def _load_for_analysation(file_name, size=None):
+	return [reduce_tweet(t) for t in load_tweet_dicts(file_name, _loader_store, size)]
+
+
+def new_timeline_progress():
+	""" Journal progress of a timeline of which nothing is saved yet """
+	return {"max_id": None, "seen": 0, "kept": 0, "newest_id": None, "size": 0, "end": False}
+
+
+def since_id_from_file(file_name):
+	""" Returns the id of the newest tweet saved in file_name, None if there is none """
+	newest_id = None
+	with open(file_name) as f:
+		for line in f:
+			tweet_id = json.loads(line)["id"]
+			if newest_id is None or tweet_id > newest_id:
+				newest_id = tweet_id
+	return newest_id
+
+
+def reduce_tweet(tweet):
+	""" Takes a tweet dict (tweepy _json) and returns ReducedStatus with only the fields needed for analysis """
+	status = ReducedStatus(tweet["user"]["id_str"], helper.parse_twitter_date(tweet["created_at"]), tweet["text"],
+						   tweet["id"], tweet.get("in_reply_to_status_id"))
+	if "retweeted_status" in tweet:
+		# helper.is_retweet only checks if the attribute exists
+		status.retweeted_status = True
+	return status
 
 
 class ReducedUser(object):
+	__slots__ = ("id_str",)
+	
 	def __init__(self, user_id):
 		self.id_str = user_id
 
 
 class ReducedStatus():
-	def __init__(self, user_id, created_at, text):
+	""" Small stand-in for tweepy Status, works with helper.is_reply and helper.is_retweet """
+	__slots__ = ("user", "created_at", "text", "id", "in_reply_to_status_id", "retweeted_status")
+	
+	def __init__(self, user_id, created_at, text, tweet_id=None, in_reply_to_status_id=None):
 		self.user = ReducedUser(user_id)
 		self.created_at = created_at
 		self.text = text
-		
-		
-		
-		
-		
-		
-		
-		
-		
-		
-		
-	
+		self.id = tweet_id
+		self.in_reply_to_status_id = in_reply_to_status_id
 	
+	def __reduce__(self):
+		# Pickled as a plain tuple, the loader processes send lists of these back
+		return _unpickle_reduced_status, (self.user.id_str, self.created_at, self.text, self.id,
+										  self.in_reply_to_status_id, hasattr(self, "retweeted_status"))
 
-		
+
+def _unpickle_reduced_status(user_id, created_at, text, tweet_id, in_reply_to_status_id, is_retweet):
+	status = ReducedStatus(user_id, created_at, text, tweet_id, in_reply_to_status_id)
+	if is_retweet:
+		status.retweeted_status = True
+	return status
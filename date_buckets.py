@@ -0,0 +1,69 @@
+"""
+Groups of group_by calendar days between the start and end date of the plot config
+The creation times of the tweets are converted to one datetime64 array, the group of every tweet is
+a np.searchsorted against the first days of the groups, no per tweet strftime or dict lookups.
+Group ids are the first day of the group, "%d.%m" or "%d.%m.%Y" if the range spans several years.
+"""
+import functools
+from datetime import datetime
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+ONE_DAY = np.timedelta64(1, "D")
+
+
+def to_datetime64(datetimes, count=-1):
+	""" datetime64[s] array of naive datetimes (e.g. tweet.created_at), much faster than np.array(datetimes) """
+	seconds = np.fromiter(((d - EPOCH).total_seconds() for d in datetimes), dtype=np.float64, count=count)
+	return np.floor(seconds).astype(np.int64).astype("datetime64[s]")
+
+
+class DayBuckets:
+	""" Groups of group_by days, the first starts at the day of start_date, the last one may be shorter """
+
+	def __init__(self, start_date, end_date, group_by):
+		if group_by < 1:
+			raise ValueError(f"group_by has to be at least 1, not {group_by}")
+		if end_date < start_date:
+			raise ValueError(f"end_date {end_date} is before start_date {start_date}")
+		self.start = np.datetime64(start_date, "s")
+		self.end = np.datetime64(end_date, "s")
+		first_day = self.start.astype("datetime64[D]")
+		last_day = self.end.astype("datetime64[D]")
+		# First day of every group, datetime64[s] to compare with the tweet times
+		self.edges = np.arange(first_day, last_day + 1, group_by * ONE_DAY).astype("datetime64[s]")
+		self.days = np.arange(first_day, last_day + 1)
+		label_format = "%d.%m" if start_date.year == end_date.year else "%d.%m.%Y"
+		self.labels = [edge.item().strftime(label_format) for edge in self.edges]
+
+	def __len__(self):
+		return len(self.edges)
+
+	def assign(self, times):
+		""" Group index of every time (datetime64 array), -1 outside of start_date to end_date """
+		times = np.asarray(times, dtype="datetime64[s]")
+		groups = np.searchsorted(self.edges, times, side="right") - 1
+		groups[(times < self.start) | (times > self.end)] = -1
+		return groups
+
+	def group(self, items, times):
+		""" Dict group id -> list of the items in that group, every group id is in it """
+		grouped = {label: [] for label in self.labels}
+		lists = list(grouped.values())
+		for item, group in zip(items, self.assign(times).tolist()):
+			if group >= 0:
+				lists[group].append(item)
+		return grouped
+
+	def day_group_dict(self):
+		""" Dict day (formatted like the group ids) -> group id """
+		label_format = "%d.%m" if len(self.labels[0]) == 5 else "%d.%m.%Y"
+		groups = np.searchsorted(self.edges, self.days.astype("datetime64[s]"), side="right") - 1
+		return {day.item().strftime(label_format): self.labels[group] for day, group in zip(self.days, groups.tolist())}
+
+
+@functools.lru_cache(maxsize=16)
+def get_buckets(start_date, end_date, group_by):
+	""" DayBuckets of the plot config, shared by all users """
+	return DayBuckets(start_date, end_date, group_by)
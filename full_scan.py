@@ -10,6 +10,7 @@ import datetime
 config = {
 	"user_auth": False, # autheticate as user or application
 	"auth_path": "/home/maxi/Documents/UNI/Ethics/Project/repo/Corona_Sentinent/", # path to auth
+	"metrics_path": None, # Default None: file the crawler metrics are written to (Prometheus text format)
     "search": {
         "location": "darmstadt", # based on helper.GEOCODES dictionary
         "radius": 100, # optional default to 100
@@ -17,6 +18,7 @@ config = {
         "max_searches": 5000, # Default: 1000 max amount of searches 
         "num_results": 5000, # number of results with defined filter options
         "rate_limit": False,  # Default True: to turn off rate limit prints
+        "pushdown": True, # Default True: get_tweets puts the filters into the search query (-filter:retweets ...), not used by the full scan
         "filter": { # Filter applies to search
             "not_reply": True, # Filters for not replies when true, does nothing when false
             "not_retweet": True, # Filters for not retweets when true, does nothing when false
@@ -32,18 +34,49 @@ config = {
 	"plot": {
 		"title": "Testing",
 	},
-    # Full search not tested and should only be used with caution!
+    # Backfill from the full archive (premium api), see Crawler.archive_scan
     "full_search": {
+        "active": False, # Default False: run the archive search instead of the full scan
         "query": "#Corona lang:de", # the query used for full search
         "env_name": "dev", # your premium environment name
         "fromDate": "2020" + "01" + "15" + "1200", # Format: YYYYMMDDHHmm
-        "toDate": "2020" + "06" + "01" + "1200"
+        "toDate": "2020" + "06" + "01" + "1200",
+        "path": "saved_data/full_search/", # Default: cursor, request count and tweets of the search
+        "max_results": 500, # Default 500: results per request, 100 for sandbox environments
+        "monthly_quota": None, # Default None: premium requests per month, the search stops when they are used
+    },
+    # Timelines of get_full_timeline_until, fetched back to the until date over several calls
+    "full_timeline": {
+        "path": "saved_data/timelines/", # Default: tweets and state (partial, complete, truncated) per user
+        "continue_in_scan": True, # Default True: every full scan continues the partial timelines
     },
     # A full scan over 3 areas each hour, should run continuous
     "full_scan": {
         "active": True,
         "path": "/home/maxi/Documents/UNI/Ethics/Project/repo/Corona_Sentinent/saved_data/full_scan/",
         "locations": ["scan_1", "scan_2", "scan_3"], # All locations used by the scan
+        "workers": 8, # Default 1: number of timelines fetched at the same time
+        "incremental": True, # Default False: also fetch the new tweets of already saved users (since their checkpoint)
+        "store": None, # Default None: path of a tweet_store.TweetStore to save the timelines in, instead of one file per user
+        "tiling": None, # Default None: json file of geo_tiling.py, its circles replace locations
+    },
+    # save_tweets (incremental scan, stream, archive) writes on a background thread, see write_sink.py
+    # The timelines of the full scan itself are written right away, their journal needs every page on disk
+    "write_behind": {
+        "active": True,
+        "durability": "batch", # Default "batch": fsync every batch, "interval": every fsync_interval seconds, "none"
+        "fsync_interval": 5, # Default 5
+        "max_pending": 1000, # Default 1000: batches queued before save_tweets blocks
+        "writers": 4, # Default 4: threads that write, more hide the latency of slow (network) storage
+    },
+    # Instead of the hourly scan, save the tweets of a bounding box as they are posted (needs user_auth)
+    "stream": {
+        "active": False,
+        "bounding_box": "germany", # based on helper.BOUNDING_BOXES or [sw_lon, sw_lat, ne_lon, ne_lat]
+        "location": "stream", # tweets are saved in <full_scan path>/tweets/<location>/<user_id>
+        "batch_size": 100, # Default 100: tweets are saved in batches of this size
+        "flush_interval": 5, # Default 5: or after this many seconds
+        "duration": None, # Default None: seconds to stream, None until stopped
     }
 }
 
@@ -52,4 +85,9 @@ config = helper.init_config(config)
 
 craw = Crawler(config)
 
-craw.full_scan()
+if config["stream"]["active"]:
+	craw.stream_scan()
+elif config["full_search"]["active"]:
+	craw.archive_scan()
+else:
+	craw.full_scan()
@@ -0,0 +1,279 @@
+"""
+Plans the search circles of a full scan
+Covers a polygon with a hexagonal grid of circles: every point belongs to the nearest grid center and is at most
+radius away from it, so the circles overlap only at the corners of the hexagons. Cells that held more results
+than one search returns in earlier scans (observations) are split into a grid of half the radius, down to min_radius.
+Usage: python geo_tiling.py --bounding-box germany --radius 100 --max-results 1000 --tweets <full_scan path>/tweets/0/
+"""
+import argparse
+import json
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import helper
+
+EARTH_RADIUS_KM = 6371.0
+# At most this many sample points cover the polygon (memory ~ 50 bytes per point)
+MAX_SAMPLES = 400000
+# Axial hexagon coordinates are in [-KEY_SPAN / 2, KEY_SPAN / 2), see cell_key
+KEY_SPAN = 2 ** 24
+
+
+class Circle(namedtuple("Circle", ["lat", "lon", "radius"])):
+	""" Search circle, radius in km """
+
+	@property
+	def geocode(self):
+		return f"{self.lat:.6f},{self.lon:.6f},{self.radius:.1f}km"
+
+
+class Projection:
+	""" Equirectangular projection to km around (lat0, lon0), good enough for the size of a country """
+
+	def __init__(self, lat0, lon0):
+		self.lat0 = lat0
+		self.lon0 = lon0
+		self.km_per_lat = math.pi * EARTH_RADIUS_KM / 180
+		self.km_per_lon = self.km_per_lat * math.cos(math.radians(lat0))
+
+	def to_km(self, lat, lon):
+		return ((np.asarray(lon, dtype=np.float64) - self.lon0) * self.km_per_lon,
+				(np.asarray(lat, dtype=np.float64) - self.lat0) * self.km_per_lat)
+
+	def to_latlon(self, x, y):
+		return self.lat0 + y / self.km_per_lat, self.lon0 + x / self.km_per_lon
+
+
+def polygon_from_bounding_box(box):
+	""" box like helper.BOUNDING_BOXES: [sw_lon, sw_lat, ne_lon, ne_lat], returns list of (lat, lon) """
+	sw_lon, sw_lat, ne_lon, ne_lat = helper.bounding_box_from_location(box)
+	return [(sw_lat, sw_lon), (sw_lat, ne_lon), (ne_lat, ne_lon), (ne_lat, sw_lon)]
+
+
+def circles_from_geocodes(geocodes):
+	""" Circles of geocode strings "lat,lon,<radius>km" """
+	circles = []
+	for geocode in geocodes:
+		lat, lon, radius = geocode.split(",")
+		circles.append(Circle(float(lat), float(lon), float(radius[:-2])))
+	return circles
+
+
+def to_geocodes(circles, prefix="scan_tile_"):
+	""" Dict name -> geocode, names containing "scan" are used as they are by helper.geocode_from_location """
+	return {prefix + str(i): circle.geocode for i, circle in enumerate(circles)}
+
+
+def observations_from_tweets(tweets):
+	""" (lat, lon) of the tweet dicts that have coordinates or a place, the center of the place is used """
+	points = []
+	for tweet in tweets:
+		if tweet.get("coordinates"):
+			lon, lat = tweet["coordinates"]["coordinates"]
+			points.append((lat, lon))
+		elif tweet.get("place") and tweet["place"].get("bounding_box"):
+			corners = np.array(tweet["place"]["bounding_box"]["coordinates"][0], dtype=np.float64)
+			lon, lat = corners.mean(axis=0)
+			points.append((lat, lon))
+	return points
+
+
+def in_polygon(x, y, poly_x, poly_y):
+	""" Bool array, which points (x, y) are inside the polygon (ray casting) """
+	inside = np.zeros(len(x), dtype=bool)
+	j = len(poly_x) - 1
+	for i in range(len(poly_x)):
+		crosses = (poly_y[i] > y) != (poly_y[j] > y)
+		with np.errstate(divide="ignore", invalid="ignore"):
+			x_cross = (poly_x[j] - poly_x[i]) * (y - poly_y[i]) / (poly_y[j] - poly_y[i]) + poly_x[i]
+		inside ^= crosses & (x < x_cross)
+		j = i
+	return inside
+
+
+def hex_cells(x, y, radius):
+	""" Axial coordinates (q, r) of the hexagon (circumradius radius) each point lies in,
+	which is the nearest center of the hexagonal grid
+	"""
+	q = (math.sqrt(3) / 3 * x - y / 3) / radius
+	r = (2 / 3 * y) / radius
+	# Round cube coordinates (q, r, -q-r) to the nearest hexagon
+	s = -q - r
+	rq, rr, rs = np.round(q), np.round(r), np.round(s)
+	dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+	fix_q = (dq > dr) & (dq > ds)
+	fix_r = ~fix_q & (dr > ds)
+	rq = np.where(fix_q, -rr - rs, rq)
+	rr = np.where(fix_r, -rq - rs, rr)
+	return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def hex_center(q, r, radius):
+	return radius * math.sqrt(3) * (q + r / 2), radius * 1.5 * r
+
+
+def cell_key(q, r):
+	""" One int64 per hexagon, for np.unique """
+	return (q + KEY_SPAN // 2) * KEY_SPAN + (r + KEY_SPAN // 2)
+
+
+def grid_offsets(radius, tries):
+	""" tries shifts (x, y) of the hexagonal grid, spread over one hexagon, the first is no shift """
+	golden = (math.sqrt(5) - 1) / 2
+	offsets = []
+	for i in range(tries):
+		u, v = i / tries, (i * golden) % 1
+		offsets.append((radius * math.sqrt(3) * (u + v / 2), radius * 1.5 * v))
+	return offsets
+
+
+class Tiling:
+	""" Search circles covering polygon (list of (lat, lon))
+	:param radius: radius of the circles in km, 500km max for the search api
+	:param observations: (lat, lon) of results of earlier scans, the density they show decides where to split
+	:param max_results: a cell is split when it holds more observations, None to never split
+	:param min_radius: smallest radius a split creates
+	:param tries: number of shifted grids planned, the one with the least redundant fetches is kept.
+				  Observations cluster at the centers of places, a grid with a corner at a city fetches it twice
+	"""
+
+	def __init__(self, polygon, radius=100, observations=None, max_results=None, min_radius=5, tries=7):
+		lats, lons = np.array(polygon, dtype=np.float64).T
+		self.projection = Projection(lats.mean(), lons.mean())
+		self.poly_x, self.poly_y = self.projection.to_km(lats, lons)
+		self.radius = radius
+		self.max_results = max_results
+		self.min_radius = min_radius
+
+		self.sample_x, self.sample_y, self.spacing = self._samples()
+		if observations:
+			obs_lat, obs_lon = np.array(observations, dtype=np.float64).T
+			obs_x, obs_y = self.projection.to_km(obs_lat, obs_lon)
+			inside = in_polygon(obs_x, obs_y, self.poly_x, self.poly_y)
+			self.obs_x, self.obs_y = obs_x[inside], obs_y[inside]
+		else:
+			self.obs_x, self.obs_y = np.empty(0), np.empty(0)
+		plans = [self._plan(offset) for offset in grid_offsets(radius, tries)]
+		self.circles = min(plans, key=lambda circles: self.redundancy(circles)["redundant_ratio"])
+
+	def _samples(self):
+		""" Grid of points inside the polygon, spaced fine enough for the smallest circles """
+		width = self.poly_x.max() - self.poly_x.min()
+		height = self.poly_y.max() - self.poly_y.min()
+		spacing = max(self.min_radius / 4, math.sqrt(width * height / MAX_SAMPLES))
+		x, y = np.meshgrid(np.arange(self.poly_x.min(), self.poly_x.max() + spacing, spacing),
+						   np.arange(self.poly_y.min(), self.poly_y.max() + spacing, spacing))
+		x, y = x.ravel(), y.ravel()
+		inside = in_polygon(x, y, self.poly_x, self.poly_y)
+		return x[inside], y[inside], spacing
+
+	def _plan(self, offset=(0, 0)):
+		""" Level by level: the cells to split at one level are gridded again together,
+		so a smaller hexagon on the border of two split cells becomes one circle, not two
+		"""
+		circles = []
+		samples, observations, radius = np.arange(len(self.sample_x)), np.arange(len(self.obs_x)), self.radius
+		while len(samples):
+			cell_q, cell_r = hex_cells(self.sample_x[samples] - offset[0], self.sample_y[samples] - offset[1], radius)
+			obs_q, obs_r = hex_cells(self.obs_x[observations] - offset[0], self.obs_y[observations] - offset[1], radius)
+			cells, cell_ids = np.unique(cell_key(cell_q, cell_r), return_inverse=True)
+			cell_ids = cell_ids.ravel()
+			# Observations in a cell without samples (at the polygon border) are ignored
+			obs_keys = cell_key(obs_q, obs_r)
+			obs_ids = np.minimum(np.searchsorted(cells, obs_keys), max(len(cells) - 1, 0))
+			obs_ids[cells[obs_ids] != obs_keys] = -1
+			obs_counts = np.bincount(obs_ids[obs_ids >= 0], minlength=len(cells))
+			
+			if self.max_results is not None and radius / 2 >= self.min_radius:
+				split = obs_counts > self.max_results
+			else:
+				split = np.zeros(len(cells), dtype=bool)
+			# Samples of every cell, in the order of cells
+			order = np.argsort(cell_ids, kind="stable")
+			cell_samples = np.split(samples[order], np.cumsum(np.bincount(cell_ids, minlength=len(cells)))[:-1])
+			for cell in np.flatnonzero(~split):
+				q, r = divmod(int(cells[cell]), KEY_SPAN)
+				q, r = q - KEY_SPAN // 2, r - KEY_SPAN // 2
+				circles.append(self._circle(q, r, radius, offset, cell_samples[cell]))
+			
+			samples = samples[split[cell_ids]]
+			observations = observations[(obs_ids >= 0) & split[np.maximum(obs_ids, 0)]]
+			radius /= 2
+		return circles
+
+	def _circle(self, q, r, radius, offset, cell_samples):
+		""" Circle around the hexagon, cut down to the part of it in the polygon """
+		x, y = hex_center(q, r, radius)
+		x, y = x + offset[0], y + offset[1]
+		distance = np.hypot(self.sample_x[cell_samples] - x, self.sample_y[cell_samples] - y).max()
+		# Half the diagonal of the sample grid covers the space between the samples
+		radius = min(radius, distance + self.spacing / math.sqrt(2))
+		lat, lon = self.projection.to_latlon(x, y)
+		return Circle(float(lat), float(lon), float(radius))
+
+	def redundancy(self, circles=None):
+		""" Expected share of fetched results that were fetched by another circle already
+		Results are distributed like the observations, or evenly over the polygon without observations.
+		Returns dict with fetches (covering circles summed over all points), covered points,
+		redundant_ratio (1 - covered / fetches) and coverage (covered share of all points)
+		"""
+		circles = self.circles if circles is None else circles
+		if len(self.obs_x):
+			x, y = self.obs_x, self.obs_y
+		else:
+			x, y = self.sample_x, self.sample_y
+		covers = np.zeros(len(x), dtype=np.int64)
+		for circle in circles:
+			center_x, center_y = self.projection.to_km(circle.lat, circle.lon)
+			covers += np.hypot(x - center_x, y - center_y) <= circle.radius
+		fetches = int(covers.sum())
+		covered = int(np.count_nonzero(covers))
+		return {
+			"circles": len(circles),
+			"fetches": fetches,
+			"covered": covered,
+			"redundant_ratio": 1 - covered / fetches if fetches else 0.0,
+			"coverage": covered / len(x) if len(x) else 0.0,
+		}
+
+
+def format_redundancy(report):
+	return (f"{report['circles']} circles, {report['redundant_ratio']:.1%} redundant fetches, "
+			f"{report['coverage']:.1%} covered")
+
+
+def main():
+	from crawler import load_tweet_dicts
+
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--bounding-box", default="germany", help="name in helper.BOUNDING_BOXES")
+	parser.add_argument("--radius", type=float, default=100)
+	parser.add_argument("--min-radius", type=float, default=5)
+	parser.add_argument("--max-results", type=int, default=None, help="split cells with more observed tweets")
+	parser.add_argument("--tries", type=int, default=7, help="shifted grids to choose from")
+	parser.add_argument("--tweets", nargs="*", default=[], help="directories of saved tweets with the observations")
+	parser.add_argument("--output", default=None, help="json file for config['full_scan']['tiling']")
+	args = parser.parse_args()
+
+	observations = []
+	for path in args.tweets:
+		for name in os.listdir(path):
+			observations += observations_from_tweets(load_tweet_dicts(os.path.join(path, name)))
+	print(f"{len(observations)} observations")
+
+	tiling = Tiling(polygon_from_bounding_box(args.bounding_box), args.radius, observations,
+					args.max_results, args.min_radius, args.tries)
+	current = circles_from_geocodes(helper.GEOCODES["scan_" + str(i)] for i in range(1, 4))
+	print("scan_1 to scan_3:", format_redundancy(tiling.redundancy(current)))
+	print("tiling:", format_redundancy(tiling.redundancy()))
+
+	if args.output is not None:
+		with open(args.output, "w") as f:
+			json.dump(to_geocodes(tiling.circles), f, indent=1)
+
+
+if __name__ == "__main__":
+	main()
@@ -8,6 +8,7 @@ import tweepy
 import time
 import datetime
 import json
+import os
 
 # TODO (possible extensions)
 # plots say location name instead of geocode
@@ -31,6 +32,11 @@ GEOCODES = {
 	"scan_2": "52.6088963310,10.7366573594,222km",
 	"scan_3": "48.943261009,10.5389034531,145km"
 }
+# For the streaming api: south west longitude, latitude, north east longitude, latitude
+BOUNDING_BOXES = {
+	"germany": [5.87, 47.27, 15.04, 55.06],
+	"darmstadt": [8.55, 49.80, 8.75, 49.95],
+}
 
 
 def load_keys(path):
@@ -51,11 +57,13 @@ def load_keys(path):
 	return key, secret
 
 
-def get_api(user_auth = False, dir_path="", app_path="app_auth", user_path="user_auth"):
+def get_api(user_auth = False, dir_path="", app_path="app_auth", user_path="user_auth", wait_on_rate_limit=True):
 	""" 
 	Loads Application and user (if user_auth) keys from paths
 	:app_apth: path for Application keys
 	:user_path: path for User keys
+	:wait_on_rate_limit: tweepy sleeps when the rate limit is reached, 
+						 turn off if the rate limits are handled somewhere else (rate_limit.RateLimitScheduler)
 	:returns: tweepy API 
 	"""
 	
@@ -76,10 +84,22 @@ def get_api(user_auth = False, dir_path="", app_path="app_auth", user_path="user
 		# 0Auth 1 Application User Authentication
 		auth.set_access_token(user_token, user_token_secret)
 
-	api = tweepy.API(auth, wait_on_rate_limit=True, wait_on_rate_limit_notify=True)
+	api = tweepy.API(auth, wait_on_rate_limit=wait_on_rate_limit, wait_on_rate_limit_notify=wait_on_rate_limit)
 	return api
 
 
+MONTHS = {"Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6, 
+		  "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12}
+
+
+def parse_twitter_date(date):
+	""" Converts twitters created_at string (e.g. 'Mon Jun 15 16:21:33 +0000 2020') to datetime (UTC, no tzinfo)
+	Same result as tweepy's parse_datetime, but without strptime
+	"""
+	return datetime.datetime(int(date[26:30]), MONTHS[date[4:7]], int(date[8:10]), 
+							 int(date[11:13]), int(date[14:16]), int(date[17:19]))
+
+
 def days_until(date):
 	""" Converts date of form: ..... into number of days from 01.01.2020 until this date (int)"""
 	# TODO maybe set fixed date?
@@ -113,6 +133,24 @@ def geocode_from_location(location, radius=100):
 	return geocode
 
 
+def load_geocodes(path):
+	""" Adds the geocodes of a json file (name -> geocode, see geo_tiling.py) to GEOCODES, returns their names """
+	with open(path) as f:
+		geocodes = json.load(f)
+	GEOCODES.update(geocodes)
+	return list(geocodes)
+
+def bounding_box_from_location(location):
+	""" location is a name in BOUNDING_BOXES or already a list of 4 coordinates """
+	if not isinstance(location, str):
+		return list(location)
+	
+	try:
+		return BOUNDING_BOXES[location]
+	except KeyError:
+		raise KeyError(f"Location: {location} not found in BOUNDING_BOXES dict")
+
+
 def config_to_txt(config):
 	""" Turns the config to readable text. Will be divided into seperate keys in a dict """
 	# TODO add number searches based on the type of search
@@ -125,6 +163,31 @@ def config_to_txt(config):
 	return txt_dict
 
 
+def truncate_to(f, size):
+	""" Cuts the open file f back to size bytes, never makes it longer (truncate would pad it with NUL bytes)
+	:return: False if the file is shorter than size, it is not changed then
+	"""
+	f.seek(0, os.SEEK_END)
+	if f.tell() < size:
+		return False
+	f.truncate(size)
+	f.seek(size)
+	return True
+
+
+def read_complete_lines(path, repair=True):
+	""" Lines of an append-only file, a torn last line (no newline) is cut off the file,
+	so the next append starts a line of its own instead of continuing the torn one
+	:param repair: False for readers next to a running writer, the torn line is only left out then
+	"""
+	with open(path, "r+b" if repair else "rb") as f:
+		data = f.read()
+		complete = data.rfind(b"\n") + 1
+		if repair and complete < len(data):
+			f.truncate(complete)
+	return data[:complete].decode("utf-8").splitlines()
+
+
 def set_default(dicti, key, value):
 	""" Checks if key is already defined, if not will set to value"""
 	try:
@@ -141,6 +204,45 @@ def init_config(config):
 	set_default(config["search"], "radius", 100)
 	set_default(config["search"], "max_searches", 1000)
 	set_default(config["search"], "rate_limit", True)
+	set_default(config["search"], "pushdown", True)
+	set_default(config, "metrics_path", None)
+	
+	set_default(config, "get_user", {})
+	set_default(config["get_user"], "cache_ttl", 3600)
+	
+	if "full_scan" in config:
+		set_default(config["full_scan"], "workers", 1)
+		set_default(config["full_scan"], "incremental", False)
+		set_default(config["full_scan"], "store", None)
+		set_default(config["full_scan"], "tiling", None)
+		if config["full_scan"]["tiling"] is not None:
+			config["full_scan"]["locations"] = load_geocodes(config["full_scan"]["tiling"])
+	
+	if "full_search" in config:
+		set_default(config["full_search"], "active", False)
+		set_default(config["full_search"], "path", "saved_data/full_search/")
+		set_default(config["full_search"], "max_results", 500)
+		set_default(config["full_search"], "monthly_quota", None)
+	
+	set_default(config, "full_timeline", {})
+	set_default(config["full_timeline"], "path", "saved_data/timelines/")
+	set_default(config["full_timeline"], "continue_in_scan", True)
+	
+	if "write_behind" in config:
+		set_default(config["write_behind"], "active", True)
+		set_default(config["write_behind"], "durability", "batch")
+		set_default(config["write_behind"], "fsync_interval", 5)
+		set_default(config["write_behind"], "max_pending", 1000)
+		set_default(config["write_behind"], "writers", 4)
+	
+	if "stream" in config:
+		set_default(config["stream"], "bounding_box", "germany")
+		set_default(config["stream"], "location", "stream")
+		set_default(config["stream"], "batch_size", 100)
+		set_default(config["stream"], "flush_interval", 5)
+		set_default(config["stream"], "duration", None)
+		set_default(config["stream"], "max_tweets", None)
+		set_default(config["stream"], "host", "stream.twitter.com")
 	
 	config["search"]["geocode"] = geocode_from_location(config["search"]["location"], config["search"]["radius"])
 	
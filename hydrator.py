@@ -0,0 +1,91 @@
+"""
+Bulk hydration of tweet id datasets
+Looks up the ids in batches of 100 with statuses_lookup, several batches are in flight at the same time
+within the rate limit of the endpoint (rate_limit.RateLimitScheduler). Every finished batch is appended to
+a checkpoint file, so a restarted hydration skips the ids that are done and the ids known to be deleted.
+A crash after the caller saved a batch, but before its checkpoint, looks the batch up again: callers that
+append to a file pass the ids in it to add_done, so nothing is saved twice.
+"""
+import json
+import os
+
+import helper
+import rate_limit
+
+# statuses_lookup takes at most 100 ids
+BATCH_SIZE = 100
+
+
+class Hydrator:
+	""" Hydrates tweet ids (strings) with statuses_lookup
+	:param checkpoint_path: file the finished batches are written to, None for no checkpoints
+	:param workers: number of batches in flight
+	"""
+
+	def __init__(self, api, checkpoint_path=None, workers=4, user_auth=False, tweet_mode="extended"):
+		self.api = api
+		self.checkpoint_path = checkpoint_path
+		self.workers = workers
+		self.tweet_mode = tweet_mode
+		self.scheduler = rate_limit.RateLimitScheduler(user_auth)
+		self.lookup = rate_limit.limited(api, self.scheduler, "statuses_lookup")
+		# Ids of finished batches, found and deleted (or protected)
+		self.done = set()
+		self.deleted = set()
+		self._load()
+
+	def _load(self):
+		if self.checkpoint_path is None or not os.path.isfile(self.checkpoint_path):
+			return
+		# A torn last line is cut off, that batch is looked up again
+		for line in helper.read_complete_lines(self.checkpoint_path):
+			try:
+				record = json.loads(line)
+			except ValueError:
+				continue
+			self.done.update(record["found"])
+			self.deleted.update(record["deleted"])
+
+	def _checkpoint(self, found, deleted):
+		self.done.update(found)
+		self.deleted.update(deleted)
+		if self.checkpoint_path is None:
+			return
+		with open(self.checkpoint_path, "a") as f:
+			f.write(json.dumps({"found": found, "deleted": deleted}) + "\n")
+			f.flush()
+			os.fsync(f.fileno())
+
+	def add_done(self, tweet_ids):
+		""" Marks ids the caller already saved as done, e.g. the ids in its output file when it restarts
+		:return: number of ids the checkpoint did not know
+		"""
+		found = [tweet_id for tweet_id in dict.fromkeys(str(i) for i in tweet_ids) if tweet_id not in self.done]
+		if found:
+			self._checkpoint(found, [])
+		return len(found)
+
+	def _lookup_batch(self, tweet_ids):
+		""" Returns dict id_str -> Status of the ids that still exist """
+		statuses = self.lookup(tweet_ids, tweet_mode=self.tweet_mode)
+		return {status.id_str: status for status in statuses}
+
+	def pending(self, tweet_ids):
+		""" The ids that are neither done nor deleted, without duplicates """
+		return [tweet_id for tweet_id in dict.fromkeys(str(i) for i in tweet_ids)
+				if tweet_id not in self.done and tweet_id not in self.deleted]
+
+	def hydrate(self, tweet_ids):
+		""" Looks up all ids that are not done or deleted yet
+		Yields (statuses, deleted ids) per batch in the order the batches finish, statuses is dict id_str -> Status.
+		A batch is written to the checkpoint when the next one is requested, so whatever the caller saves
+		for a batch is on disk before the batch counts as done (see add_done for a crash in between)
+		"""
+		pending = self.pending(tweet_ids)
+		for start in range(0, len(pending), BATCH_SIZE):
+			self.scheduler.submit("statuses_lookup", self._lookup_batch, pending[start:start + BATCH_SIZE])
+
+		for job, statuses in self.scheduler.run(self.workers):
+			deleted = [tweet_id for tweet_id in job.args[0] if tweet_id not in statuses]
+			yield statuses, deleted
+			self._checkpoint(list(statuses), deleted)
@@ -0,0 +1,98 @@
+"""
+Metrics of the crawler in the Prometheus text format
+Crawler.write_metrics writes them to config["metrics_path"], for the textfile collector of the node exporter
+or to read by hand, e.g. where the time of a scan goes: request latency vs. sleeping on rate limits
+"""
+import bisect
+import os
+import threading
+
+# Seconds per request
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Share of the tweets of a page that pass the filters
+YIELD_BUCKETS = (0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1)
+# Kept tweets per timeline
+TIMELINE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class Histogram:
+	""" Thread safe histogram with fixed upper bounds, like a Prometheus histogram """
+
+	def __init__(self, buckets):
+		self.buckets = tuple(buckets)
+		# Last count is +Inf
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.sum = 0.0
+		self.count = 0
+		self._lock = threading.Lock()
+
+	def observe(self, value):
+		with self._lock:
+			self.counts[bisect.bisect_left(self.buckets, value)] += 1
+			self.sum += value
+			self.count += 1
+
+	def cumulative(self):
+		""" List of (upper bound, observations <= bound), the last bound is +Inf """
+		return self.snapshot()[0]
+
+	def snapshot(self):
+		""" (cumulative(), sum, count) of one moment, an observe in between does not tear them apart """
+		with self._lock:
+			counts = list(self.counts)
+			total_sum = self.sum
+			total_count = self.count
+		result = []
+		total = 0
+		for bound, count in zip(self.buckets + (float("inf"),), counts):
+			total += count
+			result.append((bound, total))
+		return result, total_sum, total_count
+
+
+def format_value(value):
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+	if not labels:
+		return ""
+	return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class MetricsText:
+	""" Collects metrics and formats them as Prometheus text """
+
+	def __init__(self):
+		self.lines = []
+
+	def add(self, name, kind, help_text, samples):
+		""" samples: list of (labels dict, value), kind: counter or gauge """
+		self.lines.append(f"# HELP {name} {help_text}")
+		self.lines.append(f"# TYPE {name} {kind}")
+		for labels, value in samples:
+			self.lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+	def add_histogram(self, name, help_text, histograms):
+		""" histograms: list of (labels dict, Histogram) """
+		self.lines.append(f"# HELP {name} {help_text}")
+		self.lines.append(f"# TYPE {name} histogram")
+		for labels, histogram in histograms:
+			cumulative, total_sum, total_count = histogram.snapshot()
+			for bound, count in cumulative:
+				bucket_labels = dict(labels, le=format_value(bound))
+				self.lines.append(f"{name}_bucket{format_labels(bucket_labels)} {count}")
+			self.lines.append(f"{name}_sum{format_labels(labels)} {format_value(total_sum)}")
+			self.lines.append(f"{name}_count{format_labels(labels)} {total_count}")
+
+	def text(self):
+		return "\n".join(self.lines) + "\n"
+
+	def write(self, path):
+		""" Replaces path, readers never see half a file """
+		part_path = f"{path}.{os.getpid()}.part"
+		with open(part_path, "w") as f:
+			f.write(self.text())
+		os.replace(part_path, path)
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import pickle
 
@@ -15,6 +16,8 @@ from sentiment_models.vader_with_sentiws.lib_sentiment_sentiws import SentimentI
 from sentiment_models.preprocess_tweets import replace_all
 from sentiment_models.GerVADER.vaderSentimentGER import SentimentIntensityAnalyzer as GerVaderSentimentIntensityAnalyzer
 
+TOKENIZER_PATH = 'sentiment_models/tokenizer.pickle'
+
 
 def preprocess_text(text):
     return replace_all(text)
@@ -22,6 +25,8 @@ def preprocess_text(text):
 
 class Model:
     """ Parent class (Interface ish) of all models """
+    # Increase when the labels of a model class change, invalidates its cached labels (Model.fingerprint)
+    VERSION = 1
 
     def __init__(self, below_negative, above_positive, below_extremely_neg, below_extremely_pos, model_name):
         super().__init__()
@@ -31,6 +36,12 @@ class Model:
         self.above_extremely_pos = below_extremely_pos
         self.name = model_name
 
+    def fingerprint(self):
+        """Hash of everything the labels depend on, cached labels of another fingerprint are outdated."""
+        parts = [type(self).__name__, self.VERSION, self.below_negative, self.above_positive,
+                 self.below_extremely_neg, self.above_extremely_pos]
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
     def get_label_for_clear_cases(self, texts):
         if not isinstance(texts, list):
             texts = list(texts)
@@ -144,10 +155,26 @@ class TrainedSentimentModel(Model):
     def __init__(self, model_path="./sentiment_models/trained_model", model_name="TrainedModel", pos_boundary=0.8,
                  neg_boundary=0.7):
         super().__init__(0, 0, neg_boundary, pos_boundary, model_name)
+        self.model_path = model_path
         self._load_model(model_path)
         self._load_tokenizer()
         self.label_translation = {0: "neg", 1: "neut", 2: "pos"}
 
+    def fingerprint(self):
+        """Also hashes the saved model and the tokenizer, a retrained model gets a new fingerprint."""
+        digest = hashlib.sha1(super().fingerprint().encode())
+        paths = [TOKENIZER_PATH]
+        for root, dirs, files in os.walk(self.model_path):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in sorted(files))
+        if os.path.isfile(self.model_path):
+            paths.append(self.model_path)
+        for path in paths:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
     def _load_model(self, model_path):
         """Load the model from file"""
         self.analyzer = load_model(model_path)
@@ -204,7 +231,7 @@ class TrainedSentimentModel(Model):
 
     def _load_tokenizer(self):
         """Load the tokenizer from file"""
-        with open('sentiment_models/tokenizer.pickle', 'rb') as handle:
+        with open(TOKENIZER_PATH, 'rb') as handle:
             tokenizer = pickle.load(handle)
         self.tokenizer = tokenizer
 
@@ -0,0 +1,136 @@
+"""
+Timelines fetched back to the until date of the filter (Crawler.get_full_timeline_until)
+A timeline usually needs more requests than one call may do, the fetched part is kept with a max_id cursor
+and the next call continues there. Every user has a state:
+	partial: the cursor is not at the until date yet
+	complete: the timeline reached the until date (or its first tweet)
+	truncated: twitter returns only the newest TIMELINE_LIMIT tweets of a timeline, the until date was older
+Files: <path>/<user_id> the kept tweets, newest first, and <path>/states, one json record per saved page
+Opening the PartialTimelines cuts every file back to its last record, so the files hold only recorded pages.
+Readers (e.g. the analysis next to a running crawl) open it with repair=False, which changes no file.
+"""
+import json
+import os
+import threading
+
+import helper
+
+PARTIAL = "partial"
+COMPLETE = "complete"
+TRUNCATED = "truncated"
+# user_timeline only reaches back this many tweets
+TIMELINE_LIMIT = 3200
+
+
+class PartialTimelines:
+
+	def __init__(self, path, repair=True):
+		"""
+		:param repair: False to only read, tweets after the last record and torn lines are left out but stay
+						in the files, a writer may be appending to them right now
+		"""
+		self.path = path
+		self.repair = repair
+		if repair:
+			os.makedirs(path, exist_ok=True)
+		self.states_path = os.path.join(path, "states")
+		# user_id -> last record: state, max_id, fetched, kept
+		self.states = {}
+		self._lock = threading.Lock()
+		self._load()
+
+	def _load(self):
+		if not os.path.isfile(self.states_path):
+			return
+		# A torn last line is cut off, that page is fetched again
+		for line in helper.read_complete_lines(self.states_path, self.repair):
+			try:
+				record = json.loads(line)
+			except ValueError:
+				continue
+			self.states[record["user_id"]] = record
+		for user_id, record in list(self.states.items()):
+			if self.repair:
+				self._cut_to_record(user_id, record)
+			elif not os.path.isfile(self.file_name(user_id)) or os.path.getsize(self.file_name(user_id)) < record["size"]:
+				# Lost tweets, left out until the crawler fetched the timeline again
+				del self.states[user_id]
+
+	def _cut_to_record(self, user_id, record):
+		""" Cuts off tweets written after the last record (crash in save_page), a file shorter than its record
+		lost tweets, the user starts over then
+		"""
+		file_name = self.file_name(user_id)
+		if os.path.isfile(file_name):
+			with open(file_name, "r+b") as f:
+				if helper.truncate_to(f, record["size"]):
+					return
+		print(f"Saved timeline of {user_id} is shorter than its record, fetching it again")
+		del self.states[user_id]
+		if os.path.isfile(file_name):
+			os.remove(file_name)
+
+	def get(self, user_id):
+		""" Last record of user_id, None if nothing was fetched yet """
+		return self.states.get(user_id)
+
+	def state(self, user_id):
+		record = self.get(user_id)
+		return record["state"] if record is not None else None
+
+	def file_name(self, user_id):
+		return os.path.join(self.path, user_id)
+
+	def save_page(self, user_id, tweets, max_id, fetched, state=PARTIAL):
+		""" Appends the kept tweets of a page, then the record with the cursor
+		:param max_id: the next page starts at this id
+		:param fetched: number of tweets fetched for the user so far, kept or not
+		A crash between both leaves tweets after the last record, they are cut off when the user is continued
+		"""
+		if not self.repair:
+			raise ValueError("PartialTimelines opened with repair=False is read-only")
+		record = self.get(user_id)
+		size = record["size"] if record is not None else 0
+		with open(self.file_name(user_id), "a") as f:
+			if not helper.truncate_to(f, size):
+				raise ValueError(f"Saved timeline of {user_id} is shorter than its record")
+			for tweet in tweets:
+				json.dump(tweet._json, f)
+				f.write("\n")
+			f.flush()
+			os.fsync(f.fileno())
+			size = f.tell()
+		kept = (record["kept"] if record is not None else 0) + len(tweets)
+		record = {"user_id": user_id, "state": state, "max_id": max_id, "fetched": fetched, "kept": kept, "size": size}
+		with self._lock:
+			with open(self.states_path, "a") as f:
+				f.write(json.dumps(record) + "\n")
+				f.flush()
+				os.fsync(f.fileno())
+			self.states[user_id] = record
+
+	def users(self, states=(COMPLETE,)):
+		""" user ids with one of these states """
+		return [user_id for user_id, record in self.states.items() if record["state"] in states]
+
+	def file_names(self, states=(COMPLETE,)):
+		""" Files of the timelines with one of these states """
+		return [self.file_name(user_id) for user_id in self.users(states)]
+
+	def sizes(self, states=(COMPLETE,)):
+		""" Dict file name -> bytes of the recorded pages, of the timelines with one of these states
+		For Crawler.iter_tweets_for_analysation(sizes=...), which then leaves out tweets of pages still being written
+		"""
+		return {self.file_name(user_id): self.states[user_id]["size"] for user_id in self.users(states)}
+
+	def load(self, user_id):
+		""" Saved tweet dicts of user_id, without the tweets of a page whose record was not written """
+		record = self.get(user_id)
+		if record is None:
+			return []
+		tweets = []
+		# Binary, tell() of a text file is no byte offset
+		with open(self.file_name(user_id), "rb") as f:
+			while f.tell() < record["size"]:
+				tweets.append(json.loads(f.readline()))
+		return tweets
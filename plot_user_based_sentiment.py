@@ -1,18 +1,19 @@
 # Must have imports
-import math
 
 import helper
 from analyzer import Analyzer, group_tweets_by_calendar_week
 from crawler import Crawler
 from plotter import Plotter
 from model import Vader, TrainedSentimentModel, TextBlob
+from count_cube import CountCube, CUBE_FILENAME, NO_REGION
+from partial_timelines import PartialTimelines, COMPLETE
 
 # Extra imports
 import datetime
 import os
 import json
 
-SCAN_ID = "all"
+SCAN_ID = "all"  # "all", the index of one scan location or "timelines" for the complete get_full_timeline_until timelines
 
 config_dict = {
 	"user_auth": False,  # autheticate as user or application
@@ -38,7 +39,13 @@ config_dict = {
 	"analyze_sentiment": {
 		"pos_boundary": 0.8,  # boundary for classifying tweets as "extremely" positive
 		"neg_boundary": 0.7,  # boundary for classifying tweets as "extremely" negative
-		"users_dir": "saved_data/full_scan_both/results/all/".format(SCAN_ID)  # there the sentiment analysis files are stored
+		"users_dir": "saved_data/full_scan_both/results/all/".format(SCAN_ID),  # there the sentiment analysis files are stored
+		"load_workers": None,  # processes loading the tweet files, None for one per core
+		"results_store": None,  # labels of the users per model (results_store.py), None for <users_dir>/results.sqlite
+		"count_cube": None,  # tweets per user, day and label (count_cube.py), None for <users_dir>/count_cube.npz
+		"reuse_count_cube": False,  # True: plot from the saved count cube, without loading tweets or running the model
+		"cube_start": None,  # first day in the count cube, None for the until date of the search filter
+		"cube_end": None,  # last day in the count cube, None for today
 	},
 	"plot": {
 		"title": "Testing",
@@ -58,17 +65,16 @@ config_dict = {
 		"active": True,
 		"path": "saved_data/full_scan/",
 		"locations": ["scan_1", "scan_2", "scan_3"],  # All locations used by the scan
+		"store": None,  # path of the tweet_store.TweetStore with the timelines, None if they are saved as files
 	}
 }
 
 
-def analyze_part(analysation_dicts, begin_id, end_id, user_filenames):
-	user_filenames = user_filenames[begin_id: end_id]
-	user_tweets = [crawler.load_tweet_for_analysation(filename) for filename in user_filenames]
-	per_user_analysation = analyzer.analyze_sentiment_user_based(user_tweets)
-	analysation_dicts += per_user_analysation
+def analyze_part(analysation_cubes, begin_id, end_id, user_tweets, user_regions):
+	# One CountCube per part, concatenated before summarizing
+	analysation_cubes.append(analyzer.count_sentiments_per_day(user_tweets, user_regions))
 	print("Analyzed users {} to {}".format(begin_id, end_id - 1))
-	return analysation_dicts
+	return analysation_cubes
 
 
 def change_config(config, group_by, begin_day, begin_month, end_day, end_month):
@@ -81,41 +87,89 @@ def change_config(config, group_by, begin_day, begin_month, end_day, end_month):
 	return config
 
 
-def reanalyze(analysation_dicts, config, group_by, start_day, start_month, end_day, end_month):
+def summarize_cube(cube, config, regions=None):
+	""" Summary of the plot window of config, sliced from the count cube """
+	plot_config = config["plot"]
+	matrix = cube.matrix(plot_config["start_date"], plot_config["end_date"], plot_config["group_by"],
+						 analyzer.model.name, regions)
+	return analyzer.summarize_user_sentiments(matrix)
+
+
+def reanalyze(cube, config, group_by, start_day, start_month, end_day, end_month, regions=None):
 	analyzer.config = change_config(config, group_by, start_day, start_month, end_day, end_month)
-	analysation = analyzer.summarize_user_sentiments(analysation_dicts)
+	analysation = summarize_cube(cube, analyzer.config, regions)
 	analyzer.plot_sentiment(analysation)
 
 
+def build_count_cube(crawler):
+	""" Loads and labels the timelines of SCAN_ID, returns the CountCube of all users """
+	analysation_cubes = []
+	# Region (index of the scan location) of every file
+	file_regions = {}
+	# Bytes to read of every file, only for partial timelines
+	file_sizes = None
+	if SCAN_ID == "timelines":
+		# Only the recorded pages, a running crawl may be appending to the files
+		file_sizes = PartialTimelines(config["full_timeline"]["path"], repair=False).sizes((COMPLETE,))
+		user_filenames = sorted(file_sizes)
+		file_regions.update((filename, NO_REGION) for filename in user_filenames)
+	elif SCAN_ID == "all":
+		all_user_ids = set()
+		user_filenames = []
+		for i in range(0, 3):
+			users_dir = "saved_data/full_scan_both/tweets/{}/".format(i)
+			if crawler.tweet_store is not None:
+				# Timelines are in the store, the filenames are only used as keys
+				saved_user_ids = sorted(key.split("/")[1] for key in crawler.tweet_store.keys(i))
+			else:
+				saved_user_ids = sorted(user_id for user_id in os.listdir(users_dir) if os.path.isfile(users_dir + user_id))
+			current_user_ids = [user_id for user_id in saved_user_ids if not user_id in all_user_ids]
+			all_user_ids.update(current_user_ids)
+			current_user_filenames = [users_dir + filename for filename in current_user_ids]
+			user_filenames += current_user_filenames
+			file_regions.update((filename, i) for filename in current_user_filenames)
+	else:
+		users_dir = "saved_data/full_scan_both/tweets/{}/".format(SCAN_ID)
+		if crawler.tweet_store is not None:
+			user_filenames = [users_dir + key.split("/")[1] for key in sorted(crawler.tweet_store.keys(SCAN_ID))]
+		else:
+			user_filenames = [users_dir + filename for filename in sorted(os.listdir(users_dir)) if
+							  os.path.isfile(users_dir + filename)]
+		file_regions.update((filename, int(SCAN_ID)) for filename in user_filenames)
+	# Files are loaded in a process pool and analyzed in batches of 300 users, in the order they are loaded
+	user_tweets = []
+	user_regions = []
+	begin_id = 0
+	for filename, tweets in crawler.iter_tweets_for_analysation(user_filenames, config["analyze_sentiment"]["load_workers"],
+																sizes=file_sizes):
+		user_tweets.append(tweets)
+		user_regions.append(file_regions[filename])
+		if len(user_tweets) == 300:
+			analysation_cubes = analyze_part(analysation_cubes, begin_id, begin_id + 300, user_tweets, user_regions)
+			begin_id += 300
+			user_tweets = []
+			user_regions = []
+	if user_tweets:
+		analysation_cubes = analyze_part(analysation_cubes, begin_id, begin_id + len(user_tweets), user_tweets, user_regions)
+	return CountCube.concatenate(analysation_cubes, models=[analyzer.model.name])
+
+
+# Guard, the loader processes may import this file
+if __name__ == "__main__":
+	config = helper.init_config(config_dict)
+	# Only reads the saved timelines, a crawl may be running
+	crawler = Crawler(config, read_only=True)
+	trained_model = TrainedSentimentModel()
+	analyzer = Analyzer(config, trained_model)
+	cube_path = config["analyze_sentiment"]["count_cube"] or os.path.join(config["analyze_sentiment"]["users_dir"], CUBE_FILENAME)
+	if config["analyze_sentiment"]["reuse_count_cube"] and os.path.isfile(cube_path):
+		cube = CountCube.load(cube_path)
+	else:
+		cube = build_count_cube(crawler)
+		# reanalyze and later runs with reuse_count_cube only need the cube
+		cube.save(cube_path)
+	print("Summarizing the results...")
+	analysation = summarize_cube(cube, config)
+	analyzer.plot_sentiment(analysation)
 
-config = helper.init_config(config_dict)
-crawler = Crawler(config)
-trained_model = TrainedSentimentModel()
-analyzer = Analyzer(config, trained_model)
-analysation_dicts = []
-if SCAN_ID == "all":
-	all_user_ids = set()
-	user_filenames = []
-	for i in range(0, 3):
-		users_dir = "saved_data/full_scan_both/tweets/{}/".format(i)
-		current_user_ids = [user_id for user_id in sorted(os.listdir(users_dir)) if not user_id in all_user_ids]
-		all_user_ids.update(current_user_ids)
-		current_user_filenames = [users_dir + filename for filename in current_user_ids if
-								  os.path.isfile(users_dir + filename)]
-		user_filenames += current_user_filenames
-else:
-	users_dir = "saved_data/full_scan_both/tweets/{}/".format(SCAN_ID)
-	user_filenames = [users_dir + filename for filename in sorted(os.listdir(users_dir)) if
-					  os.path.isfile(users_dir + filename)]
-nr_batches = math.ceil(len(user_filenames)/300)
-for i in range(0, nr_batches):
-	begin_id = i * 300
-	end_id = min((i + 1) * 300, len(user_filenames))
-	if begin_id >= end_id:
-		break
-	analysation_dicts = analyze_part(analysation_dicts, begin_id, end_id, user_filenames)
-print("Summarizing the results...")
-analysation = analyzer.summarize_user_sentiments(analysation_dicts)
-analyzer.plot_sentiment(analysation)
-
-print("Done.")
+	print("Done.")
@@ -0,0 +1,304 @@
+"""
+Rate limit bookkeeping for the twitter API
+Every endpoint has its own budget of requests per 15 minute window, these
+classes keep track of it so that several threads can share one budget
+"""
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import tweepy
+
+from metrics import Histogram, LATENCY_BUCKETS
+
+# Part of the request url, to know which endpoint a response belongs to
+ENDPOINT_PATHS = {
+	"search": "/search/tweets.json",
+	"user_timeline": "/statuses/user_timeline.json",
+	"statuses_lookup": "/statuses/lookup.json",
+	"get_user": "/users/show.json",
+	"full_archive": "/tweets/search/fullarchive/",
+}
+# Requests per window (15 min unless in WINDOWS), (application auth, user auth)
+RATE_LIMITS = {
+	"search": (450, 180),
+	"user_timeline": (1500, 900),
+	"statuses_lookup": (300, 900),
+	"get_user": (900, 900),
+	# Premium: 30 per minute, paid environments send their limit in the headers
+	"full_archive": (30, 30),
+}
+WINDOW_SECONDS = 15 * 60
+# Endpoints with another window, in seconds
+WINDOWS = {"full_archive": 60}
+# Seconds to wait after a 429 without a reset in the future, doubled with every further one up to a window
+RETRY_BACKOFF = 5
+
+
+class RateLimitWindow:
+	""" Budget of requests for one endpoint, refilled after every window """
+
+	def __init__(self, limit, window=WINDOW_SECONDS):
+		self.limit = limit
+		self.window = window
+		self.remaining = limit
+		self.reset = time.time() + window
+		self.backoff = RETRY_BACKOFF
+		self._lock = threading.Lock()
+
+	def acquire(self):
+		""" Blocks until a request is allowed and takes it from the budget
+		:return: seconds spent waiting
+		"""
+		waited = 0
+		while True:
+			with self._lock:
+				now = time.time()
+				self._refill(now)
+				if self.remaining > 0:
+					self.remaining -= 1
+					return waited
+				sleep_time = self.reset - now
+			time.sleep(sleep_time)
+			waited += sleep_time
+
+	def _refill(self, now):
+		""" New window, new budget. Only call with the lock held """
+		if now >= self.reset:
+			self.remaining = self.limit
+			self.reset = now + self.window
+
+	def refill(self):
+		with self._lock:
+			self._refill(time.time())
+
+	def exhaust(self, reset=None):
+		""" Nothing left until reset, e.g. after twitter answered 429
+		Without a reset in the future the window backs off, so the next request does not follow at once
+		"""
+		with self._lock:
+			self.remaining = 0
+			now = time.time()
+			if reset is not None and int(reset) > now:
+				self.reset = int(reset)
+			else:
+				self.reset = now + self.backoff
+				self.backoff = min(self.backoff * 2, self.window)
+
+	def update(self, headers):
+		""" Takes the x-rate-limit headers of a response, the server always knows better """
+		with self._lock:
+			# The request went through, the next 429 starts the backoff over
+			self.backoff = RETRY_BACKOFF
+		remaining = headers.get("x-rate-limit-remaining")
+		reset = headers.get("x-rate-limit-reset")
+		if remaining is None or reset is None:
+			return
+		with self._lock:
+			if "x-rate-limit-limit" in headers:
+				self.limit = int(headers["x-rate-limit-limit"])
+			if int(reset) > self.reset:
+				# Server started a new window
+				self.remaining = int(remaining)
+			else:
+				# Other threads may already have taken requests the server has not seen yet
+				self.remaining = min(self.remaining, int(remaining))
+			self.reset = int(reset)
+
+
+def get_windows(user_auth=False):
+	""" Returns dict with a fresh RateLimitWindow for every endpoint in RATE_LIMITS """
+	idx = 1 if user_auth else 0
+	return {endpoint: RateLimitWindow(limits[idx], WINDOWS.get(endpoint, WINDOW_SECONDS))
+			for endpoint, limits in RATE_LIMITS.items()}
+
+
+def endpoint_of(response):
+	""" Returns the endpoint name of a requests response, None if it is not in ENDPOINT_PATHS """
+	for endpoint, path in ENDPOINT_PATHS.items():
+		if path in response.url:
+			return endpoint
+	return None
+
+
+def limited(api, scheduler, endpoint):
+	""" Returns the api method of endpoint, every request waits for budget of scheduler and updates it """
+	method = getattr(api, endpoint)
+	
+	def limited_method(*args, **kwargs):
+		# create=True only builds the request object, no call to twitter
+		if kwargs.get("create"):
+			return method(*args, **kwargs)
+		
+		while True:
+			scheduler.acquire(endpoint)
+			start = time.time()
+			try:
+				result = method(*args, **kwargs)
+			except tweepy.TweepError as e:
+				# Cursor parses raw, so a rate limit is not always a RateLimitError
+				if e.response is None or e.response.status_code not in (420, 429):
+					raise
+				scheduler.exhausted(endpoint, e.response.headers.get("x-rate-limit-reset"))
+				continue
+			response = api.last_response
+			# With several threads, the last response may belong to another endpoint
+			headers = response.headers if endpoint_of(response) == endpoint else {}
+			scheduler.update(endpoint, headers, time.time() - start)
+			return result
+	
+	# tweepy Cursor needs this to choose how to page
+	if hasattr(method, "pagination_mode"):
+		limited_method.pagination_mode = method.pagination_mode
+	return limited_method
+
+
+class Job:
+	""" Queued work for the scheduler, cost is the expected number of requests to endpoint """
+
+	def __init__(self, endpoint, func, args, cost=1):
+		self.endpoint = endpoint
+		self.func = func
+		self.args = args
+		self.cost = cost
+
+	def run(self):
+		return self.func(*self.args)
+
+
+class RateLimitScheduler:
+	""" 
+	Central place for all rate limits of one api key
+	Every request takes from the budget of its endpoint (acquire), every response updates it (update).
+	Queued jobs are started in an order that skips endpoints without budget, 
+	so one exhausted endpoint does not stall the work on the others.
+	"""
+
+	def __init__(self, user_auth=False):
+		self.windows = get_windows(user_auth)
+		self.queue = deque()
+		self.requests = {endpoint: 0 for endpoint in self.windows}
+		self.request_time = {endpoint: 0.0 for endpoint in self.windows}
+		self.latency = {endpoint: Histogram(LATENCY_BUCKETS) for endpoint in self.windows}
+		# Seconds the worker threads spent sleeping on a rate limit (summed over the threads), in total and per endpoint
+		self.idle_time = 0.0
+		self.endpoint_idle_time = {endpoint: 0.0 for endpoint in self.windows}
+		self.start_time = time.time()
+		self.workers = 1
+		self._lock = threading.Lock()
+
+	def acquire(self, endpoint):
+		""" Blocks until endpoint has budget left, call before every request """
+		waited = self.windows[endpoint].acquire()
+		with self._lock:
+			self.idle_time += waited
+			self.endpoint_idle_time[endpoint] += waited
+
+	def update(self, endpoint, headers, seconds=None):
+		""" Call after every request with the response headers and the time the request took """
+		self.windows[endpoint].update(headers)
+		with self._lock:
+			self.requests[endpoint] += 1
+			if seconds is not None:
+				self.request_time[endpoint] += seconds
+		if seconds is not None:
+			self.latency[endpoint].observe(seconds)
+
+	def exhausted(self, endpoint, reset=None):
+		""" Twitter answered 429, nothing left until reset """
+		self.windows[endpoint].exhaust(reset)
+
+	def submit(self, endpoint, func, *args, cost=1):
+		""" Queues func(*args), which will do about cost requests to endpoint """
+		self.queue.append(Job(endpoint, func, args, cost))
+
+	def _next_job(self):
+		""" First queued job whose endpoint has budget left, None if there is none """
+		for job in self.queue:
+			if self.windows[job.endpoint].remaining > 0:
+				self.queue.remove(job)
+				return job
+		return None
+
+	def _sleep_until_reset(self):
+		""" Nothing can run, sleep until the first endpoint with queued work gets new budget """
+		endpoints = set(job.endpoint for job in self.queue)
+		first = min(endpoints, key=lambda endpoint: self.windows[endpoint].reset)
+		sleep_time = self.windows[first].reset - time.time()
+		if sleep_time > 0:
+			time.sleep(sleep_time)
+			with self._lock:
+				# No job runs, every worker is idle
+				self.idle_time += sleep_time * self.workers
+				self.endpoint_idle_time[first] += sleep_time * self.workers
+		for endpoint in endpoints:
+			self.windows[endpoint].refill()
+
+	def run(self, workers=1):
+		""" Runs all queued jobs with workers threads
+		Yields (job, result) tuples in the order the jobs are completed
+		"""
+		self.workers = workers
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			running = {}
+			while self.queue or running:
+				while self.queue and len(running) < workers:
+					job = self._next_job()
+					if job is None:
+						break
+					running[executor.submit(job.run)] = job
+				
+				if not running:
+					self._sleep_until_reset()
+					continue
+				
+				done, _ = wait(running, return_when=FIRST_COMPLETED)
+				for future in done:
+					job = running.pop(future)
+					yield job, future.result()
+
+	def mean_latency(self, endpoint):
+		if self.requests[endpoint] == 0:
+			return 0.0
+		return self.request_time[endpoint] / self.requests[endpoint]
+
+	def predicted_seconds(self):
+		""" Seconds until the queued jobs are done, the slowest endpoint decides """
+		now = time.time()
+		seconds = 0.0
+		for endpoint, window in self.windows.items():
+			needed = sum(job.cost for job in self.queue if job.endpoint == endpoint)
+			if needed == 0:
+				continue
+			work_time = needed * self.mean_latency(endpoint) / self.workers
+			if needed <= window.remaining:
+				rate_time = 0.0
+			else:
+				windows_needed = math.ceil((needed - window.remaining) / window.limit)
+				rate_time = max(window.reset - now, 0) + (windows_needed - 1) * window.window
+			seconds = max(seconds, work_time, rate_time)
+		return seconds
+
+	def predicted_completion(self):
+		""" datetime when the queued jobs are expected to be done """
+		return datetime.fromtimestamp(time.time() + self.predicted_seconds())
+
+	def metrics(self):
+		""" Returns dict with requests, remaining budget and idle time
+		idle_time is summed over the workers, idle_ratio is the part of the time of all workers spent idle
+		"""
+		elapsed = time.time() - self.start_time
+		return {
+			"requests": dict(self.requests),
+			"remaining": {endpoint: window.remaining for endpoint, window in self.windows.items()},
+			"reset": {endpoint: datetime.fromtimestamp(window.reset) for endpoint, window in self.windows.items()},
+			"queued_jobs": len(self.queue),
+			"elapsed_time": elapsed,
+			"workers": self.workers,
+			"idle_time": self.idle_time,
+			"idle_ratio": min(self.idle_time / (elapsed * self.workers), 1.0) if elapsed > 0 else 0.0,
+			"predicted_completion": self.predicted_completion(),
+		}
@@ -0,0 +1,197 @@
+"""
+Sentiment labels of the analysed users in one SQLite file, instead of one <user_id>_sentiment.json per user
+One row per user and model holds the labels of the user's tweets (in the order of the timeline) as int8 codes,
+so reading or writing the labels of one user and model is one indexed row, other models are never touched.
+The Analyzer caches labels per tweet id instead (tweet_labels), so a timeline that gained tweets only needs the new
+ones scored. Every model has the fingerprint of the model that wrote its labels (Model.fingerprint), a new
+fingerprint deletes the labels of that model only.
+
+Migrate the json files of a users_dir with:
+$ python results_store.py <users_dir> [<store file>]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+LABEL_CODES = {"neg": -1, "neut": 0, "pos": 1}
+CODE_LABELS = {code: label for label, code in LABEL_CODES.items()}
+# Default file name in the users_dir of the analyzer
+STORE_FILENAME = "results.sqlite"
+JSON_SUFFIX = "_sentiment.json"
+
+
+def encode_labels(labels):
+	return np.array([LABEL_CODES[label] for label in labels], dtype=np.int8).tobytes()
+
+
+def decode_labels(data):
+	return [CODE_LABELS[code] for code in np.frombuffer(data, dtype=np.int8).tolist()]
+
+
+class ResultsStore:
+	""" Labels per (user id, model name), see module doc """
+
+	def __init__(self, path):
+		self.path = path
+		self._lock = threading.Lock()
+		self.connection = sqlite3.connect(path, check_same_thread=False)
+		with self.connection:
+			self.connection.execute("CREATE TABLE IF NOT EXISTS models (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+			self.connection.execute("CREATE TABLE IF NOT EXISTS labels (user_id INTEGER NOT NULL, model_id INTEGER NOT NULL, "
+									"codes BLOB NOT NULL, PRIMARY KEY (user_id, model_id)) WITHOUT ROWID")
+			self.connection.execute("CREATE TABLE IF NOT EXISTS tweet_labels (model_id INTEGER NOT NULL, tweet_id INTEGER NOT NULL, "
+									"code INTEGER NOT NULL, PRIMARY KEY (model_id, tweet_id)) WITHOUT ROWID")
+			columns = [row[1] for row in self.connection.execute("PRAGMA table_info(models)")]
+			if "fingerprint" not in columns:
+				# Stores of older versions: fingerprint unknown, their labels count as legacy
+				self.connection.execute("ALTER TABLE models ADD COLUMN fingerprint TEXT")
+				self.connection.execute("ALTER TABLE models ADD COLUMN legacy INTEGER NOT NULL DEFAULT 1")
+		self.model_ids = dict(self.connection.execute("SELECT name, id FROM models"))
+
+	def close(self):
+		self.connection.close()
+
+	def _model_id(self, model, create=False):
+		""" Id of the model name, None if it has no labels yet (and not create) """
+		if model not in self.model_ids and create:
+			cursor = self.connection.execute("INSERT INTO models (name) VALUES (?)", (model,))
+			self.model_ids[model] = cursor.lastrowid
+		return self.model_ids.get(model)
+
+	def models(self):
+		return list(self.model_ids)
+
+	def set_fingerprint(self, model, fingerprint):
+		""" Records the fingerprint of model, deletes all its labels if they were written with another one
+		:return: True if labels were deleted
+		"""
+		with self._lock, self.connection:
+			model_id = self._model_id(model, create=True)
+			old = self.connection.execute("SELECT fingerprint FROM models WHERE id = ?", (model_id,)).fetchone()[0]
+			if old == fingerprint:
+				return False
+			if old is None:
+				# Labels from before fingerprints (and <user_id>_sentiment.json files) are trusted once
+				self.connection.execute("UPDATE models SET fingerprint = ? WHERE id = ?", (fingerprint, model_id))
+				return False
+			self.connection.execute("DELETE FROM labels WHERE model_id = ?", (model_id,))
+			self.connection.execute("DELETE FROM tweet_labels WHERE model_id = ?", (model_id,))
+			self.connection.execute("UPDATE models SET fingerprint = ?, legacy = 0 WHERE id = ?", (fingerprint, model_id))
+			return True
+
+	def uses_legacy(self, model):
+		""" False once the labels of model were invalidated, older per user labels are outdated then """
+		model_id = self._model_id(model)
+		if model_id is None:
+			return True
+		with self._lock:
+			return bool(self.connection.execute("SELECT legacy FROM models WHERE id = ?", (model_id,)).fetchone()[0])
+
+	def get_tweet_codes(self, model, tweet_ids):
+		""" Dict tweet id -> label code of the tweets with a cached label of model """
+		model_id = self._model_id(model)
+		if model_id is None or not len(tweet_ids):
+			return {}
+		codes = {}
+		with self._lock:
+			# Stay below the SQLite variable limit
+			for start in range(0, len(tweet_ids), 500):
+				chunk = [int(tweet_id) for tweet_id in tweet_ids[start:start + 500]]
+				codes.update(self.connection.execute(
+					f"SELECT tweet_id, code FROM tweet_labels WHERE model_id = ? AND tweet_id IN ({','.join('?' * len(chunk))})",
+					[model_id] + chunk))
+		return codes
+
+	def get_tweet_labels(self, model, tweet_ids):
+		""" Dict tweet id -> label ("neg", "neut", "pos") of the tweets with a cached label of model """
+		return {tweet_id: CODE_LABELS[code] for tweet_id, code in self.get_tweet_codes(model, tweet_ids).items()}
+
+	def put_tweet_labels(self, model, tweet_ids, labels):
+		""" Caches the label of every tweet id by model """
+		with self._lock, self.connection:
+			model_id = self._model_id(model, create=True)
+			self.connection.executemany("INSERT OR REPLACE INTO tweet_labels (model_id, tweet_id, code) VALUES (?, ?, ?)",
+										((model_id, int(tweet_id), LABEL_CODES[label]) for tweet_id, label in zip(tweet_ids, labels)))
+
+	def get_codes(self, user_id, model):
+		""" int8 array of the label codes (LABEL_CODES), None if the user has no labels of model """
+		model_id = self._model_id(model)
+		if model_id is None:
+			return None
+		with self._lock:
+			row = self.connection.execute("SELECT codes FROM labels WHERE user_id = ? AND model_id = ?",
+										  (int(user_id), model_id)).fetchone()
+		return np.frombuffer(row[0], dtype=np.int8) if row is not None else None
+
+	def get(self, user_id, model):
+		""" List of labels ("neg", "neut", "pos"), None if the user has no labels of model """
+		codes = self.get_codes(user_id, model)
+		return [CODE_LABELS[code] for code in codes.tolist()] if codes is not None else None
+
+	def __contains__(self, key):
+		""" (user_id, model) in store """
+		return self.get_codes(*key) is not None
+
+	def put(self, user_id, model, labels):
+		""" Saves (replaces) the labels of user_id by model """
+		self.put_many(model, [(user_id, labels)])
+
+	def put_many(self, model, user_labels):
+		""" Saves (user_id, labels) pairs of model in one transaction """
+		with self._lock, self.connection:
+			model_id = self._model_id(model, create=True)
+			self.connection.executemany("INSERT OR REPLACE INTO labels (user_id, model_id, codes) VALUES (?, ?, ?)",
+										((int(user_id), model_id, encode_labels(labels)) for user_id, labels in user_labels))
+
+	def users(self, model):
+		""" Ids (str) of the users with labels of model """
+		model_id = self._model_id(model)
+		if model_id is None:
+			return []
+		with self._lock:
+			rows = self.connection.execute("SELECT user_id FROM labels WHERE model_id = ?", (model_id,)).fetchall()
+		return [str(row[0]) for row in rows]
+
+	def import_json_dir(self, users_dir, batch_size=500):
+		""" Copies every <user_id>_sentiment.json of users_dir (dict model name -> labels) into the store
+		:return: number of imported files
+		"""
+		imported = 0
+		batches = {}
+		for filename in os.listdir(users_dir):
+			if not filename.endswith(JSON_SUFFIX):
+				continue
+			user_id = filename[:-len(JSON_SUFFIX)]
+			with open(os.path.join(users_dir, filename)) as f:
+				for model, labels in json.load(f).items():
+					batches.setdefault(model, []).append((user_id, labels))
+			imported += 1
+			if imported % batch_size == 0:
+				self._write_batches(batches)
+		self._write_batches(batches)
+		return imported
+
+	def _write_batches(self, batches):
+		for model, user_labels in batches.items():
+			self.put_many(model, user_labels)
+		batches.clear()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Copies the <user_id>_sentiment.json files of users_dir into a ResultsStore")
+	parser.add_argument("users_dir")
+	parser.add_argument("store", nargs="?", default=None, help=f"default: <users_dir>/{STORE_FILENAME}")
+	args = parser.parse_args()
+
+	store = ResultsStore(args.store or os.path.join(args.users_dir, STORE_FILENAME))
+	imported = store.import_json_dir(args.users_dir)
+	print(f"Imported {imported} files, models: {', '.join(store.models())}")
+	store.close()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,146 @@
+"""
+Write-ahead journal of a full scan
+Every user of a scan is written to the journal before its timeline is fetched (planned),
+every saved page of the timeline (in flight) and the finished timeline (done) are written after.
+A timeline twitter refuses (protected or deleted account) is failed, a resumed scan skips it like a done one.
+If the scan dies, the next scan reads the journal and continues at the exact user and page.
+
+Report how far a scan got with:
+$ python scan_journal.py <full_scan path>/journal
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+
+import helper
+
+PLANNED = "planned"
+IN_FLIGHT = "in flight"
+DONE = "done"
+FAILED = "failed"
+
+
+class ScanJournal:
+	""" Append-only journal file, one json record per line """
+
+	def __init__(self, path, repair=True):
+		"""
+		:param repair: False to only read (e.g. the report of a running scan), a torn last line stays in the file
+		"""
+		self.path = path
+		self.repair = repair
+		self._lock = threading.Lock()
+		self.started = None
+		self.finished = True
+		# user_id -> location index
+		self.locations = {}
+		# user_id -> PLANNED / IN_FLIGHT / DONE / FAILED
+		self.states = {}
+		# user_id -> dict of the last saved page (max_id, seen, kept, newest_id, size)
+		self.progress = {}
+		self._load()
+
+	def _load(self):
+		""" Replays the journal file """
+		if not os.path.isfile(self.path):
+			return
+		# Last line is torn if the scan died while writing it, cut off so the next record starts a line
+		for line in helper.read_complete_lines(self.path, self.repair):
+			try:
+				record = json.loads(line)
+			except ValueError:
+				continue
+			self._apply(record)
+
+	def _apply(self, record):
+		event = record["event"]
+		if event == "scan":
+			self.started = record["time"]
+			self.finished = False
+			self.locations = {}
+			self.states = {}
+			self.progress = {}
+		elif event == "planned":
+			for user_id in record["user_ids"]:
+				self.locations[user_id] = record["idx"]
+				self.states[user_id] = PLANNED
+		elif event == "page":
+			self.states[record["user_id"]] = IN_FLIGHT
+			self.progress[record["user_id"]] = record["progress"]
+		elif event == "done":
+			self.states[record["user_id"]] = DONE
+			self.progress.pop(record["user_id"], None)
+		elif event == "failed":
+			self.states[record["user_id"]] = FAILED
+			self.progress.pop(record["user_id"], None)
+		elif event == "finished":
+			self.finished = True
+
+	def _write(self, record, mode="a"):
+		""" Applies record and appends it to the file, it is on disk when this returns """
+		with self._lock:
+			self._apply(record)
+			with open(self.path, mode) as f:
+				f.write(json.dumps(record) + "\n")
+				f.flush()
+				os.fsync(f.fileno())
+
+	def begin(self, users_list):
+		""" Starts a new journal with the users (nested list per location) of a new scan """
+		self._write({"event": "scan", "time": datetime.now().isoformat()}, mode="w")
+		for idx, users in enumerate(users_list):
+			self._write({"event": "planned", "idx": idx, "user_ids": [user.id_str for user in users]})
+
+	def page(self, user_id, progress):
+		""" A page of the timeline of user_id was saved, progress is the dict to continue from """
+		self._write({"event": "page", "user_id": user_id, "progress": dict(progress)})
+
+	def done(self, user_id):
+		self._write({"event": "done", "user_id": user_id})
+
+	def failed(self, user_id, reason):
+		""" The timeline of user_id can not be fetched, reason is the error text """
+		self._write({"event": "failed", "user_id": user_id, "reason": reason})
+
+	def finish(self):
+		self._write({"event": "finished"})
+
+	def get_progress(self, user_id):
+		""" Returns the progress dict of the last saved page of user_id, None if no page was saved """
+		with self._lock:
+			progress = self.progress.get(user_id)
+			return dict(progress) if progress is not None else None
+
+	def pending(self):
+		""" Returns dict location index -> user ids that are planned or in flight """
+		pending = {}
+		with self._lock:
+			for user_id, state in self.states.items():
+				if state not in (DONE, FAILED):
+					pending.setdefault(self.locations[user_id], []).append(user_id)
+		return pending
+
+	def report(self):
+		""" Returns readable text of how far the scan got """
+		if self.started is None:
+			return "No scan in journal"
+		lines = [f"Scan started at {self.started}, " + ("finished" if self.finished else "not finished")]
+		for idx in sorted(set(self.locations.values())):
+			user_ids = [user_id for user_id, loc in self.locations.items() if loc == idx]
+			counts = {state: sum(1 for u in user_ids if self.states[u] == state)
+					  for state in (PLANNED, IN_FLIGHT, DONE, FAILED)}
+			lines.append(f"Location {idx}: {counts[DONE]}/{len(user_ids)} done, {counts[FAILED]} failed, "
+						 f"{counts[IN_FLIGHT]} in flight, {counts[PLANNED]} planned")
+		for user_id, progress in self.progress.items():
+			lines.append(f"  {user_id}: {progress['seen']} tweets seen, {progress['kept']} kept, "
+						 f"continues at max_id {progress['max_id']}")
+		return "\n".join(lines)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Report how far a full scan got")
+	parser.add_argument("journal", help="path to the journal file, <full_scan path>/journal")
+	args = parser.parse_args()
+	print(ScanJournal(args.journal, repair=False).report())
@@ -0,0 +1,123 @@
+"""
+Sentiment of many users per time bucket as one users x buckets x labels count array
+Percentages, means over users, tweet weighted means, counts and percentiles are single numpy calls on it,
+buckets in which a user did not tweet are masked. The dicts of the Analyzer (per user and the summary)
+are built from it when they are needed, e.g. for plotting.
+"""
+import warnings
+
+import numpy as np
+
+from results_store import LABEL_CODES
+
+# Index of every label on the last axis of the counts
+LABEL_INDEX = {label: code + 1 for label, code in LABEL_CODES.items()}
+AMOUNT_KEYS = {"neg": "extremely_neg_amount", "neut": "neut_amount", "pos": "extremely_pos_amount"}
+
+
+class SentimentMatrix:
+	"""
+	:param labels: group id of every bucket
+	:param user_ids: id of every row
+	:param counts: int array users x buckets x 3, number of "neg", "neut" and "pos" tweets (LABEL_INDEX)
+	Also a sequence of the per user dicts of Analyzer._get_single_user_sentiment_analysis
+	"""
+
+	def __init__(self, labels, user_ids, counts):
+		self.labels = list(labels)
+		self.user_ids = list(user_ids)
+		self.counts = np.asarray(counts, dtype=np.int32).reshape(len(self.user_ids), len(self.labels), len(LABEL_INDEX))
+		# Tweets per user and bucket, adding the labels is much faster than a sum over the short last axis
+		self.totals = sum(self.counts[..., index] for index in LABEL_INDEX.values())
+
+	@classmethod
+	def from_analysations(cls, user_analysations):
+		""" Matrix of per user dicts (group id -> amounts, -1 without tweets), user ids are not known """
+		labels = list(user_analysations[0])
+		counts = np.array([[[max(user_dict[label][AMOUNT_KEYS[name]], 0) for name in LABEL_INDEX] for label in labels]
+						   for user_dict in user_analysations])
+		return cls(labels, [None] * len(user_analysations), counts)
+
+	@classmethod
+	def concatenate(cls, matrices):
+		""" One matrix with the users of all matrices, they need the same buckets """
+		for matrix in matrices[1:]:
+			if matrix.labels != matrices[0].labels:
+				raise ValueError("matrices have different buckets")
+		return cls(matrices[0].labels, [user_id for matrix in matrices for user_id in matrix.user_ids],
+				   np.concatenate([matrix.counts for matrix in matrices]))
+
+	def __len__(self):
+		return len(self.user_ids)
+
+	def __getitem__(self, index):
+		return self.user_dict(index)
+
+	def __iter__(self):
+		return (self.user_dict(index) for index in range(len(self)))
+
+	def amounts(self, label):
+		""" Masked users x buckets array of the number of tweets with label """
+		return np.ma.masked_array(self.counts[..., LABEL_INDEX[label]], mask=self.totals == 0)
+
+	def percentages(self, label):
+		""" Masked users x buckets array, percentage of the tweets of the user in the bucket with label """
+		totals = self.totals
+		with np.errstate(invalid="ignore", divide="ignore"):
+			values = self.counts[..., LABEL_INDEX[label]] / totals * 100
+		return np.ma.masked_array(values, mask=totals == 0)
+
+	def num_users(self):
+		""" Users with tweets per bucket """
+		return (self.totals > 0).sum(axis=0)
+
+	def user_mean(self, label):
+		""" Mean over the users with tweets in the bucket of their percentage of label (masked without users) """
+		totals = self.totals
+		percentages = np.divide(self.counts[..., LABEL_INDEX[label]] * 100, totals, out=np.zeros(totals.shape), where=totals > 0)
+		users = (totals > 0).sum(axis=0)
+		return np.ma.masked_array(percentages.sum(axis=0) / np.maximum(users, 1), mask=users == 0)
+
+	def tweet_mean(self, label):
+		""" Percentage of all tweets in the bucket with label, users with many tweets weigh more """
+		totals = self.totals.sum(axis=0)
+		with np.errstate(invalid="ignore", divide="ignore"):
+			values = self.counts[..., LABEL_INDEX[label]].sum(axis=0) / totals * 100
+		return np.ma.masked_array(values, mask=totals == 0)
+
+	def percentile(self, label, q):
+		""" q-th percentile(s) over the users with tweets of their percentage of label, nan without users """
+		with warnings.catch_warnings():
+			# Buckets without users are nan
+			warnings.simplefilter("ignore", RuntimeWarning)
+			return np.nanpercentile(self.percentages(label).filled(np.nan), q, axis=0)
+
+	def user_dict(self, index):
+		""" Dict of one user like Analyzer._get_single_user_sentiment_analysis, -1 for buckets without tweets """
+		user_dict = {}
+		for label, counts in zip(self.labels, self.counts[index].tolist()):
+			neg_amount, neut_amount, pos_amount = counts
+			total = neg_amount + neut_amount + pos_amount
+			if total == 0:
+				user_dict[label] = {"extremely_pos_percentage": -1, "extremely_neg_percentage": -1,
+									"extremely_pos_amount": -1, "extremely_neg_amount": -1, "neut_amount": -1}
+			else:
+				user_dict[label] = {"neut_amount": neut_amount,
+									"extremely_pos_percentage": pos_amount / total * 100,
+									"extremely_neg_percentage": neg_amount / total * 100,
+									"extremely_pos_amount": pos_amount, "extremely_neg_amount": neg_amount}
+		return user_dict
+
+	def summary(self, weighting="user"):
+		""" Dict group id -> mean percentages of the extremely pos and neg tweets, like Analyzer.summarize_user_sentiments
+		:param weighting: "user" mean over the users, "tweet" over all tweets of the bucket
+		"""
+		mean = {"user": self.user_mean, "tweet": self.tweet_mean}[weighting]
+		pos = mean("pos").filled(0).tolist()
+		neg = mean("neg").filled(0).tolist()
+		for label, users in zip(self.labels, self.num_users().tolist()):
+			if users == 0:
+				print("No pos datapoints for this timespan, start_date = {}".format(label))
+				print("No neg datapoints for this timespan, start_date = {}".format(label))
+		return {label: {"extremely_pos_percentage": pos[i], "extremely_neg_percentage": neg[i]}
+				for i, label in enumerate(self.labels)}
@@ -1,8 +1,7 @@
 import csv
-import math
-
-from tweepy import TweepError
+import os
 
+from hydrator import Hydrator
 from sentiment_models.get_tweets_for_corona_dataset import get_api_and_auth
 
 DATA_INPUT = "DATA/European_twitter_sentiment_german/German_Twitter_sentiment.csv"
@@ -23,38 +22,43 @@ neut = "neut"
 
 
 def get_text_for_tweets(api, tweets):
-    deleted_tweets = []
+    """
+    Look up the texts of the tweets (see hydrator.Hydrator), deleted tweets are left out.
+    Every looked up batch is appended to DATA_OUTPUT and checkpointed, a restart continues with the missing tweets
+    :param tweets: list of dicts (keys: "tweet_id", "label")
+    :return: list of dicts (keys: "tweet_id", "label", "text") looked up in this run
+    """
+    hydrator = Hydrator(api, DATA_OUTPUT + ".checkpoint")
+    # Rows saved right before a crash may be missing in the checkpoint, they are not looked up and saved again
+    missing = hydrator.add_done(read_saved_ids(DATA_OUTPUT))
+    if missing:
+        print("{} saved tweets were not in the checkpoint".format(missing))
+    tweets_by_id = {tweet["tweet_id"]: tweet for tweet in tweets}
     tweets_mit_text = []
-    for i in range(math.ceil(len(tweets)/100+1)):
-        # try:
-        currently_deleted_tweets = []
-        last_id = min((i+1)*100, len(tweets))
-        current_tweets = tweets[i*100:last_id]
-        current_tweet_ids = [tweet["tweet_id"] for tweet in current_tweets]
-        if not len(current_tweet_ids) == 0:
-            tweet_texts = api.statuses_lookup(current_tweet_ids, map_=True, tweet_mode="extended")
-            tweet_text_dict = {tweet.id_str: tweet.full_text.replace("\n", " ") for tweet in tweet_texts if
-                               hasattr(tweet, "full_text")}
-            for j in range(len(current_tweets)):
-                current_tweet_id = current_tweets[j]["tweet_id"]
-                if not current_tweet_id in tweet_text_dict:
-                    deleted_tweets.append(current_tweets[j])
-                    currently_deleted_tweets.append(current_tweets[j])
-                else:
-                    current_tweets[j]["text"] = tweet_text_dict[current_tweet_id]
-            current_valid_tweets = [tweet for tweet in current_tweets if not tweet in currently_deleted_tweets]
-            tweets_mit_text += current_tweets
+    for statuses, deleted_ids in hydrator.hydrate(tweets_by_id):
+        current_valid_tweets = []
+        for tweet_id, status in statuses.items():
+            tweets_by_id[tweet_id]["text"] = status.full_text.replace("\n", " ")
+            current_valid_tweets.append(tweets_by_id[tweet_id])
+        if current_valid_tweets:
             save_tweets_partially(current_valid_tweets, DATA_OUTPUT)
-        #     fetched_tweet = api.get_status(tweet["tweet_id"], tweet_mode="extended")
-        #     tweet["text"] = fetched_tweet.full_text.replace("\n", " ")
-        #     tweets_mit_text.append(tweet)
-        # except TweepError:
-        #     deleted_tweets.append(tweet)
-    for tweet in deleted_tweets:
-        tweets_mit_text.remove(tweet)
+        tweets_mit_text += current_valid_tweets
+    print("Tweets with text: {}, deleted: {}".format(len(hydrator.done), len(hydrator.deleted)))
     return tweets_mit_text
 
 
+def read_saved_ids(outfile_path):
+    """
+    Tweet ids of the rows save_tweets_partially appended to outfile_path
+    :return: list of tweet ids, empty if the file does not exist yet
+    """
+    if not os.path.isfile(outfile_path):
+        return []
+    with open(outfile_path, "r") as infile:
+        # The first column is the tweet id, a torn last row is kept as it is
+        return [row[0] for row in csv.reader(infile) if row]
+
+
 def read_file(data_path):
     """
     Read the csv-file downloaded from https://www.clarin.si/repository/xmlui/handle/11356/1054 into a list of dicts
@@ -135,7 +139,6 @@ def get_tweet_texts(filtered_tweets):
     :param filtered_tweets: list of dicts (keys: "tweet_id", "label", "text")
     :return:
     """
-    filtered_tweets = {tweet_id: filtered_tweets[tweet_id] for tweet_id in list(filtered_tweets)[50000:]}
     api = get_api_and_auth()
     tweet_ids = [{"tweet_id": tweet_id, "label": filtered_tweets[tweet_id]} for tweet_id in filtered_tweets]
     tweets_with_text = get_text_for_tweets(api, tweet_ids)
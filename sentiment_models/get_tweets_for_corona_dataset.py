@@ -1,7 +1,8 @@
 import csv
 
 import tweepy
-from tweepy import TweepError
+
+from hydrator import Hydrator
 # from keys import CONSUMER_KEY, CONSUMER_SECRET, ACCESS_KEY, ACCESS_SECRET
 CONSUMER_KEY = CONSUMER_SECRET = ACCESS_KEY = ACCESS_SECRET = ""
 
@@ -19,17 +20,20 @@ def read_dataset():
 
 
 def get_text_for_tweets(api, tweets):
-    deleted_tweets = []
+    """
+    Look up the texts of the tweets in batches (see hydrator.Hydrator), deleted tweets are left out
+    :param tweets: list of dicts with key "tweet_id"
+    :return: the tweets that still exist, with key "text" added, in the order of tweets
+    """
+    texts = {}
+    for statuses, deleted_ids in Hydrator(api).hydrate(tweet["tweet_id"] for tweet in tweets):
+        for tweet_id, status in statuses.items():
+            texts[tweet_id] = status.full_text.replace("\n", " ")
     tweets_mit_text = []
     for tweet in tweets:
-        try:
-            fetched_tweet = api.get_status(tweet["tweet_id"], tweet_mode="extended")
-            tweet["text"] = fetched_tweet.full_text.replace("\n", " ")
+        if tweet["tweet_id"] in texts:
+            tweet["text"] = texts[tweet["tweet_id"]]
             tweets_mit_text.append(tweet)
-        except TweepError as e:
-            deleted_tweets.append(tweet)
-    for tweet in deleted_tweets:
-        tweets.remove(tweet)
     return tweets_mit_text
 
 
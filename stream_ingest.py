@@ -0,0 +1,104 @@
+"""
+Streaming ingestion, the alternative to searching the scan geocodes every hour
+Statuses posted in a bounding box come in over tweepy's Stream, are checked with Crawler.check_tweet
+and saved in micro batches, grouped by user and appended to tweets/<location>/<user_id>.
+See Crawler.stream_scan, benchmarks/bench_stream.py runs it against a local stand-in stream.
+"""
+import threading
+import time
+
+import tweepy
+
+
+class IngestListener(tweepy.StreamListener):
+	""" Buffers the statuses that pass the filters of crawler and saves them in batches """
+
+	def __init__(self, crawler, path, batch_size=100, flush_interval=5, max_tweets=None):
+		"""
+		:param path: directory the tweets are saved in, one file (or store key) per user
+		:param batch_size: the buffer is saved once it holds this many tweets
+		:param flush_interval: or when it was not saved for this many seconds, see flush_due
+		:param max_tweets: stop the stream after this many received statuses, None for no limit
+		"""
+		super().__init__(crawler.api)
+		self.crawler = crawler
+		self.path = path
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.max_tweets = max_tweets
+		self.buffer = []
+		self.received = 0
+		self.kept = 0
+		self.written = 0
+		self.batches = 0
+		self.start = None
+		self.last_status = None
+		self.last_flush = time.time()
+		self._lock = threading.Lock()
+		# Only one batch is written at a time, the stream thread and the caller both flush
+		self._write_lock = threading.Lock()
+
+	def on_connect(self):
+		if self.start is None:
+			self.start = time.time()
+
+	def on_status(self, status):
+		with self._lock:
+			self.received += 1
+			self.last_status = time.time()
+			# -1 (older than until) can not stop a stream, it is only dropped
+			if self.crawler.check_tweet(status) == 1:
+				self.buffer.append(status)
+				self.kept += 1
+			full = len(self.buffer) >= self.batch_size
+			done = self.max_tweets is not None and self.received >= self.max_tweets
+		if full:
+			self.flush()
+		return not done
+
+	def on_error(self, status_code):
+		print("Stream error:", status_code)
+		# 420: too many connections, let tweepy back off and reconnect
+		return status_code == 420
+
+	def flush_due(self):
+		return time.time() - self.last_flush >= self.flush_interval
+
+	def flush(self):
+		""" Saves the buffered tweets, appended to the file of their user """
+		with self._write_lock:
+			with self._lock:
+				tweets, self.buffer = self.buffer, []
+				self.last_flush = time.time()
+			if not tweets:
+				return
+			by_user = {}
+			for tweet in tweets:
+				by_user.setdefault(tweet.user.id_str, []).append(tweet)
+			for user_id, user_tweets in by_user.items():
+				self.crawler.save_tweets(user_tweets, self.path + user_id, configs=False, append=True)
+			with self._lock:
+				self.written += len(tweets)
+				self.batches += 1
+
+	def report(self):
+		""" Returns dict with the counters and the ingest rate in tweets per second,
+		from the first connect to the last received status
+		"""
+		with self._lock:
+			seconds = self.last_status - self.start if self.last_status is not None else 0
+			return {
+				"received": self.received,
+				"kept": self.kept,
+				"written": self.written,
+				"batches": self.batches,
+				"seconds": seconds,
+				"received_per_second": self.received / seconds if seconds else 0,
+				"kept_per_second": self.kept / seconds if seconds else 0,
+			}
+
+
+def format_report(report):
+	return (f"{report['received']} received, {report['kept']} kept, {report['written']} written in "
+			f"{report['batches']} batches, {report['received_per_second']:.1f} tweets/s "
+			f"({report['kept_per_second']:.1f} kept/s)")
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+from analyzer import Analyzer
+
+
+class CountingModel:
+    """ Labels every text by its first word, counts the scored texts """
+    name = "Counting"
+
+    def __init__(self, fingerprint="a"):
+        self._fingerprint = fingerprint
+        self.scored = []
+
+    def fingerprint(self):
+        return self._fingerprint
+
+    def get_label_for_clear_cases(self, texts):
+        self.scored.extend(texts)
+        return [text.split()[0] for text in texts]
+
+
+def make_tweets(user_id, labels, first_id=1):
+    return [SimpleNamespace(id=first_id + i, text=f"{label} tweet {first_id + i}", created_at=datetime(2020, 3, 1),
+                            user=SimpleNamespace(id_str=user_id))
+            for i, label in enumerate(labels)]
+
+
+class TestAnalyzerLabels(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.config = {"analyze_sentiment": {"users_dir": self.dir}}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_only_unseen_tweets_are_scored(self):
+        model = CountingModel()
+        tweets = make_tweets("1", ["pos", "neg", "neut"])
+        self.assertEqual(Analyzer(self.config, model)._get_labels(tweets), ["pos", "neg", "neut"])
+        self.assertEqual(len(model.scored), 3)
+
+        # The timeline gained two tweets, a new analyzer scores only those
+        model.scored = []
+        grown = make_tweets("1", ["neg", "pos"], first_id=4) + tweets
+        self.assertEqual(Analyzer(self.config, model)._get_labels(grown), ["neg", "pos", "pos", "neg", "neut"])
+        self.assertEqual(model.scored, ["neg tweet 4", "pos tweet 5"])
+
+    def test_new_fingerprint_scores_again(self):
+        tweets = make_tweets("1", ["pos", "neg"])
+        Analyzer(self.config, CountingModel("a"))._get_labels(tweets)
+        model = CountingModel("b")
+        Analyzer(self.config, model)._get_labels(tweets)
+        self.assertEqual(len(model.scored), 2)
+
+    def test_legacy_positional_labels(self):
+        # Labels of a user analysed before the per tweet cache, one per tweet in the order of the timeline
+        with open(os.path.join(self.dir, "1_sentiment.json"), "w") as f:
+            json.dump({CountingModel.name: ["neut", "neut"]}, f)
+        analyzer = Analyzer(self.config, CountingModel())
+        analyzer.analysis_overview.add(CountingModel.name, "1")
+        self.assertEqual(analyzer._get_labels(make_tweets("1", ["pos", "neg"])), ["neut", "neut"])
+        self.assertEqual(analyzer.model.scored, [])
+        self.assertEqual(analyzer.results_store.get_tweet_labels(CountingModel.name, [1, 2]), {1: "neut", 2: "neut"})
+
+    def test_legacy_labels_of_another_timeline(self):
+        # The timeline changed since, the positional labels can not be aligned
+        analyzer = Analyzer(self.config, CountingModel())
+        analyzer.results_store.put("1", CountingModel.name, ["neut"])
+        analyzer.analysis_overview.add(CountingModel.name, "1")
+        self.assertEqual(analyzer._get_labels(make_tweets("1", ["pos", "neg"])), ["pos", "neg"])
+        self.assertEqual(len(analyzer.model.scored), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
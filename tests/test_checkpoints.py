@@ -0,0 +1,50 @@
+import shutil
+import unittest
+
+from benchmarks.bench_full_scan import make_config, make_scan_dir
+from benchmarks.fake_twitter import make_auth_dir
+from crawler import Crawler
+
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.scan_path = make_scan_dir(1)
+        self.auth_path = make_auth_dir()
+        self.crawler = Crawler(make_config(self.auth_path, self.scan_path, 1, 100, 1, 1))
+        self.path = self.scan_path + "users/checkpoints"
+
+    def tearDown(self):
+        shutil.rmtree(self.scan_path)
+        shutil.rmtree(self.auth_path)
+
+    def lines(self):
+        with open(self.path) as f:
+            return f.read().splitlines()
+
+    def test_latest_checkpoint_per_user(self):
+        self.assertEqual(self.crawler.load_checkpoints(), {})
+        self.crawler.save_checkpoint("1", 10)
+        self.crawler.save_checkpoint("2", 20)
+        self.crawler.save_checkpoint("1", 15, since_id=10)
+        # Not newer than the checkpoint it was fetched from
+        self.crawler.save_checkpoint("2", 20, since_id=20)
+        self.crawler.save_checkpoint("2", None)
+        self.assertEqual(self.lines(), ["1 10", "2 20", "1 15"])
+
+        self.assertEqual(self.crawler.load_checkpoints(), {"1": 15, "2": 20})
+        # Compacted to one line per user
+        self.assertEqual(self.lines(), ["1 15", "2 20"])
+        self.crawler.save_checkpoint("2", 25, since_id=20)
+        self.assertEqual(self.crawler.load_checkpoints(), {"1": 15, "2": 25})
+
+    def test_torn_last_line(self):
+        self.crawler.save_checkpoint("1", 10)
+        with open(self.path, "a") as f:
+            f.write("2 2")
+        self.assertEqual(self.crawler.load_checkpoints(), {"1": 10})
+        self.crawler.save_checkpoint("2", 20)
+        self.assertEqual(self.crawler.load_checkpoints(), {"1": 10, "2": 20})
+
+
+if __name__ == "__main__":
+    unittest.main()
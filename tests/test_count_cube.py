@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from count_cube import CountCube, NO_REGION
+from date_buckets import DayBuckets, to_datetime64
+from sentiment_matrix import LABEL_INDEX
+
+LABELS = list(LABEL_INDEX)
+
+
+def make_user(user_id, region, rng, first_day, num_days, models):
+    """ (user_id, region, tweets, labels per model) with tweets at random times of num_days days """
+    seconds = np.sort(rng.integers(0, num_days * 24 * 3600, size=40))[::-1]
+    tweets = [SimpleNamespace(created_at=first_day + timedelta(seconds=int(second))) for second in seconds]
+    # The last second of the last day
+    tweets.insert(0, SimpleNamespace(created_at=first_day + timedelta(days=num_days) - timedelta(seconds=30)))
+    labels = {model: [LABELS[i] for i in rng.integers(0, 3, size=len(tweets))] for model in models}
+    return user_id, region, tweets, labels
+
+
+def bucket_counts(users, model, buckets):
+    """ users x buckets x labels counts of the tweets in the buckets, like Analyzer._count_user_sentiments """
+    counts = []
+    for user_id, region, tweets, labels in users:
+        groups = buckets.assign(to_datetime64((tweet.created_at for tweet in tweets), len(tweets)))
+        label_index = np.array([LABEL_INDEX[label] for label in labels[model]], dtype=np.int64)
+        in_range = groups >= 0
+        counts.append(np.bincount(groups[in_range] * len(LABEL_INDEX) + label_index[in_range],
+                                  minlength=len(buckets) * len(LABEL_INDEX)).reshape(len(buckets), len(LABEL_INDEX)))
+    return np.array(counts)
+
+
+class TestCountCube(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.models = ["Vader", "TextBlob"]
+        self.first_day = datetime(2020, 3, 1)
+        self.users = [make_user(str(i), i % 2, rng, self.first_day, 30, self.models) for i in range(6)]
+        self.cube = CountCube.from_labels(self.models, self.users)
+
+    def test_matrix_matches_bucketing_of_whole_days(self):
+        start_date = datetime(2020, 3, 3)
+        end_date = datetime(2020, 3, 30, 23, 59, 59)
+        buckets = DayBuckets(start_date, end_date, 7)
+        for model in self.models:
+            matrix = self.cube.matrix(start_date, end_date, 7, model)
+            self.assertEqual(matrix.labels, buckets.labels)
+            self.assertEqual(matrix.user_ids, [user[0] for user in self.users])
+            np.testing.assert_array_equal(matrix.counts, bucket_counts(self.users, model, buckets))
+
+    def test_matrix_counts_whole_days(self):
+        # The Analyzer stops at the time of end_date (and starts at the time of start_date),
+        # the cube counts every tweet of the first and the last day
+        start_date = datetime(2020, 3, 3, 12)
+        end_date = datetime(2020, 3, 30, 12)
+        matrix = self.cube.matrix(start_date, end_date, 7, "Vader")
+        whole_days = DayBuckets(datetime(2020, 3, 3), datetime(2020, 3, 30, 23, 59, 59), 7)
+        np.testing.assert_array_equal(matrix.counts, bucket_counts(self.users, "Vader", whole_days))
+        self.assertEqual(matrix.counts.sum(), sum(1 for user in self.users for tweet in user[2]
+                                                  if datetime(2020, 3, 3) <= tweet.created_at < datetime(2020, 3, 31)))
+        # e.g. the tweets at 23:59:30 of end_date
+        analyzer = bucket_counts(self.users, "Vader", DayBuckets(start_date, end_date, 7))
+        self.assertGreater(matrix.counts[:, -1].sum(), analyzer[:, -1].sum())
+
+    def test_window_and_regions(self):
+        window = self.cube.window(datetime(2020, 3, 30), datetime(2020, 3, 30), "Vader", regions=[1])
+        self.assertEqual(window.shape, (3, len(LABEL_INDEX)))
+        # Every user has a tweet at the end of 2020-03-30
+        self.assertTrue((window.sum(axis=1) >= 1).all())
+        self.assertEqual(self.cube.user_mask(user_ids=[1, "2"]).tolist(), [False, True, True, False, False, False])
+        self.assertEqual(self.cube.window(datetime(2019, 1, 1), datetime(2019, 1, 31), "Vader").sum(), 0)
+
+    def test_clipped_range(self):
+        cube = CountCube.from_labels(self.models, self.users, datetime(2020, 3, 10), datetime(2020, 3, 19, 8))
+        self.assertEqual(cube.first_day, np.datetime64("2020-03-10"))
+        self.assertEqual(cube.num_days, 10)
+        start = int((cube.first_day - self.cube.first_day) / np.timedelta64(1, "D"))
+        np.testing.assert_array_equal(cube.counts, self.cube.counts[:, start:start + 10])
+        empty = CountCube.from_labels(self.models, self.users, datetime(2021, 1, 1))
+        self.assertEqual(empty.num_days, 0)
+        self.assertEqual(empty.user_ids, [user[0] for user in self.users])
+        self.assertEqual(empty.regions.tolist(), [user[1] for user in self.users])
+
+    def test_concatenate(self):
+        first = CountCube.from_labels(self.models, self.users[:3], last_day=datetime(2020, 3, 10))
+        second = CountCube.from_labels(self.models, self.users[3:], first_day=datetime(2020, 3, 5))
+        without_tweets = CountCube.empty(self.models, ["7"])
+        cube = CountCube.concatenate([first, without_tweets, second])
+        self.assertEqual(cube.user_ids, ["0", "1", "2", "7", "3", "4", "5"])
+        self.assertEqual(cube.first_day, self.cube.first_day)
+        self.assertEqual(cube.num_days, self.cube.num_days)
+        np.testing.assert_array_equal(cube.counts[:3, :10], self.cube.counts[:3, :10])
+        self.assertEqual(cube.counts[:3, 10:].sum(), 0)
+        self.assertEqual(cube.counts[3].sum(), 0)
+        np.testing.assert_array_equal(cube.counts[4:, 4:], self.cube.counts[3:, 4:])
+        self.assertEqual(cube.regions.tolist(), [0, 1, 0, NO_REGION, 1, 0, 1])
+
+        self.assertEqual(CountCube.concatenate([], self.models).models, self.models)
+        self.assertEqual(CountCube.concatenate([without_tweets]).user_ids, ["7"])
+        with self.assertRaises(ValueError):
+            CountCube.concatenate([first, CountCube.empty(["Vader"])])
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "count_cube.npz")
+            self.cube.save(path)
+            loaded = CountCube.load(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(loaded.first_day, self.cube.first_day)
+        self.assertEqual(loaded.user_ids, self.cube.user_ids)
+        self.assertEqual(loaded.models, self.models)
+        self.assertEqual(loaded.regions.tolist(), self.cube.regions.tolist())
+        np.testing.assert_array_equal(loaded.counts, self.cube.counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from date_buckets import DayBuckets, to_datetime64
+
+
+def old_day_group_dict(start_date, end_date, group_by):
+    """ Analyzer._get_day_group_dict before DayBuckets """
+    nr_days_between_start_end = (end_date - start_date).days
+    all_days_between = [end_date - timedelta(days=x) for x in reversed(range(0, nr_days_between_start_end + 1))]
+    days_grouped = [all_days_between[x:x + group_by] for x in range(0, len(all_days_between), group_by)]
+    date_id_dict = {}
+    for day_group in days_grouped:
+        group_id = day_group[0].strftime("%d.%m")
+        for day in day_group:
+            date_id_dict[day.strftime("%d.%m")] = group_id
+    return date_id_dict
+
+
+def old_group_tweets(tweets, start_date, end_date, group_by):
+    """ Analyzer._group_tweets before DayBuckets, tweets are (tweet, sentiment) tuples """
+    day_group_dict = old_day_group_dict(start_date, end_date, group_by)
+    tweets_grouped = {value: [] for value in day_group_dict.values()}
+    for tweet, sentiment in tweets:
+        if start_date <= tweet.created_at <= end_date:
+            tweets_grouped[day_group_dict[tweet.created_at.strftime("%d.%m")]].append((tweet, sentiment))
+    return tweets_grouped
+
+
+class Tweet:
+    def __init__(self, created_at):
+        self.created_at = created_at
+
+
+class TestDayBuckets(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(0)
+
+    def random_range(self):
+        """ start and end date in one year, the old grouping needs the time of end_date not before the one of start_date """
+        start_date = datetime(2020, 1, 1) + timedelta(days=self.rng.randint(0, 250), hours=self.rng.randint(0, 11))
+        end_date = start_date.replace(hour=self.rng.randint(start_date.hour, 23)) + timedelta(days=self.rng.randint(0, 100))
+        return start_date, end_date
+
+    def test_same_groups_as_the_old_grouping(self):
+        for _ in range(100):
+            start_date, end_date = self.random_range()
+            group_by = self.rng.randint(1, 10)
+            # Also tweets of the days before and after the range
+            seconds = (end_date - start_date).days * 86400
+            tweets = [(Tweet(start_date + timedelta(seconds=self.rng.randint(-3 * 86400, seconds + 3 * 86400))),
+                       self.rng.choice(["neg", "neut", "pos"])) for _ in range(200)]
+            buckets = DayBuckets(start_date, end_date, group_by)
+            grouped = buckets.group(tweets, to_datetime64((tweet.created_at for tweet, sentiment in tweets), len(tweets)))
+            expected = old_group_tweets(tweets, start_date, end_date, group_by)
+            self.assertEqual(list(grouped), list(expected))
+            self.assertEqual(grouped, expected)
+            self.assertEqual(buckets.day_group_dict(), old_day_group_dict(start_date, end_date, group_by))
+
+    def test_assign_matches_group(self):
+        start_date, end_date = datetime(2020, 3, 1, 12), datetime(2020, 3, 20, 8)
+        buckets = DayBuckets(start_date, end_date, 7)
+        times = to_datetime64([datetime(2020, 3, 1, 11), datetime(2020, 3, 1, 12), datetime(2020, 3, 8),
+                               datetime(2020, 3, 20, 8), datetime(2020, 3, 20, 9)])
+        self.assertEqual(buckets.assign(times).tolist(), [-1, 0, 1, 2, -1])
+        self.assertEqual(buckets.labels, ["01.03", "08.03", "15.03"])
+
+    def test_range_over_years(self):
+        # The old grouping mixed up the same day of different years
+        buckets = DayBuckets(datetime(2019, 12, 30), datetime(2021, 1, 2), 7)
+        self.assertEqual(buckets.labels[:2], ["30.12.2019", "06.01.2020"])
+        self.assertEqual(len(buckets), len(set(buckets.labels)))
+        times = to_datetime64([datetime(2020, 1, 1), datetime(2021, 1, 1)])
+        self.assertEqual(buckets.assign(times).tolist(), [0, len(buckets) - 1])
+
+    def test_to_datetime64(self):
+        dates = [datetime(2020, 3, 1, 12, 30, 15, 999999), datetime(1969, 12, 31, 23, 59, 59, 500000)]
+        self.assertEqual(to_datetime64(dates).tolist(), [datetime(2020, 3, 1, 12, 30, 15), datetime(1969, 12, 31, 23, 59, 59)])
+        np.testing.assert_array_equal(to_datetime64(iter(dates), 2), to_datetime64(dates))
+        with self.assertRaises(ValueError):
+            DayBuckets(datetime(2020, 3, 2), datetime(2020, 3, 1), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
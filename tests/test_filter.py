@@ -0,0 +1,138 @@
+import random
+import shutil
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import helper
+from benchmarks.bench_full_scan import make_config, make_scan_dir
+from benchmarks.fake_twitter import make_auth_dir
+from crawler import Crawler, compile_filter, push_down_filters
+
+UNTIL = datetime(2020, 3, 1, 15, 30)
+
+
+def old_check_tweet(filter_config, tweet):
+    """ Crawler.check_tweet before compile_filter, reads the config for every tweet """
+    if filter_config["until"]:
+        if tweet.created_at < filter_config["until"]:
+            return -1
+    if filter_config["not_reply"]:
+        if helper.is_reply(tweet):
+            return 0
+    if filter_config["not_retweet"]:
+        if helper.is_retweet(tweet):
+            return 0
+    return 1
+
+
+def old_get_from_iterator(filter_config, iterator, num_results_max):
+    """ Crawler._get_from_iterator before compile_filter, without the rate limit output """
+    return_code = 0
+    res_tweets = []
+    for tweet in iterator:
+        if old_check_tweet(filter_config, tweet) == 1:
+            res_tweets.append(tweet)
+            if len(res_tweets) == num_results_max:
+                return_code = 1
+                break
+        elif old_check_tweet(filter_config, tweet) == -1:
+            return_code = -1
+            break
+    return res_tweets, return_code
+
+
+def old_filter_page(filter_config, page, max_results):
+    """ Crawler._filter_page before compile_filter """
+    res_tweets = []
+    for tweet in page:
+        code = old_check_tweet(filter_config, tweet)
+        if code == -1:
+            return res_tweets, True
+        if code == 1:
+            res_tweets.append(tweet)
+            if len(res_tweets) == max_results:
+                return res_tweets, True
+    return res_tweets, False
+
+
+def make_timeline(rng, length):
+    """ Tweets newest first around UNTIL, some replies and retweets """
+    tweets = []
+    created_at = UNTIL + timedelta(hours=rng.randint(0, 48))
+    for tweet_id in range(length, 0, -1):
+        tweet = SimpleNamespace(id=tweet_id, created_at=created_at,
+                                in_reply_to_status_id=tweet_id + 1 if rng.random() < 0.3 else None)
+        if rng.random() < 0.3:
+            tweet.retweeted_status = SimpleNamespace(id=tweet_id + 10**6)
+        tweets.append(tweet)
+        created_at -= timedelta(minutes=rng.randint(0, 180))
+    return tweets
+
+
+def make_filter_config(rng):
+    return {"until": rng.choice([None, UNTIL]), "not_reply": rng.random() < 0.5, "not_retweet": rng.random() < 0.5}
+
+
+def fake_search(query, tweets):
+    """ What twitter returns for the operators of push_down_filters, since: only knows days """
+    for operator in query.split():
+        if operator == "-filter:retweets":
+            tweets = [tweet for tweet in tweets if not helper.is_retweet(tweet)]
+        elif operator == "-filter:replies":
+            tweets = [tweet for tweet in tweets if not helper.is_reply(tweet)]
+        elif operator.startswith("since:"):
+            since = datetime.strptime(operator[len("since:"):], "%Y-%m-%d")
+            tweets = [tweet for tweet in tweets if tweet.created_at >= since]
+    return tweets
+
+
+class TestFilter(unittest.TestCase):
+    def setUp(self):
+        self.scan_path = make_scan_dir(1)
+        self.auth_path = make_auth_dir()
+        self.crawler = Crawler(make_config(self.auth_path, self.scan_path, 1, 100, 1, 1))
+        self.rng = random.Random(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.scan_path)
+        shutil.rmtree(self.auth_path)
+
+    def use_filter(self, filter_config):
+        self.crawler.config["search"]["filter"] = filter_config
+        self.crawler._check = compile_filter(filter_config)
+
+    def test_same_codes_as_check_tweet(self):
+        for _ in range(50):
+            filter_config = make_filter_config(self.rng)
+            check = compile_filter(filter_config)
+            for tweet in make_timeline(self.rng, 40):
+                self.assertEqual(check(tweet), old_check_tweet(filter_config, tweet))
+
+    def test_same_results_as_the_old_loops(self):
+        for _ in range(50):
+            filter_config = make_filter_config(self.rng)
+            self.use_filter(filter_config)
+            tweets = make_timeline(self.rng, 60)
+            max_results = self.rng.randint(1, 40)
+            self.crawler.config["search"]["num_results"] = max_results
+            self.assertEqual(self.crawler._get_from_iterator(iter(tweets)),
+                             old_get_from_iterator(filter_config, iter(tweets), max_results))
+            self.assertEqual(self.crawler._filter_page(tweets, max_results), old_filter_page(filter_config, tweets, max_results))
+
+    def test_pushdown_keeps_the_same_tweets(self):
+        # The search with the operators and the filter after it finds what the filter alone finds
+        for _ in range(50):
+            filter_config = make_filter_config(self.rng)
+            self.use_filter(filter_config)
+            tweets = make_timeline(self.rng, 60)
+            self.crawler.config["search"]["num_results"] = self.rng.randint(1, 40)
+            pushed = push_down_filters(["corona", "covid"], filter_config)
+            self.assertTrue(pushed.startswith("corona covid"))
+            found, _ = self.crawler._get_from_iterator(iter(fake_search(pushed, tweets)))
+            self.assertEqual(found, self.crawler._get_from_iterator(iter(tweets))[0])
+        self.assertEqual(push_down_filters("", {"not_reply": True}), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
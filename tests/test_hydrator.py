@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from hydrator import Hydrator
+
+
+class FakeApi:
+    """ statuses_lookup of tweets that exist unless their id is in deleted, records the looked up ids """
+
+    def __init__(self, deleted=()):
+        self.deleted = set(deleted)
+        self.looked_up = []
+        self.last_response = SimpleNamespace(url="", headers={})
+
+    def statuses_lookup(self, tweet_ids, tweet_mode=None):
+        self.looked_up.extend(tweet_ids)
+        return [SimpleNamespace(id_str=tweet_id) for tweet_id in tweet_ids if tweet_id not in self.deleted]
+
+
+class TestHydrator(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "checkpoint")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_restart_skips_done_and_deleted(self):
+        api = FakeApi(deleted=["3"])
+        hydrator = Hydrator(api, self.path, workers=1)
+        hydrated = [sorted(statuses) for statuses, deleted in hydrator.hydrate(["1", "2", "3", "2"])]
+        self.assertEqual(hydrated, [["1", "2"]])
+
+        api = FakeApi()
+        restarted = Hydrator(api, self.path, workers=1)
+        self.assertEqual(restarted.pending(["1", "3", "4"]), ["4"])
+        self.assertEqual(restarted.add_done([4, "4", "1"]), 1)
+        self.assertEqual(list(restarted.hydrate(["1", "3", "4"])), [])
+        self.assertEqual(api.looked_up, [])
+
+    def test_torn_last_line(self):
+        hydrator = Hydrator(FakeApi(), self.path)
+        hydrator.add_done(["1"])
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"found": ["2"], "deleted": []})[:10])
+
+        reopened = Hydrator(FakeApi(), self.path)
+        self.assertEqual(reopened.pending(["1", "2"]), ["2"])
+        # The next record is not lost in the torn line
+        reopened.add_done(["2"])
+        self.assertEqual(Hydrator(FakeApi(), self.path).pending(["1", "2"]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from partial_timelines import PartialTimelines, PARTIAL, COMPLETE
+
+
+def make_tweets(ids):
+    return [SimpleNamespace(_json={"id": tweet_id, "text": f"Tweet {tweet_id}"}) for tweet_id in ids]
+
+
+class TestPartialTimelines(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "timelines")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_save_and_load(self):
+        timelines = PartialTimelines(self.path)
+        timelines.save_page("1", make_tweets([30, 20]), 19, 3)
+        timelines.save_page("1", make_tweets([10]), 9, 5, COMPLETE)
+        timelines.save_page("2", make_tweets([7]), 6, 1)
+
+        reopened = PartialTimelines(self.path)
+        self.assertEqual([tweet["id"] for tweet in reopened.load("1")], [30, 20, 10])
+        self.assertEqual(reopened.get("1")["kept"], 3)
+        self.assertEqual(reopened.state("2"), PARTIAL)
+        self.assertEqual(reopened.users(), ["1"])
+        self.assertEqual(reopened.sizes(), {reopened.file_name("1"): os.path.getsize(reopened.file_name("1"))})
+
+    def write_unrecorded_page(self, user_id):
+        """ Like a crawler inside save_page: tweets appended, the record not yet complete """
+        with open(os.path.join(self.path, user_id), "a") as f:
+            f.write(json.dumps({"id": 5, "text": "Tweet 5"}) + "\n")
+        with open(os.path.join(self.path, "states"), "a") as f:
+            f.write(json.dumps({"user_id": user_id, "state": COMPLETE})[:20])
+
+    def contents(self):
+        contents = {}
+        for name in os.listdir(self.path):
+            with open(os.path.join(self.path, name), "rb") as f:
+                contents[name] = f.read()
+        return contents
+
+    def test_read_only_open_changes_no_file(self):
+        timelines = PartialTimelines(self.path)
+        timelines.save_page("1", make_tweets([30, 20]), 19, 3)
+        timelines.save_page("2", make_tweets([10]), 9, 1, COMPLETE)
+        self.write_unrecorded_page("1")
+        # A record larger than its file, e.g. the file was replaced
+        with open(timelines.file_name("2"), "w") as f:
+            f.write("{")
+        contents = self.contents()
+
+        reader = PartialTimelines(self.path, repair=False)
+        self.assertEqual([tweet["id"] for tweet in reader.load("1")], [30, 20])
+        self.assertIsNone(reader.get("2"))
+        self.assertEqual(reader.sizes(), {})
+        self.assertEqual(self.contents(), contents)
+        with self.assertRaises(ValueError):
+            reader.save_page("1", make_tweets([4]), 3, 5)
+        self.assertEqual(PartialTimelines(os.path.join(self.dir, "missing"), repair=False).users(), [])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "missing")))
+
+    def test_repair_on_open(self):
+        timelines = PartialTimelines(self.path)
+        timelines.save_page("1", make_tweets([30, 20]), 19, 3)
+        size = os.path.getsize(timelines.file_name("1"))
+        self.write_unrecorded_page("1")
+
+        repaired = PartialTimelines(self.path)
+        self.assertEqual(os.path.getsize(repaired.file_name("1")), size)
+        repaired.save_page("1", make_tweets([10]), 9, 5, COMPLETE)
+        self.assertEqual([tweet["id"] for tweet in PartialTimelines(self.path).load("1")], [30, 20, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import tweepy
+
+import rate_limit
+from rate_limit import RateLimitScheduler, RateLimitWindow, RETRY_BACKOFF, limited
+
+
+class FakeClock:
+    """ time() and sleep() of the rate_limit module, sleeping only moves the clock """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def error_response(status_code, reset=None):
+    headers = {} if reset is None else {"x-rate-limit-reset": str(reset)}
+    return SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FakeApi:
+    """ user_timeline answers with the errors given, then with the page """
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+        self.last_response = None
+
+    def user_timeline(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            response = self.errors.pop(0)
+            raise tweepy.TweepError(f"status code = {response.status_code}", response)
+        self.last_response = SimpleNamespace(url="https://api.twitter.com/1.1/statuses/user_timeline.json",
+                                             headers={})
+        return ["page"]
+
+
+class RateLimitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(rate_limit, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestRateLimitWindow(RateLimitTestCase):
+    def test_acquire_waits_for_the_next_window(self):
+        window = RateLimitWindow(2, window=60)
+        self.assertEqual(window.acquire(), 0)
+        self.assertEqual(window.acquire(), 0)
+        self.assertEqual(window.acquire(), 60)
+        self.assertEqual(self.clock.now, 1060)
+        self.assertEqual(window.remaining, 1)
+        self.assertEqual(window.reset, 1120)
+
+    def test_update_from_headers(self):
+        window = RateLimitWindow(10, window=60)
+        # Requests of other threads the server has not seen yet are not given back
+        window.acquire()
+        window.update({"x-rate-limit-remaining": "9", "x-rate-limit-reset": "1060"})
+        self.assertEqual(window.remaining, 9)
+        window.update({"x-rate-limit-remaining": "3", "x-rate-limit-reset": "1060", "x-rate-limit-limit": "15"})
+        self.assertEqual((window.remaining, window.limit), (3, 15))
+        # A new window of the server
+        window.update({"x-rate-limit-remaining": "14", "x-rate-limit-reset": "1120"})
+        self.assertEqual((window.remaining, window.reset), (14, 1120))
+        window.update({})
+        self.assertEqual(window.remaining, 14)
+
+    def test_exhaust(self):
+        window = RateLimitWindow(10, window=60)
+        window.exhaust(reset=1030)
+        self.assertEqual((window.remaining, window.reset), (0, 1030))
+        # Without a reset in the future the window backs off, doubled every time, at most a window
+        window.exhaust(reset=900)
+        self.assertEqual(window.reset, 1000 + RETRY_BACKOFF)
+        backoff = RETRY_BACKOFF
+        for _ in range(5):
+            window.exhaust()
+            backoff = min(backoff * 2, 60)
+            self.assertEqual(window.reset, 1000 + backoff)
+        self.assertEqual(window.backoff, 60)
+        window.update({})
+        self.assertEqual(window.backoff, RETRY_BACKOFF)
+
+
+class TestLimited(RateLimitTestCase):
+    def test_waits_after_429(self):
+        scheduler = RateLimitScheduler()
+        api = FakeApi([error_response(429, reset=1300), error_response(429)])
+        self.assertEqual(limited(api, scheduler, "user_timeline")(id="1"), ["page"])
+        self.assertEqual(api.calls, 3)
+        # Until the reset of the first 429, then the backoff of the second one without a reset
+        self.assertEqual(self.clock.slept, [300, RETRY_BACKOFF])
+        self.assertEqual(scheduler.requests["user_timeline"], 1)
+        self.assertEqual(scheduler.idle_time, 300 + RETRY_BACKOFF)
+
+    def test_other_errors_are_raised(self):
+        scheduler = RateLimitScheduler()
+        api = FakeApi([error_response(401)])
+        with self.assertRaises(tweepy.TweepError):
+            limited(api, scheduler, "user_timeline")(id="1")
+        self.assertEqual(api.calls, 1)
+        self.assertEqual(self.clock.slept, [])
+
+
+class TestRateLimitScheduler(RateLimitTestCase):
+    def test_run_skips_exhausted_endpoints(self):
+        scheduler = RateLimitScheduler()
+        scheduler.windows["search"].exhaust(reset=1100)
+        order = []
+        scheduler.submit("search", order.append, "search")
+        scheduler.submit("user_timeline", order.append, "user_timeline")
+        results = [job.args[0] for job, result in scheduler.run(1)]
+        # The search waits for its reset, the timeline does not wait for the search
+        self.assertEqual(order, ["user_timeline", "search"])
+        self.assertEqual(results, order)
+        self.assertEqual(self.clock.slept, [100])
+        self.assertEqual(scheduler.endpoint_idle_time["search"], 100)
+
+    def test_run_reraises(self):
+        scheduler = RateLimitScheduler()
+
+        def fail():
+            raise ValueError("job failed")
+
+        scheduler.submit("search", fail)
+        with self.assertRaises(ValueError):
+            list(scheduler.run(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from results_store import ResultsStore, STORE_FILENAME
+
+
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, STORE_FILENAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_labels(self):
+        store = ResultsStore(self.path)
+        store.put("1", "Vader", ["pos", "neg", "neut"])
+        store.put_tweet_labels("Vader", [10, 11], ["neg", "pos"])
+        store.close()
+
+        reopened = ResultsStore(self.path)
+        self.assertEqual(reopened.get("1", "Vader"), ["pos", "neg", "neut"])
+        self.assertIsNone(reopened.get("1", "TextBlob"))
+        self.assertIn(("1", "Vader"), reopened)
+        self.assertEqual(reopened.users("Vader"), ["1"])
+        self.assertEqual(reopened.get_tweet_labels("Vader", [10, 11, 12]), {10: "neg", 11: "pos"})
+        self.assertEqual(reopened.get_tweet_labels("TextBlob", [10]), {})
+
+    def test_set_fingerprint_invalidates_one_model(self):
+        store = ResultsStore(self.path)
+        for model in ("Vader", "TextBlob"):
+            self.assertFalse(store.set_fingerprint(model, "a"))
+            store.put("1", model, ["pos"])
+            store.put_tweet_labels(model, [10], ["pos"])
+        self.assertFalse(store.set_fingerprint("Vader", "a"))
+        self.assertEqual(store.get("1", "Vader"), ["pos"])
+
+        self.assertTrue(store.set_fingerprint("Vader", "b"))
+        self.assertIsNone(store.get("1", "Vader"))
+        self.assertEqual(store.get_tweet_labels("Vader", [10]), {})
+        self.assertFalse(store.uses_legacy("Vader"))
+        # The other model keeps its labels
+        self.assertEqual(store.get("1", "TextBlob"), ["pos"])
+        self.assertEqual(store.get_tweet_labels("TextBlob", [10]), {10: "pos"})
+        self.assertTrue(store.uses_legacy("TextBlob"))
+        store.close()
+        self.assertFalse(ResultsStore(self.path).set_fingerprint("Vader", "b"))
+
+    def test_store_without_fingerprints(self):
+        # Tables of an older version, its labels are kept by the first fingerprint
+        connection = sqlite3.connect(self.path)
+        with connection:
+            connection.execute("CREATE TABLE models (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+            connection.execute("INSERT INTO models (name) VALUES ('Vader')")
+        connection.close()
+        store = ResultsStore(self.path)
+        store.put("1", "Vader", ["neg"])
+        self.assertTrue(store.uses_legacy("Vader"))
+        self.assertFalse(store.set_fingerprint("Vader", "a"))
+        self.assertEqual(store.get("1", "Vader"), ["neg"])
+
+    def test_import_json_dir(self):
+        for user_id, labels in (("1", {"Vader": ["pos"], "TextBlob": ["neg"]}), ("2", {"Vader": ["neut", "neg"]})):
+            with open(os.path.join(self.dir, user_id + "_sentiment.json"), "w") as f:
+                json.dump(labels, f)
+        store = ResultsStore(self.path)
+        self.assertEqual(store.import_json_dir(self.dir, batch_size=1), 2)
+        self.assertEqual(sorted(store.models()), ["TextBlob", "Vader"])
+        self.assertEqual(store.get("2", "Vader"), ["neut", "neg"])
+        self.assertEqual(store.get("1", "TextBlob"), ["neg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import tweepy
+
+import crawler
+from benchmarks.bench_full_scan import make_config, make_scan_dir
+from benchmarks.fake_twitter import FakeTwitter, FakeTwitterServer, make_auth_dir, redirect_twitter
+from crawler import Crawler, ReducedUser
+from scan_journal import ScanJournal, PLANNED, IN_FLIGHT, DONE, FAILED
+from user_registry import UserRegistry
+
+
+class TestScanJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_replay(self):
+        journal = ScanJournal(self.path)
+        journal.begin([[ReducedUser("1"), ReducedUser("2")], [ReducedUser("3")]])
+        journal.page("1", {"max_id": 10, "seen": 20, "kept": 15, "newest_id": 30, "size": 100, "end": False})
+        journal.page("2", {"max_id": 5, "seen": 20, "kept": 20, "newest_id": 25, "size": 200, "end": True})
+        journal.done("2")
+
+        replayed = ScanJournal(self.path)
+        self.assertFalse(replayed.finished)
+        self.assertEqual(replayed.states, {"1": IN_FLIGHT, "2": DONE, "3": PLANNED})
+        self.assertEqual(replayed.locations, {"1": 0, "2": 0, "3": 1})
+        self.assertEqual(replayed.get_progress("1")["max_id"], 10)
+        self.assertIsNone(replayed.get_progress("2"))
+        self.assertEqual(replayed.pending(), {0: ["1"], 1: ["3"]})
+
+        replayed.finish()
+        self.assertTrue(ScanJournal(self.path).finished)
+
+    def test_begin_starts_a_new_journal(self):
+        journal = ScanJournal(self.path)
+        journal.begin([[ReducedUser("1")]])
+        journal.done("1")
+        journal.finish()
+        journal.begin([[ReducedUser("2")]])
+
+        replayed = ScanJournal(self.path)
+        self.assertEqual(replayed.states, {"2": PLANNED})
+        self.assertFalse(replayed.finished)
+
+    def test_torn_last_line(self):
+        journal = ScanJournal(self.path)
+        journal.begin([[ReducedUser("1")]])
+        journal.page("1", {"max_id": 10, "seen": 20, "kept": 15, "newest_id": 30, "size": 100, "end": False})
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"event": "page", "user_id": "1", "progress": {"max_id": 5}})[:25])
+        size = os.path.getsize(self.path)
+        # The report of a running scan leaves the file as it is
+        self.assertEqual(ScanJournal(self.path, repair=False).get_progress("1")["max_id"], 10)
+        self.assertEqual(os.path.getsize(self.path), size)
+
+        replayed = ScanJournal(self.path)
+        self.assertEqual(replayed.states, {"1": IN_FLIGHT})
+        self.assertEqual(replayed.get_progress("1")["max_id"], 10)
+        # The next record is not lost in the torn line
+        replayed.done("1")
+        self.assertEqual(ScanJournal(self.path).states, {"1": DONE})
+
+
+    def test_failed_user_is_not_pending(self):
+        journal = ScanJournal(self.path)
+        journal.begin([[ReducedUser("1"), ReducedUser("2")]])
+        journal.page("1", {"max_id": 10, "seen": 20, "kept": 15, "newest_id": 30, "size": 100, "end": False})
+        journal.failed("1", "Not authorized.")
+
+        replayed = ScanJournal(self.path)
+        self.assertEqual(replayed.states, {"1": FAILED, "2": PLANNED})
+        self.assertIsNone(replayed.get_progress("1"))
+        self.assertEqual(replayed.pending(), {0: ["2"]})
+        self.assertIn("1 failed", replayed.report())
+
+
+class Crash(Exception):
+    pass
+
+
+class TestResumableTimeline(unittest.TestCase):
+    """ get_timeline_resumable continued after a crash at every step saves every kept tweet once """
+
+    def setUp(self):
+        self.scan_path = make_scan_dir(1)
+        self.auth_path = make_auth_dir()
+        config = make_config(self.auth_path, self.scan_path, 1, 100, 1, 1)
+        config["user_auth"] = True
+        self.crawler = Crawler(config)
+        self.crawler.journal = ScanJournal(self.scan_path + "journal")
+        api = tweepy.API()
+        self.timeline = [tweepy.models.Status.parse(api, tweet) for tweet in FakeTwitter(latency=0).timeline("1", 60)]
+        self.user = ReducedUser("1")
+        self.path = self.scan_path + "tweets/0/1"
+        self.crawler.journal.begin([[self.user]])
+        # Every reply is filtered out, the rest is kept
+        self.expected = [tweet.id for tweet in self.timeline if not tweet.in_reply_to_status_id]
+
+    def tearDown(self):
+        shutil.rmtree(self.scan_path)
+        shutil.rmtree(self.auth_path)
+
+    def pages(self, crash_after=None):
+        """ Replaces Crawler._timeline_pages, pages of 20 older than max_id, raises Crash after crash_after pages """
+        def timeline_pages(crawler_self, user, max_id=None):
+            tweets = [tweet for tweet in self.timeline if max_id is None or tweet.id <= max_id]
+            for number, start in enumerate(range(0, len(tweets), 20)):
+                if number == crash_after:
+                    raise Crash()
+                yield tweets[start:start + 20]
+        return mock.patch.object(Crawler, "_timeline_pages", timeline_pages)
+
+    def resume(self):
+        """ Continues the timeline with a journal replayed from the file, like the next scan """
+        self.crawler.journal = ScanJournal(self.scan_path + "journal")
+        with self.pages():
+            newest_id = self.crawler.get_timeline_resumable(0, self.user)
+        self.assertEqual(self.crawler.journal.states["1"], DONE)
+        self.assertEqual(newest_id, self.timeline[0].id)
+        return newest_id
+
+    def saved_ids(self):
+        with open(self.path) as f:
+            return [json.loads(line)["id"] for line in f]
+
+    def test_without_crash(self):
+        self.resume()
+        self.assertEqual(self.saved_ids(), self.expected)
+        self.assertFalse(os.path.exists(self.path + ".part"))
+
+    def test_crash_between_pages(self):
+        with self.pages(crash_after=2), self.assertRaises(Crash):
+            self.crawler.get_timeline_resumable(0, self.user)
+        self.assertEqual(ScanJournal(self.scan_path + "journal").states["1"], IN_FLIGHT)
+        self.resume()
+        self.assertEqual(self.saved_ids(), self.expected)
+
+    def test_crash_before_journal_page(self):
+        # The tweets of the second page are in the .part file, but not in the journal
+        page = self.crawler.journal.page
+        calls = []
+
+        def page_then_crash(user_id, progress):
+            calls.append(user_id)
+            if len(calls) == 2:
+                raise Crash()
+            page(user_id, progress)
+
+        with self.pages(), mock.patch.object(self.crawler.journal, "page", page_then_crash):
+            with self.assertRaises(Crash):
+                self.crawler.get_timeline_resumable(0, self.user)
+        self.assertGreater(os.path.getsize(self.path + ".part"), self.crawler.journal.get_progress("1")["size"])
+        self.resume()
+        self.assertEqual(self.saved_ids(), self.expected)
+
+    def test_crash_before_commit(self):
+        with self.pages(), mock.patch.object(crawler.os, "replace", side_effect=Crash()):
+            with self.assertRaises(Crash):
+                self.crawler.get_timeline_resumable(0, self.user)
+        self.assertFalse(os.path.exists(self.path))
+        self.resume()
+        self.assertEqual(self.saved_ids(), self.expected)
+
+    def test_crash_after_commit_before_done(self):
+        with self.pages(), mock.patch.object(self.crawler.journal, "done", side_effect=Crash()):
+            with self.assertRaises(Crash):
+                self.crawler.get_timeline_resumable(0, self.user)
+        with open(self.path, "rb") as f:
+            saved = f.read()
+        self.assertFalse(os.path.exists(self.path + ".part"))
+        self.resume()
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), saved)
+        self.assertEqual(self.saved_ids(), self.expected)
+
+
+class TestFailingTimeline(unittest.TestCase):
+    """ A protected account fails in the journal, the scan and its resume go on with the other users """
+
+    def setUp(self):
+        self.scan_path = make_scan_dir(1)
+        self.auth_path = make_auth_dir()
+        config = make_config(self.auth_path, self.scan_path, 3, 100, 2, 1)
+        self.twitter = FakeTwitter(latency=0, protected_users=["2"])
+        self.server = FakeTwitterServer(self.twitter).start()
+        self.crawler = Crawler(config)
+        self.crawler.journal = ScanJournal(self.scan_path + "journal")
+        self.crawler.unique_user_ids = UserRegistry()
+        self.users = [ReducedUser(user_id) for user_id in ("1", "2", "3")]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.scan_path)
+        shutil.rmtree(self.auth_path)
+
+    def test_scan_goes_on(self):
+        self.crawler.journal.begin([self.users])
+        with redirect_twitter(self.server.url):
+            self.crawler._scan_timelines({0: self.users})
+        journal = ScanJournal(self.scan_path + "journal")
+        self.assertEqual(journal.states, {"1": DONE, "2": FAILED, "3": DONE})
+        self.assertEqual(sorted(os.listdir(self.scan_path + "tweets/0")), ["1", "3"])
+
+        # A resume has nothing left to fetch
+        requests = dict(self.twitter.requests)
+        self.crawler.journal = journal
+        with redirect_twitter(self.server.url):
+            self.crawler.resume_scan()
+        self.assertEqual(self.twitter.requests, requests)
+        self.assertTrue(ScanJournal(self.scan_path + "journal").finished)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import contextlib
+import io
+import statistics
+import unittest
+
+import numpy as np
+
+from sentiment_matrix import SentimentMatrix
+
+
+def old_user_dict(counts):
+    """ Per user dict like the Analyzer built it from the labels of every bucket """
+    user_dict = {}
+    for label, (neg, neut, pos) in counts.items():
+        if neg + neut + pos == 0:
+            user_dict[label] = {"extremely_pos_percentage": -1, "extremely_neg_percentage": -1,
+                                "extremely_pos_amount": -1, "extremely_neg_amount": -1, "neut_amount": -1}
+        else:
+            user_dict[label] = {"neut_amount": neut, "extremely_pos_percentage": pos / (neg + neut + pos) * 100,
+                                "extremely_neg_percentage": neg / (neg + neut + pos) * 100,
+                                "extremely_pos_amount": pos, "extremely_neg_amount": neg}
+    return user_dict
+
+
+def old_summary(user_analysations):
+    """ Analyzer.summarize_user_sentiments before the matrix """
+    summary = {group_id: {} for group_id in user_analysations[0]}
+    for group_id in user_analysations[0]:
+        for key in ("extremely_pos_percentage", "extremely_neg_percentage"):
+            try:
+                summary[group_id][key] = statistics.mean(user_dict[group_id][key] for user_dict in user_analysations
+                                                         if not user_dict[group_id][key] == -1)
+            except statistics.StatisticsError:
+                summary[group_id][key] = 0
+    return summary
+
+
+class TestSentimentMatrix(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.labels = ["2020-03-01", "2020-03-08", "2020-03-15", "2020-03-22"]
+        counts = rng.integers(0, 4, size=(20, len(self.labels), 3))
+        # Buckets without tweets of some users, and one without any user
+        counts[rng.random((20, len(self.labels))) < 0.3] = 0
+        counts[:, 2] = 0
+        self.counts = counts
+        self.matrix = SentimentMatrix(self.labels, [str(i) for i in range(20)], counts)
+        self.user_analysations = [old_user_dict(dict(zip(self.labels, user_counts.tolist()))) for user_counts in counts]
+
+    def summary(self, weighting="user"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.matrix.summary(weighting)
+
+    def test_summary_matches_the_old_summary(self):
+        summary = self.summary()
+        expected = old_summary(self.user_analysations)
+        self.assertEqual(list(summary), self.labels)
+        for label in self.labels:
+            for key in ("extremely_pos_percentage", "extremely_neg_percentage"):
+                self.assertAlmostEqual(summary[label][key], expected[label][key])
+        self.assertEqual(summary["2020-03-15"], {"extremely_pos_percentage": 0, "extremely_neg_percentage": 0})
+
+    def test_user_dicts(self):
+        self.assertEqual(len(self.matrix), 20)
+        for user_dict, expected in zip(self.matrix, self.user_analysations):
+            self.assertEqual(user_dict.keys(), expected.keys())
+            for label in self.labels:
+                for key, value in expected[label].items():
+                    self.assertAlmostEqual(user_dict[label][key], value)
+        restored = SentimentMatrix.from_analysations(self.user_analysations)
+        np.testing.assert_array_equal(restored.counts, self.counts)
+
+    def test_tweet_weighting(self):
+        summary = self.summary("tweet")
+        totals = self.counts.sum(axis=(0, 2))
+        for i, label in enumerate(self.labels):
+            pos = self.counts[:, i, 2].sum() / totals[i] * 100 if totals[i] else 0
+            self.assertAlmostEqual(summary[label]["extremely_pos_percentage"], pos)
+
+    def test_concatenate(self):
+        halves = [SentimentMatrix(self.labels, self.matrix.user_ids[:10], self.counts[:10]),
+                  SentimentMatrix(self.labels, self.matrix.user_ids[10:], self.counts[10:])]
+        joined = SentimentMatrix.concatenate(halves)
+        self.assertEqual(joined.user_ids, self.matrix.user_ids)
+        np.testing.assert_array_equal(joined.counts, self.counts)
+        with self.assertRaises(ValueError):
+            SentimentMatrix.concatenate([self.matrix, SentimentMatrix(self.labels[:1], ["0"], [[[1, 0, 0]]])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tweet_store import TweetStore, INDEX_FILENAME, convert_directory, store_key
+
+
+def make_tweets(user_id, ids):
+    return [{"id": tweet_id, "text": f"Tweet {tweet_id}", "user": {"id_str": user_id}} for tweet_id in ids]
+
+
+class TestTweetStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.dir, "store")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_append_and_read(self):
+        store = TweetStore(self.store_path)
+        store.append("0/1", make_tweets("1", [30, 20]))
+        store.append("0/1", make_tweets("1", [50, 40]))
+        store.append("1/2", make_tweets("2", [7]))
+
+        reopened = TweetStore(self.store_path)
+        self.assertEqual([tweet["id"] for tweet in reopened.read("0/1")], [30, 20, 50, 40])
+        self.assertEqual(reopened.read("0/1")[0]["user"], {"id_str": "1"})
+        self.assertEqual(reopened.keys(0), ["0/1"])
+        self.assertEqual(sorted(reopened.keys()), ["0/1", "1/2"])
+        self.assertEqual(reopened.find_tweet(40)["text"], "Tweet 40")
+        self.assertIsNone(reopened.find_tweet(41, "0/1"))
+
+    def test_newest_id(self):
+        store = TweetStore(self.store_path)
+        store.append("0/1", [])
+        self.assertIn("0/1", store)
+        self.assertIsNone(store.newest_id("0/1"))
+        store.append("0/1", make_tweets("1", [30, 20]))
+        store.append("0/1", make_tweets("1", [50, 40]))
+        self.assertEqual(store.newest_id("0/1"), 50)
+        self.assertIsNone(store.newest_id("0/2"))
+
+    def test_empty_append_to_existing_key(self):
+        store = TweetStore(self.store_path)
+        store.append("0/1", make_tweets("1", [30]))
+        store.append("0/1", [])
+        self.assertEqual(len(store.index["0/1"]), 1)
+        with open(os.path.join(self.store_path, INDEX_FILENAME)) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_torn_index_line(self):
+        store = TweetStore(self.store_path)
+        store.append("0/1", make_tweets("1", [30, 20]))
+        store.append("0/2", make_tweets("2", [10]))
+        store.close()
+        index_path = os.path.join(self.store_path, INDEX_FILENAME)
+        with open(index_path) as f:
+            lines = f.readlines()
+        with open(index_path, "w") as f:
+            f.write(lines[0] + lines[1][:len(lines[1]) // 2])
+
+        # A reader next to the crawl leaves the index as it is
+        reader = TweetStore(self.store_path, repair=False)
+        self.assertEqual([tweet["id"] for tweet in reader.read("0/1")], [30, 20])
+        self.assertNotIn("0/2", reader)
+        self.assertEqual(os.path.getsize(index_path), len(lines[0]) + len(lines[1]) // 2)
+        with self.assertRaises(ValueError):
+            reader.append("0/2", make_tweets("2", [10]))
+
+        reopened = TweetStore(self.store_path)
+        self.assertEqual([tweet["id"] for tweet in reopened.read("0/1")], [30, 20])
+        self.assertNotIn("0/2", reopened)
+        # The torn block is written again
+        reopened.append("0/2", make_tweets("2", [10]))
+        self.assertEqual([tweet["id"] for tweet in TweetStore(self.store_path).read("0/2")], [10])
+
+    def test_block_missing_in_segment(self):
+        store = TweetStore(self.store_path)
+        store.append("0/1", make_tweets("1", [30, 20]))
+        store.close()
+        # The index line is there, the block is not completely in the segment
+        with open(os.path.join(self.store_path, INDEX_FILENAME)) as f:
+            line = f.readline()
+        with open(os.path.join(self.store_path, INDEX_FILENAME), "a") as f:
+            key, segment, offset, length, count, min_id, max_id = line.split()
+            f.write(f"0/2 {segment} {int(offset) + int(length)} 100 1 10 10\n")
+        self.assertNotIn("0/2", TweetStore(self.store_path))
+
+    def test_new_segment(self):
+        store = TweetStore(self.store_path, max_segment_size=1)
+        store.append("0/1", make_tweets("1", [30]))
+        store.append("0/2", make_tweets("2", [10]))
+        self.assertEqual([block.segment for key in ("0/1", "0/2") for block in store.index[key]], [0, 1])
+        reopened = TweetStore(self.store_path, max_segment_size=1)
+        self.assertEqual(reopened.segment, 1)
+        self.assertEqual(reopened.read("0/2")[0]["id"], 10)
+
+    def test_convert_directory(self):
+        tweets_dir = os.path.join(self.dir, "tweets")
+        for location, user_id, ids in (("0", "1", [30, 20]), ("1", "2", [10]), ("1", "3", [])):
+            os.makedirs(os.path.join(tweets_dir, location), exist_ok=True)
+            with open(os.path.join(tweets_dir, location, user_id), "w") as f:
+                for tweet in make_tweets(user_id, ids):
+                    f.write(json.dumps(tweet) + "\n")
+        # Not finished timelines of the full scan are left out
+        open(os.path.join(tweets_dir, "0", "4.part"), "w").close()
+
+        store = TweetStore(self.store_path)
+        self.assertEqual(convert_directory(tweets_dir, store), 3)
+        self.assertEqual(sorted(store.keys()), ["0/1", "1/2", "1/3"])
+        self.assertEqual([tweet["id"] for tweet in store.read("0/1")], [30, 20])
+        self.assertEqual(store.read("1/3"), [])
+        # Converted timelines are not added twice
+        self.assertEqual(convert_directory(tweets_dir, store), 0)
+        self.assertEqual(store_key(os.path.join(tweets_dir, "0", "1")), "0/1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from user_registry import UserRegistry
+
+
+class TestUserRegistry(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "registry")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_claim_and_release(self):
+        registry = UserRegistry(self.path)
+        self.assertTrue(registry.claim("1"))
+        # Claimed by another thread right now
+        self.assertFalse(registry.claim("1"))
+        registry.release("1", keep=False)
+        self.assertNotIn("1", registry)
+        self.assertTrue(registry.claim("1"))
+        registry.release("1", keep=True)
+        self.assertIn("1", registry)
+        self.assertFalse(registry.claim(1))
+
+    def test_merge_on_flush(self):
+        registry = UserRegistry(self.path, merge_size=3)
+        registry.update(["5", "1", "9"])
+        # merge_size ids are merged into the file right away
+        self.assertEqual(np.fromfile(self.path, dtype=np.int64).tolist(), [1, 5, 9])
+        registry.update([7, 1, 3])
+        self.assertEqual(len(registry), 5)
+        registry.flush()
+        self.assertEqual(np.fromfile(self.path, dtype=np.int64).tolist(), [1, 3, 5, 7, 9])
+
+        reopened = UserRegistry(self.path)
+        self.assertEqual(len(reopened), 5)
+        self.assertEqual(reopened.contains(["3", "4", "9"]).tolist(), [True, False, True])
+        self.assertEqual([chunk.tolist() for chunk in reopened.chunks(size=2)], [[1, 3], [5, 7], [9]])
+
+    def test_in_memory(self):
+        registry = UserRegistry()
+        registry.update(["2", "1"])
+        registry.flush()
+        other = UserRegistry()
+        other.update([2, 3])
+        self.assertEqual(registry.count_common(other), 1)
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def write_ids(self, name, lines):
+        with open(os.path.join(self.dir, name), "a") as f:
+            f.write(lines)
+        return os.path.join(self.dir, name)
+
+    def test_update_from_files_offsets(self):
+        users_0 = self.write_ids("users_0", "1\n2\n")
+        users_1 = self.write_ids("users_1", "3\n4")
+        registry = UserRegistry(self.path)
+        registry.update_from_files([users_0, users_1])
+        # The last line of users_1 is still being written
+        self.assertEqual(len(registry), 3)
+        self.assertNotIn("4", registry)
+
+        # Appended lines and the rest of the unfinished line are read by the next call
+        self.write_ids("users_0", "5\n")
+        self.write_ids("users_1", "0\n")
+        UserRegistry(self.path).update_from_files([users_0, users_1])
+        self.assertEqual(np.fromfile(self.path, dtype=np.int64).tolist(), [1, 2, 3, 5, 40])
+
+    def test_update_from_files_reads_only_new_lines(self):
+        users_0 = self.write_ids("users_0", "1\n2\n")
+        registry = UserRegistry(self.path)
+        registry.update_from_files([users_0])
+        # Ids read again from the start of the file would show up in the new registry file
+        os.remove(self.path)
+        self.write_ids("users_0", "3\n")
+        registry = UserRegistry(self.path)
+        registry.update_from_files([users_0])
+        self.assertEqual(np.fromfile(self.path, dtype=np.int64).tolist(), [3])
+
+    def test_update_from_files_replaced_by_shorter_file(self):
+        users_0 = self.write_ids("users_0", "1\n2\n3\n")
+        registry = UserRegistry(self.path)
+        registry.update_from_files([users_0])
+        os.remove(users_0)
+        self.write_ids("users_0", "4\n")
+        registry.update_from_files([users_0])
+        self.assertIn("4", registry)
+        self.assertEqual(len(registry), 4)
+
+    def test_update_from_missing_files(self):
+        users_0 = self.write_ids("users_0", "1\n")
+        users_1 = os.path.join(self.dir, "users_1")
+        registry = UserRegistry(self.path)
+        registry.update_from_files([users_0, users_1])
+        self.assertEqual(len(registry), 1)
+        # Created later, e.g. by a new tiling
+        self.write_ids("users_1", "2\n")
+        registry.update_from_files([users_0, users_1])
+        self.assertEqual(len(registry), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
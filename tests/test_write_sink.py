@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import write_sink
+from tweet_store import TweetStore
+from write_sink import WriteBehindSink
+
+
+def make_tweets(ids):
+    return [SimpleNamespace(_json={"id": tweet_id, "user": {"id_str": "1"}}) for tweet_id in ids]
+
+
+class TestWriteBehindSink(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.events = []
+        real_fsync = os.fsync
+
+        def fsync(fd):
+            self.events.append("fsync")
+            real_fsync(fd)
+
+        patcher = mock.patch.object(write_sink.os, "fsync", fsync)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def file_name(self, name):
+        return os.path.join(self.dir, name)
+
+    def saved_ids(self, name):
+        with open(self.file_name(name)) as f:
+            return [json.loads(line)["id"] for line in f]
+
+    def test_order_of_the_writes(self):
+        sink = WriteBehindSink(writers=4, max_pending=8)
+        for start in range(0, 200, 10):
+            for name in ("1", "2", "3"):
+                sink.submit(make_tweets(range(start, start + 10)), self.file_name(name), append=start > 0)
+        sink.close()
+        for name in ("1", "2", "3"):
+            self.assertEqual(self.saved_ids(name), list(range(200)))
+        self.assertEqual((sink.written, sink.batches), (600, 60))
+        # Without append the file is written anew
+        sink = WriteBehindSink()
+        sink.submit(make_tweets([7]), self.file_name("1"))
+        sink.close()
+        self.assertEqual(self.saved_ids("1"), [7])
+
+    def test_batch_durability(self):
+        sink = WriteBehindSink(durability="batch")
+        file_name = self.file_name("1")
+        sink.submit(make_tweets([1, 2]), file_name, then=lambda: self.events.append("then"))
+        sink.flush()
+        self.assertFalse(sink.is_pending(file_name))
+        # The callback runs once the batch is on disk
+        self.assertEqual(self.events, ["fsync", "then"])
+        sink.close()
+
+    def test_interval_durability(self):
+        sink = WriteBehindSink(durability="interval", fsync_interval=3600)
+        for name in ("1", "2"):
+            sink.submit(make_tweets([1]), self.file_name(name), then=lambda: self.events.append("then"))
+        for writer in sink._writers:
+            writer.queue.join()
+        # Written, but neither fsynced nor called back before the interval or a flush
+        self.assertEqual(self.events, [])
+        self.assertFalse(sink.is_pending(self.file_name("1")))
+        sink.flush()
+        self.assertEqual(self.events, ["fsync", "fsync", "then", "then"])
+        self.assertEqual(self.saved_ids("2"), [1])
+        sink.close()
+
+    def test_tweet_store(self):
+        store = TweetStore(self.file_name("store"))
+        sink = WriteBehindSink(store)
+        sink.submit(make_tweets([3, 2]), os.path.join(self.dir, "tweets", "0", "1"))
+        sink.submit(make_tweets([5, 4]), os.path.join(self.dir, "tweets", "0", "1"), append=True)
+        sink.close()
+        self.assertEqual([tweet["id"] for tweet in store.read("0/1")], [3, 2, 5, 4])
+
+    def test_writer_error_reaches_the_caller(self):
+        sink = WriteBehindSink()
+        called = []
+        missing = os.path.join(self.dir, "missing", "1")
+        sink.submit(make_tweets([1]), missing, then=lambda: called.append(missing))
+        with self.assertRaises(FileNotFoundError):
+            sink.flush()
+        self.assertEqual(called, [])
+        self.assertFalse(sink.is_pending(missing))
+
+        # The next submit after a failed write raises it too
+        sink.submit(make_tweets([1]), missing)
+        for writer in sink._writers:
+            writer.queue.join()
+        with self.assertRaises(FileNotFoundError):
+            sink.submit(make_tweets([2]), self.file_name("1"))
+        # The writer thread survived the error
+        sink.submit(make_tweets([2]), self.file_name("1"))
+        sink.close()
+        self.assertEqual(self.saved_ids("1"), [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
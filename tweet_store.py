@@ -0,0 +1,225 @@
+"""
+Append-only segment store for the tweets of the full scan
+Instead of one json file per user (tweets/<location>/<user_id>), the timelines are saved as
+compressed blocks in a few large segment files. An index file keeps for every block:
+key (<location>/<user_id>), segment, offset, length, number of tweets and the range of tweet ids.
+The user object is only saved once per block, not with every tweet.
+
+Convert the old layout with:
+$ python tweet_store.py <full_scan path>/tweets/ <full_scan path>/store/
+"""
+import argparse
+import json
+import os
+import threading
+import zlib
+
+import helper
+
+INDEX_FILENAME = "index"
+SEGMENT_FILENAME = "segment_{:05d}"
+# A new segment is started once the current one is bigger
+MAX_SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+class BlockInfo:
+	""" One line of the index """
+	__slots__ = ("key", "segment", "offset", "length", "count", "min_id", "max_id")
+
+	def __init__(self, key, segment, offset, length, count, min_id, max_id):
+		self.key = key
+		self.segment = segment
+		self.offset = offset
+		self.length = length
+		self.count = count
+		self.min_id = min_id
+		self.max_id = max_id
+
+	def to_line(self):
+		return f"{self.key} {self.segment} {self.offset} {self.length} {self.count} {self.min_id} {self.max_id}\n"
+
+	@classmethod
+	def from_line(cls, line):
+		key, segment, offset, length, count, min_id, max_id = line.split()
+		return cls(key, int(segment), int(offset), int(length), int(count), int(min_id), int(max_id))
+
+
+def store_key(file_name):
+	""" Key of a timeline file in the old layout: tweets/<location>/<user_id> -> <location>/<user_id> """
+	location, user_id = os.path.normpath(file_name).split(os.sep)[-2:]
+	return location + "/" + user_id
+
+
+class TweetStore:
+	""" Segment store, keys are <location>/<user_id>, values the tweet dicts (the tweepy _json)
+	:param repair: False to only read (e.g. loader processes next to a running crawl), the index is not cut
+	"""
+
+	def __init__(self, path, max_segment_size=MAX_SEGMENT_SIZE, repair=True):
+		self.path = path
+		self.max_segment_size = max_segment_size
+		self.repair = repair
+		if repair:
+			os.makedirs(path, exist_ok=True)
+		# key -> list of BlockInfo, in the order they were written
+		self.index = {}
+		self.segment = 0
+		self._files = {}
+		self._lock = threading.Lock()
+		self._load_index()
+
+	def _segment_path(self, segment):
+		return os.path.join(self.path, SEGMENT_FILENAME.format(segment))
+
+	def _load_index(self):
+		""" Reads the index, blocks that are not completely in their segment are ignored
+		and a torn last line is cut off (left in the file without repair)
+		"""
+		while os.path.isfile(self._segment_path(self.segment + 1)):
+			self.segment += 1
+		index_path = os.path.join(self.path, INDEX_FILENAME)
+		if not os.path.isfile(index_path):
+			return
+		sizes = {}
+		for line in helper.read_complete_lines(index_path, self.repair):
+			try:
+				block = BlockInfo.from_line(line)
+			except ValueError:
+				continue
+			if block.segment not in sizes:
+				sizes[block.segment] = os.path.getsize(self._segment_path(block.segment))
+			if block.offset + block.length > sizes[block.segment]:
+				continue
+			self.index.setdefault(block.key, []).append(block)
+
+	def _open(self, segment):
+		""" Cached read handle of a segment, only call with the lock held """
+		if segment not in self._files:
+			self._files[segment] = open(self._segment_path(segment), "rb")
+		return self._files[segment]
+
+	def close(self):
+		with self._lock:
+			for f in self._files.values():
+				f.close()
+			self._files = {}
+
+	def __contains__(self, key):
+		return key in self.index
+
+	def keys(self, location=None):
+		""" All keys, only the ones of location if given """
+		if location is None:
+			return list(self.index)
+		prefix = str(location) + "/"
+		return [key for key in self.index if key.startswith(prefix)]
+
+	def append(self, key, tweets):
+		""" Adds the tweet dicts (newest first) as a new block of key
+		An empty list only saves a new key (it then exists without tweets), an existing key is not changed
+		"""
+		if not self.repair:
+			raise ValueError("TweetStore opened with repair=False is read-only")
+		if not tweets and key in self.index:
+			return
+		user = tweets[0].get("user") if tweets else None
+		stripped = []
+		for tweet in tweets:
+			tweet = dict(tweet)
+			tweet.pop("user", None)
+			stripped.append(tweet)
+		data = zlib.compress(json.dumps({"user": user, "tweets": stripped}).encode("utf-8"))
+		# -1 as id range of an empty block
+		ids = [tweet["id"] for tweet in tweets] or [-1]
+
+		with self._lock:
+			segment_path = self._segment_path(self.segment)
+			if os.path.isfile(segment_path) and os.path.getsize(segment_path) >= self.max_segment_size:
+				self.segment += 1
+				segment_path = self._segment_path(self.segment)
+			with open(segment_path, "ab") as f:
+				offset = f.tell()
+				f.write(data)
+				f.flush()
+				os.fsync(f.fileno())
+			# The block is on disk before the index points to it
+			block = BlockInfo(key, self.segment, offset, len(data), len(tweets), min(ids), max(ids))
+			with open(os.path.join(self.path, INDEX_FILENAME), "a") as f:
+				f.write(block.to_line())
+			self.index.setdefault(key, []).append(block)
+
+	def _read_block(self, block):
+		with self._lock:
+			f = self._open(block.segment)
+			f.seek(block.offset)
+			data = f.read(block.length)
+		content = json.loads(zlib.decompress(data))
+		user = content["user"]
+		tweets = content["tweets"]
+		for tweet in tweets:
+			tweet["user"] = user
+		return tweets
+
+	def read(self, key):
+		""" Returns all tweet dicts of key, in the order they were appended """
+		tweets = []
+		for block in self.index.get(key, []):
+			tweets += self._read_block(block)
+		return tweets
+
+	def read_raw(self, key):
+		""" Returns list of the decompressed blocks of key as bytes (json with "user" and "tweets") """
+		blocks = []
+		for block in self.index.get(key, []):
+			with self._lock:
+				f = self._open(block.segment)
+				f.seek(block.offset)
+				data = f.read(block.length)
+			blocks.append(zlib.decompress(data))
+		return blocks
+
+	def newest_id(self, key):
+		""" Highest tweet id saved for key, None if there is none """
+		return max((block.max_id for block in self.index.get(key, []) if block.count > 0), default=None)
+
+	def find_tweet(self, tweet_id, key=None):
+		""" Returns the tweet dict with tweet_id, None if it is not in the store
+		Only blocks whose id range holds tweet_id are read, but there is no index by tweet id:
+		without key the ranges of all blocks are checked and the timelines overlap, so give the key if it is known
+		"""
+		keys = [key] if key is not None else list(self.index)
+		for current_key in keys:
+			for block in self.index.get(current_key, []):
+				if block.min_id <= tweet_id <= block.max_id:
+					for tweet in self._read_block(block):
+						if tweet["id"] == tweet_id:
+							return tweet
+		return None
+
+
+def convert_directory(tweets_dir, store):
+	""" Copies every timeline file tweets_dir/<location>/<user_id> into store, returns number of timelines """
+	converted = 0
+	for location in sorted(os.listdir(tweets_dir)):
+		location_dir = os.path.join(tweets_dir, location)
+		if not os.path.isdir(location_dir):
+			continue
+		for user_id in sorted(os.listdir(location_dir)):
+			file_name = os.path.join(location_dir, user_id)
+			key = location + "/" + user_id
+			if not os.path.isfile(file_name) or file_name.endswith(".part") or key in store:
+				continue
+			with open(file_name) as f:
+				tweets = [json.loads(line) for line in f]
+			store.append(key, tweets)
+			converted += 1
+	return converted
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Convert tweets/<location>/<user_id> files into a TweetStore")
+	parser.add_argument("tweets_dir", help="<full_scan path>/tweets/")
+	parser.add_argument("store_dir", help="directory of the store, e.g. <full_scan path>/store/")
+	args = parser.parse_args()
+	tweet_store = TweetStore(args.store_dir)
+	print("Converted timelines:", convert_directory(args.tweets_dir, tweet_store))
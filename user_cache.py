@@ -0,0 +1,57 @@
+"""
+Cache for what the crawler already knows about a user
+is_good_user has to look at the recent timeline of every candidate, the verdict and
+the statuses it fetched are kept here, so get_timeline can start with them instead of
+requesting the same pages again
+"""
+import threading
+import time
+
+
+class UserActivityCache:
+	""" user_id -> (time of the check, good user verdict, fetched statuses, complete), entries expire after ttl seconds
+	complete is True if the statuses are the whole timeline of the user
+	"""
+
+	def __init__(self, ttl=3600):
+		self.ttl = ttl
+		self._entries = {}
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def _get(self, user_id):
+		""" Returns the entry of user_id, None if there is none or it expired. Only call with the lock held """
+		entry = self._entries.get(str(user_id))
+		if entry is None:
+			return None
+		if time.time() - entry[0] > self.ttl:
+			del self._entries[str(user_id)]
+			return None
+		return entry
+
+	def put(self, user_id, verdict, statuses=None, complete=False):
+		""" Saves verdict and the statuses (newest first) fetched for it """
+		with self._lock:
+			self._entries[str(user_id)] = (time.time(), verdict, statuses, complete)
+
+	def verdict(self, user_id):
+		""" Returns True/False if user_id was checked within ttl, otherwise None """
+		with self._lock:
+			entry = self._get(user_id)
+			if entry is None:
+				self.misses += 1
+				return None
+			self.hits += 1
+			return entry[1]
+
+	def pop_statuses(self, user_id):
+		""" Returns (statuses newest first, complete) of user_id and removes the statuses, the verdict is kept
+		Returns (None, False) if there are no statuses
+		"""
+		with self._lock:
+			entry = self._get(user_id)
+			if entry is None or entry[2] is None:
+				return None, False
+			self._entries[str(user_id)] = (entry[0], entry[1], None, False)
+			return entry[2], entry[3]
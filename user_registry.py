@@ -0,0 +1,202 @@
+"""
+Registry of user ids for dedupe and scan statistics
+The ids are kept as sorted int64 in a memory mapped file, new ids wait in a small set until they are
+merged in. Membership is a binary search in the mapped file, set operations between registries go
+chunk by chunk, so memory stays the same no matter how many users were scanned.
+"""
+import json
+import os
+import threading
+from itertools import islice
+
+import numpy as np
+
+# New ids are merged into the file once there are this many
+MERGE_SIZE = 100000
+# Ids read at once for merges and set operations
+CHUNK_SIZE = 1000000
+
+
+class UserRegistry:
+	""" Set of user ids, works like a set of id strings for 'in', add, update and len
+	:param path: file of the sorted ids, None to keep them in memory
+	"""
+
+	def __init__(self, path=None, merge_size=MERGE_SIZE):
+		self.path = path
+		self.merge_size = merge_size
+		# New ids, never in self.ids
+		self._pending = set()
+		# Ids that threads are deciding on right now, see claim
+		self._claimed = set()
+		self._lock = threading.Lock()
+		self.ids = self._map()
+
+	def _map(self):
+		if self.path is None or not os.path.isfile(self.path) or os.path.getsize(self.path) == 0:
+			return np.empty(0, dtype=np.int64)
+		return np.memmap(self.path, dtype=np.int64, mode="r")
+
+	def __len__(self):
+		return len(self.ids) + len(self._pending)
+
+	def _in_ids(self, ids):
+		""" Returns bool array, True for every id of the int64 array ids that is in self.ids """
+		if len(self.ids) == 0:
+			return np.zeros(len(ids), dtype=bool)
+		# Sorted queries walk the mapped file in order, much faster than random lookups
+		order = np.argsort(ids, kind="stable")
+		positions = np.empty(len(ids), dtype=np.int64)
+		positions[order] = np.searchsorted(self.ids, ids[order])
+		found = positions < len(self.ids)
+		found[found] = self.ids[positions[found]] == ids[found]
+		return found
+
+	def __contains__(self, user_id):
+		user_id = int(user_id)
+		with self._lock:
+			return user_id in self._pending or bool(self._in_ids(np.array([user_id], dtype=np.int64))[0])
+
+	def contains(self, user_ids):
+		""" Batched membership test, returns bool array with one entry per id (int or str) """
+		ids = as_id_array(user_ids)
+		with self._lock:
+			found = self._in_ids(ids)
+			if self._pending:
+				found |= np.fromiter((user_id in self._pending for user_id in ids.tolist()), dtype=bool, count=len(ids))
+		return found
+
+	def claim(self, user_id):
+		""" Atomic check for dedupe by several threads: returns False if user_id is in the registry or claimed,
+		otherwise claims it and returns True. Call release when the caller has decided on the user
+		"""
+		user_id = int(user_id)
+		with self._lock:
+			if user_id in self._claimed or user_id in self._pending or self._in_ids(np.array([user_id], dtype=np.int64))[0]:
+				return False
+			self._claimed.add(user_id)
+			return True
+
+	def release(self, user_id, keep):
+		""" Ends the claim of user_id, it is added to the registry if keep """
+		user_id = int(user_id)
+		with self._lock:
+			self._claimed.discard(user_id)
+			if keep:
+				self._pending.add(user_id)
+		if keep and len(self._pending) >= self.merge_size:
+			self.flush()
+
+	def add(self, user_id):
+		self.update([user_id])
+
+	def update(self, user_ids):
+		""" Adds the ids (int or str, any iterable), merges them into the file once there are enough
+		Returns the number of ids read
+		"""
+		user_ids = iter(user_ids)
+		num_read = 0
+		while True:
+			batch = as_id_array(islice(user_ids, self.merge_size))
+			if len(batch) == 0:
+				return num_read
+			num_read += len(batch)
+			with self._lock:
+				self._pending.update(batch[~self._in_ids(batch)].tolist())
+				full = len(self._pending) >= self.merge_size
+			if full:
+				self.flush()
+
+	def flush(self):
+		""" Merges the new ids into the sorted ids (and the file) """
+		with self._lock:
+			if not self._pending:
+				return
+			new = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+			new.sort()
+			self._pending = set()
+			if self.path is None:
+				self.ids = np.union1d(self.ids, new)
+				return
+
+			part_path = self.path + ".part"
+			with open(part_path, "wb") as f:
+				start = 0
+				for chunk in iter_chunks(self.ids):
+					end = np.searchsorted(new, chunk[-1], side="right")
+					merged = np.concatenate((chunk, new[start:end]))
+					merged.sort()
+					merged.tofile(f)
+					start = end
+				new[start:].tofile(f)
+				f.flush()
+				os.fsync(f.fileno())
+			# Unmap before the file is replaced
+			self.ids = None
+			os.replace(part_path, self.path)
+			self.ids = self._map()
+
+	def chunks(self, size=CHUNK_SIZE):
+		""" Yields all ids as sorted int64 arrays of at most size ids """
+		self.flush()
+		yield from iter_chunks(self.ids, size)
+
+	def count_common(self, other):
+		""" Number of ids that are in self and in other """
+		common = 0
+		for chunk in self.chunks():
+			common += int(other.contains(chunk).sum())
+		return common
+
+	def update_from_files(self, file_names):
+		""" Adds the ids of text files with one id per line
+		With a path, the read offset of every file is saved next to the registry and only lines appended
+		since the last call are read. Files that do not exist (yet) have no ids
+		"""
+		offsets_path = self.path + ".offsets" if self.path is not None else None
+		offsets = {}
+		if offsets_path is not None and os.path.isfile(offsets_path):
+			with open(offsets_path, "r") as f:
+				offsets = json.load(f)
+
+		for file_name in file_names:
+			if not os.path.isfile(file_name):
+				continue
+			name = os.path.basename(file_name)
+			offset = offsets.get(name, 0)
+			if offset > os.path.getsize(file_name):
+				# File was replaced by a shorter one
+				offset = 0
+			batch = []
+			with open(file_name, "rb") as f:
+				f.seek(offset)
+				for line in f:
+					if not line.endswith(b"\n"):
+						# Line is still being written
+						break
+					offset += len(line)
+					if line.strip():
+						batch.append(line)
+					if len(batch) == self.merge_size:
+						self.update(batch)
+						batch = []
+			self.update(batch)
+			offsets[name] = offset
+
+		self.flush()
+		if offsets_path is not None:
+			with open(offsets_path + ".part", "w") as f:
+				json.dump(offsets, f)
+			os.replace(offsets_path + ".part", offsets_path)
+
+
+def as_id_array(user_ids):
+	""" int64 array of ids given as ints, strings or bytes """
+	if isinstance(user_ids, np.ndarray):
+		return user_ids.astype(np.int64, copy=False)
+	return np.array([int(user_id) for user_id in user_ids], dtype=np.int64)
+
+
+def iter_chunks(ids, size=CHUNK_SIZE):
+	for start in range(0, len(ids), size):
+		yield np.asarray(ids[start:start + size])
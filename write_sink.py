@@ -0,0 +1,182 @@
+"""
+Write-behind sink for Crawler.save_tweets
+The crawl threads only queue the tweets, background threads serialize and write them, so the time
+the disk takes no longer adds to the time the network takes. Every file belongs to one writer thread,
+so the writes of one file keep their order. The callbacks of all writers run one at a time.
+Only save_tweets (incremental scan, stream, archive) goes through the sink. The journaled timelines of the
+full scan (Crawler.get_timeline_resumable) are written right away, every journal entry needs its page fsynced.
+Durability policy:
+	"batch": fsync every written batch before its callback runs
+	"interval": fsync the written files every fsync_interval seconds, callbacks run after that fsync
+	"none": no fsync, callbacks run right after the write
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+from tweet_store import store_key
+
+DURABILITY = ("batch", "interval", "none")
+# "interval" keeps the written files open until the fsync, at most this many per writer
+MAX_OPEN_FILES = 256
+
+
+class WriteBehindSink:
+	"""
+	:param tweet_store: TweetStore to append to instead of one file per user, None for files
+	:param writers: background threads, every file belongs to one of them. More than one hides the latency
+					of slow (network) storage, each file open and fsync waits on its own
+	:param max_pending: batches the queues hold, submit blocks when they are full (the disk can not keep up)
+	"""
+
+	def __init__(self, tweet_store=None, durability="batch", fsync_interval=5, max_pending=1000, writers=1):
+		if durability not in DURABILITY:
+			raise ValueError(f"durability has to be one of {DURABILITY}, not {durability}")
+		self.tweet_store = tweet_store
+		self.durability = durability
+		self.fsync_interval = fsync_interval
+		self.written = 0
+		self.batches = 0
+		self.write_time = 0.0
+		self.error = None
+		# file name -> number of queued batches, to know what is saved before it is on disk
+		self._pending = {}
+		self._lock = threading.Lock()
+		# Callbacks (e.g. Crawler.save_checkpoint) of different writers must not run at the same time
+		self._callback_lock = threading.Lock()
+		self._writers = [_Writer(self, max(max_pending // writers, 1)) for _ in range(writers)]
+
+	def submit(self, tweets, file_name, append=False, then=None):
+		""" Queues the tweets (Status objects) to be written to file_name, then() is called once they are written
+		Raises the error of an earlier write, so a broken disk stops the crawl instead of losing tweets silently
+		"""
+		self._raise_error()
+		with self._lock:
+			self._pending[file_name] = self._pending.get(file_name, 0) + 1
+		writer = self._writers[hash(file_name) % len(self._writers)]
+		writer.queue.put(([tweet._json for tweet in tweets], file_name, append, then))
+
+	def is_pending(self, file_name):
+		with self._lock:
+			return file_name in self._pending
+
+	def queued(self):
+		""" Number of batches waiting to be written """
+		return sum(writer.queue.qsize() for writer in self._writers)
+
+	def flush(self):
+		""" Blocks until everything submitted is written and fsynced (unless "none") """
+		for writer in self._writers:
+			writer.queue.put(None)
+		for writer in self._writers:
+			writer.queue.join()
+		self._raise_error()
+
+	def close(self):
+		self.flush()
+		for writer in self._writers:
+			writer.queue.put(False)
+			writer.thread.join()
+
+	def _raise_error(self):
+		if self.error is not None:
+			error, self.error = self.error, None
+			raise error
+
+	def _written(self, file_name, num_tweets, seconds):
+		with self._lock:
+			self._pending[file_name] -= 1
+			if self._pending[file_name] == 0:
+				del self._pending[file_name]
+			if num_tweets is not None:
+				self.written += num_tweets
+				self.batches += 1
+				self.write_time += seconds
+
+
+class _Writer:
+	""" One background thread of a WriteBehindSink with its queue """
+
+	def __init__(self, sink, max_pending):
+		self.sink = sink
+		self.queue = queue.Queue(max_pending)
+		# Written but not fsynced yet ("interval"): file name -> open file, and the callbacks waiting for them
+		self._dirty = {}
+		self._callbacks = []
+		self._last_sync = time.time()
+		self.thread = threading.Thread(target=self._run, daemon=True)
+		self.thread.start()
+
+	def _run(self):
+		while True:
+			try:
+				item = self.queue.get(timeout=self.sink.fsync_interval if self._dirty else None)
+			except queue.Empty:
+				self._sync()
+				continue
+			try:
+				if item is False:
+					return
+				if item is None:
+					# Flush marker
+					self._sync()
+				else:
+					self._write(*item)
+			except Exception as e:
+				self.sink.error = e
+			finally:
+				self.queue.task_done()
+
+	def _write(self, tweets, file_name, append, then):
+		start = time.time()
+		try:
+			durable = True
+			if self.sink.tweet_store is not None:
+				# The store fsyncs every block itself
+				self.sink.tweet_store.append(store_key(file_name), tweets)
+			else:
+				data = "".join(json.dumps(tweet) + "\n" for tweet in tweets)
+				f = self._dirty.pop(file_name, None)
+				if f is None or not append:
+					if f is not None:
+						f.close()
+					f = open(file_name, "a" if append else "w")
+				f.write(data)
+				if self.sink.durability == "interval":
+					# Kept open until the next fsync
+					self._dirty[file_name] = f
+					durable = False
+				else:
+					if self.sink.durability == "batch":
+						f.flush()
+						os.fsync(f.fileno())
+					f.close()
+		except Exception:
+			self.sink._written(file_name, None, None)
+			raise
+		self.sink._written(file_name, len(tweets), time.time() - start)
+
+		if then is not None:
+			if durable:
+				with self.sink._callback_lock:
+					then()
+			else:
+				self._callbacks.append(then)
+		if self._dirty and (time.time() - self._last_sync >= self.sink.fsync_interval
+							or len(self._dirty) >= MAX_OPEN_FILES):
+			self._sync()
+
+	def _sync(self):
+		""" fsyncs and closes the written files, then runs the callbacks that waited for them """
+		for f in self._dirty.values():
+			f.flush()
+			os.fsync(f.fileno())
+			f.close()
+		self._dirty = {}
+		self._last_sync = time.time()
+		callbacks, self._callbacks = self._callbacks, []
+		with self.sink._callback_lock:
+			for callback in callbacks:
+				callback()